@@ -0,0 +1,247 @@
+"""One transition applied to many applications in one transaction.
+
+Each item gets the same checks and changes as verifyApplication,
+ForwardApplication or update would give it, but the applications, the
+receiver and the creators are loaded with one query each, the action rows
+go in as one batched insert and everything commits once. Items that fail
+their checks are reported and skipped; the rest are moved by a single
+UPDATE (the ORM would issue one per row, as Applications is versioned).
+Before it, the rows are locked and their versions compared with the ones
+read, so an application changed concurrently is reported as a conflict
+on its own, as the version check would for a single application, and
+the rest go through. That UPDATE bypasses the unit of work, so the
+rollup deltas the after_flush hook would have applied
+(application_daily_stats) are applied here, in the same transaction.
+
+Notifications are grouped per recipient: the forward receiver gets one
+mail listing every application, each creator one mail for all of theirs.
+Verify sends none, like the single endpoint.
+"""
+import html
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import (
+    ApplicationActions,
+    Applications,
+    ApplicationStatus,
+    User,
+    UserRole,
+    apply_daily_stats_deltas,
+    daily_stats_key,
+    role_matches,
+)
+
+from .cache import note_versions
+
+UPDATE_STATUSES = {
+    "accept": ApplicationStatus.ACCEPTED,
+    "reject": ApplicationStatus.REJECTED,
+    "incomplete": ApplicationStatus.INCOMPLETE,
+}
+BULK_ACTIONS = ("verify", "forward", *UPDATE_STATUSES)
+
+
+class BulkTransitionError(ValueError):
+    """The whole request is invalid (bad action, no receiver, no access)."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+@dataclass
+class BulkOutcome:
+    results: list[dict] = field(default_factory=list)
+    # recipient email -> [(application id, token number)]
+    notifications: dict[str, list[tuple[str, int]]] = field(default_factory=dict)
+
+    @property
+    def applied(self) -> int:
+        return sum(1 for result in self.results if result["ok"])
+
+
+async def _receiver(session: AsyncSession, user: User, action: str, role, department) -> Optional[User]:
+    if action == "verify":
+        if not role_matches(user.role, UserRole.CLERK, UserRole.SYSTEM_ADMIN):
+            raise BulkTransitionError("You don't have access to verify applications", 403)
+        statement = select(User).where(func.lower(User.role) == UserRole.PRINCIPAL.value)
+    elif action == "forward":
+        if not role or not department:
+            raise BulkTransitionError("role and department are required to forward")
+        statement = select(User).where(
+            func.lower(User.role) == func.lower(role),
+            func.lower(User.department) == func.lower(department),
+        )
+    else:
+        return None
+    receiver = (await session.scalars(statement)).first()
+    if not receiver:
+        raise BulkTransitionError("Receiver not found", 404)
+    if action == "forward" and receiver.id == user.id:
+        raise BulkTransitionError("Cannot forward an application to yourself")
+    return receiver
+
+
+async def apply_bulk_transition(
+    session: AsyncSession,
+    user: User,
+    action: str,
+    application_ids: list[UUID],
+    role: Optional[str] = None,
+    department: Optional[str] = None,
+    remark: Optional[str] = None,
+    reference_number: Optional[str] = None,
+) -> BulkOutcome:
+    """Apply ``action`` to every application the user may move; no commit."""
+    if action not in BULK_ACTIONS:
+        raise BulkTransitionError(f"action must be one of {', '.join(BULK_ACTIONS)}")
+    receiver = await _receiver(session, user, action, role, department)
+    # Only the handler may act; verify and forward also let a system admin
+    admin_bypass = action in ("verify", "forward") and role_matches(user.role, UserRole.SYSTEM_ADMIN)
+
+    ids = list(dict.fromkeys(application_ids))
+    found = {
+        application.id: application
+        for application in await session.scalars(
+            select(Applications).where(Applications.id.in_(ids))
+        )
+    }
+    outcome = BulkOutcome()
+    applied: list[Applications] = []
+    for application_id in ids:
+        application = found.get(application_id)
+        if application is None:
+            outcome.results.append({"id": str(application_id), "ok": False, "message": "Application not found"})
+        elif application.current_handler_id != user.id and not admin_bypass:
+            outcome.results.append(
+                {"id": str(application_id), "ok": False, "message": "Only the current handler can do this"}
+            )
+        else:
+            applied.append(application)
+
+    if action == "verify":
+        values = {
+            "is_verified": True,
+            "status": ApplicationStatus.FORWARDED,
+            "current_handler_id": receiver.id,
+        }
+    elif action == "forward":
+        values = {"status": ApplicationStatus.FORWARDED, "current_handler_id": receiver.id}
+    else:
+        values = {"status": UPDATE_STATUSES[action], "accept_reference_number": reference_number}
+    action_type = {"verify": "VERIFIED", "forward": "FORWARD"}.get(action, values["status"].name)
+    if applied:
+        # Lock the rows and compare versions, so an application someone
+        # else moved since it was read fails on its own instead of making
+        # the UPDATE below miss it and the whole batch roll back
+        current = dict(
+            (await session.execute(
+                select(Applications.id, Applications.version)
+                .where(Applications.id.in_([application.id for application in applied]))
+                .with_for_update()
+            )).all()
+        )
+        for application in applied:
+            if current.get(application.id) != application.version:
+                outcome.results.append({
+                    "id": str(application.id),
+                    "ok": False,
+                    "message": "Application was changed by someone else; reload and try again",
+                })
+        applied = [a for a in applied if current.get(a.id) == a.version]
+    if applied:
+        # One UPDATE for the batch; the rows are locked and their versions
+        # checked, so it matches every one of them
+        await session.execute(
+            update(Applications)
+            .where(tuple_(Applications.id, Applications.version).in_(
+                [(application.id, application.version) for application in applied]
+            ))
+            .values(**values, version=Applications.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+    if applied:
+        note_versions(session.sync_session, {a.id: a.version + 1 for a in applied})
+        # The loaded rows still hold the values from before the UPDATE
+        deltas: dict = defaultdict(int)
+        for application in applied:
+            deltas[daily_stats_key(
+                application.created_at, application.current_handler_id, application.status
+            )] -= 1
+            deltas[daily_stats_key(
+                application.created_at,
+                values.get("current_handler_id", application.current_handler_id),
+                values["status"],
+            )] += 1
+        connection = await session.connection()
+        await connection.run_sync(apply_daily_stats_deltas, deltas)
+        session.add_all(
+            ApplicationActions(
+                from_user_id=user.id,
+                to_user_id=receiver.id if receiver is not None else application.created_by_id,
+                application_id=application.id,
+                action_type=action_type,
+                comments=remark,
+            )
+            for application in applied
+        )
+    for application in applied:
+        outcome.results.append(
+            {"id": str(application.id), "ok": True, "status": values["status"].value}
+        )
+    # Keep the results in request order
+    order = {str(application_id): n for n, application_id in enumerate(ids)}
+    outcome.results.sort(key=lambda result: order[result["id"]])
+
+    if action == "forward" and applied and receiver.tcet_email:
+        outcome.notifications[receiver.tcet_email] = [(str(a.id), a.token_no) for a in applied]
+    elif action in UPDATE_STATUSES and applied:
+        creators = dict(
+            (await session.execute(
+                select(User.id, User.tcet_email).where(
+                    User.id.in_({a.created_by_id for a in applied})
+                )
+            )).all()
+        )
+        for application in applied:
+            address = creators.get(application.created_by_id)
+            if address:
+                outcome.notifications.setdefault(address, []).append(
+                    (str(application.id), application.token_no)
+                )
+    return outcome
+
+
+def notification_html(
+    action: str,
+    applications: list[tuple[str, int]],
+    remark: Optional[str] = None,
+    reference_number: Optional[str] = None,
+) -> str:
+    """One mail body covering every application sent to a recipient."""
+    client_url = os.getenv("CLIENT_URL", "").rstrip("/")
+    if action == "forward":
+        items = "".join(
+            f'<li>Token {token_no}: <a href="{client_url}/application/{application_id}">link</a></li>'
+            for application_id, token_no in applications
+        )
+        return f"<h1>{len(applications)} application(s) forwarded to you</h1><ul>{items}</ul>"
+    status = UPDATE_STATUSES[action].name.capitalize()
+    lines = []
+    for application_id, token_no in applications:
+        line = f"Application of token number {token_no} is {status}"
+        if action == "accept":
+            line += f", reference number {html.escape(reference_number) if reference_number else token_no}"
+        lines.append(f"<li>{line}</li>")
+    body = f"<h1>Application(s) {status}</h1><ul>{''.join(lines)}</ul>"
+    if remark:
+        body += f"<p>Remark: {html.escape(remark)}</p>"
+    return body
@@ -0,0 +1,210 @@
+"""Versioned cache of application detail payloads.
+
+Payloads are keyed by (application id, version). Every write bumps
+``Applications.version``, so a write never has to find and delete old
+entries: readers simply stop asking for them and they age out. What a
+reader does need is the current version:
+
+* With Redis, commits record it under ``app:<id>:v`` (the pointer only
+  moves forward, so a slow reader cannot roll it back). Pointer and
+  payloads are shared by every worker and a hit costs no database query.
+* Without Redis, payloads live in a per-worker LRU and the caller reads
+  the version from the database (applications.detail.head_query), since
+  other workers' writes are not visible here.
+
+Payloads also show users' roles and departments, so changing those moves
+every application that shows the user to a new version
+(bump_versions_showing).
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import event, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from auth.utils import redis_client, use_redis
+from config import DETAIL_CACHE_SIZE, DETAIL_CACHE_TTL_SECONDS
+from db.models import ApplicationActions, Applications
+from serialization import dumps, loads
+
+# SET the pointer only if it is missing or older than ARGV[1]
+_ADVANCE_VERSION = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tonumber(ARGV[1]) > current then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+_PENDING_VERSIONS = "detail_cache_versions"
+
+
+def detail_etag(application_id, version: int) -> str:
+    return f'"{application_id}.{version}"'
+
+
+def _version_key(application_id) -> str:
+    return f"app:{application_id}:v"
+
+
+def _payload_key(application_id, version: int) -> str:
+    return f"app:{application_id}:{version}"
+
+
+class DetailCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple[str, int], tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._advance = redis_client.register_script(_ADVANCE_VERSION) if use_redis else None
+        self.hits = 0
+        self.misses = 0
+
+    def shared_version(self, application_id: UUID) -> Optional[int]:
+        """The version pointer in Redis, or None if unknown (always without
+        Redis); the caller then reads it from the database and records it."""
+        if not use_redis:
+            return None
+        try:
+            version = redis_client.get(_version_key(application_id))
+        except Exception as e:
+            logging.warning(f"Detail cache version lookup failed: {e}")
+            return None
+        return int(version) if version is not None else None
+
+    def get(self, application_id, version: int) -> Optional[dict]:
+        if use_redis:
+            try:
+                raw = redis_client.get(_payload_key(application_id, version))
+            except Exception as e:
+                logging.warning(f"Detail cache read failed: {e}")
+                raw = None
+            payload = loads(raw) if raw is not None else None
+        else:
+            payload = self._local_get((str(application_id), version))
+        if payload is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return payload
+
+    def put(self, payload: dict) -> None:
+        application_id, version = payload["id"], payload["version"]
+        if use_redis:
+            try:
+                redis_client.setex(
+                    _payload_key(application_id, version), int(self.ttl), dumps(payload)
+                )
+            except Exception as e:
+                logging.warning(f"Detail cache write failed: {e}")
+            self.record_versions({application_id: version})
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[(application_id, version)] = (expires_at, payload)
+            self._entries.move_to_end((application_id, version))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def record_versions(self, versions: dict) -> None:
+        """Advance the shared version pointers (no-op without Redis)."""
+        if self._advance is None:
+            return
+        try:
+            for application_id, version in versions.items():
+                self._advance(
+                    keys=[_version_key(application_id)], args=[version, int(self.ttl)]
+                )
+        except Exception as e:
+            # Readers may see the old version until the pointer expires
+            logging.warning(f"Detail cache version update failed: {e}")
+
+    def _local_get(self, key: tuple) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "shared": use_redis,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+detail_cache = DetailCache(maxsize=DETAIL_CACHE_SIZE, ttl=DETAIL_CACHE_TTL_SECONDS)
+
+
+def note_versions(session: Session, versions: dict) -> None:
+    """Publish {application id: version} when ``session`` commits.
+
+    Flushed ORM changes are noted automatically; bulk UPDATE statements,
+    which bypass the unit of work, must note their new versions here.
+    """
+    session.info.setdefault(_PENDING_VERSIONS, {}).update(
+        {str(application_id): version for application_id, version in versions.items()}
+    )
+
+
+async def bump_versions_showing(session: AsyncSession, user_id: UUID) -> int:
+    """Move every application whose detail shows ``user_id`` (creator or
+    action party) to a new version, so no cached payload keeps the user's
+    old role or department. Runs in the caller's transaction; returns the
+    number of applications moved."""
+    shown = or_(
+        Applications.created_by_id == user_id,
+        Applications.id.in_(
+            select(ApplicationActions.application_id).where(or_(
+                ApplicationActions.from_user_id == user_id,
+                ApplicationActions.to_user_id == user_id,
+            ))
+        ),
+    )
+    result = await session.execute(
+        update(Applications)
+        .where(shown)
+        .values(version=Applications.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    versions = (await session.execute(select(Applications.id, Applications.version).where(shown))).all()
+    note_versions(session.sync_session, dict(versions))
+    return result.rowcount
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_versions(session, flush_context):
+    note_versions(session, {
+        obj.id: obj.version
+        for obj in session.new | session.dirty
+        if isinstance(obj, Applications) and obj.version is not None
+    })
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_versions(session):
+    versions = session.info.pop(_PENDING_VERSIONS, None)
+    if versions:
+        detail_cache.record_versions(versions)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_versions(session, previous_transaction):
+    session.info.pop(_PENDING_VERSIONS, None)
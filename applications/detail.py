@@ -0,0 +1,209 @@
+"""Detail view loader for GET /api/application/{application_id}.
+
+Three queries regardless of history length: the application with its
+creator, its actions with both users, and its documents. The caller's
+access is part of the first query's WHERE clause, so nothing is loaded
+for a user who may not see the application.
+
+The route authorizes and answers If-None-Match from ``head_query`` (one
+primary-key lookup) first, so the loader only runs for a full 200.
+"""
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from db.models import (
+    ApplicationActions,
+    Applications,
+    SupportingDocuments,
+    User,
+    UserRole,
+    role_matches,
+)
+
+# Roles that may open any application
+DETAIL_OVERRIDE_ROLES = (UserRole.SYSTEM_ADMIN, UserRole.PRINCIPAL, UserRole.CLERK)
+
+CreatedBy = aliased(User, name="created_by")
+FromUser = aliased(User, name="from_user")
+ToUser = aliased(User, name="to_user")
+
+
+def visible_to(user: User):
+    """WHERE clause limiting Applications to what ``user`` may open."""
+    if role_matches(user.role, *DETAIL_OVERRIDE_ROLES):
+        return True
+    return or_(
+        Applications.created_by_id == user.id,
+        Applications.current_handler_id == user.id,
+    )
+
+
+def document_access_query(document_url: str, user: User):
+    """A row if ``user`` may open some application that references the document."""
+    return (
+        select(SupportingDocuments.id)
+        .join(Applications, Applications.id == SupportingDocuments.application_id)
+        .where(SupportingDocuments.document_url == document_url, visible_to(user))
+        .limit(1)
+    )
+
+
+def may_open(user: User, created_by_id, current_handler_id) -> bool:
+    """``visible_to`` in Python, for a row or payload already at hand."""
+    if role_matches(user.role, *DETAIL_OVERRIDE_ROLES):
+        return True
+    return str(user.id) in (
+        str(created_by_id) if created_by_id else None,
+        str(current_handler_id),
+    )
+
+
+def may_view(user: User, payload: dict) -> bool:
+    """``visible_to`` for an already loaded (e.g. cached) detail payload."""
+    creator = payload["created_by"]
+    return may_open(user, creator["id"] if creator else None, payload["current_handler_id"])
+
+
+def head_query(application_id: UUID):
+    """Version and access columns: enough to authorize and revalidate
+    without loading the detail."""
+    return select(
+        Applications.version,
+        Applications.created_by_id,
+        Applications.current_handler_id,
+    ).where(Applications.id == application_id)
+
+
+def application_query(application_id: UUID, user: User):
+    return (
+        select(
+            Applications.id,
+            Applications.status,
+            Applications.to,
+            Applications.created_at,
+            Applications.token_no,
+            Applications.accept_reference_number,
+            Applications.current_handler_id,
+            Applications.description,
+            Applications.version,
+            CreatedBy.id.label("creator_id"),
+            CreatedBy.username.label("creator_username"),
+            CreatedBy.role.label("creator_role"),
+            CreatedBy.department.label("creator_department"),
+            CreatedBy.tcet_email.label("creator_email"),
+        )
+        .outerjoin(CreatedBy, CreatedBy.id == Applications.created_by_id)
+        .where(Applications.id == application_id, visible_to(user))
+    )
+
+
+def actions_query(application_id: UUID):
+    return (
+        select(
+            ApplicationActions.id,
+            ApplicationActions.action_type,
+            ApplicationActions.comments,
+            ApplicationActions.created_at,
+            FromUser.id.label("from_id"),
+            FromUser.username.label("from_username"),
+            FromUser.role.label("from_role"),
+            FromUser.department.label("from_department"),
+            ToUser.id.label("to_id"),
+            ToUser.username.label("to_username"),
+            ToUser.role.label("to_role"),
+            ToUser.department.label("to_department"),
+        )
+        .outerjoin(FromUser, FromUser.id == ApplicationActions.from_user_id)
+        .outerjoin(ToUser, ToUser.id == ApplicationActions.to_user_id)
+        .where(ApplicationActions.application_id == application_id)
+        .order_by(ApplicationActions.created_at, ApplicationActions.id)
+    )
+
+
+def documents_query(application_id: UUID):
+    return select(
+        SupportingDocuments.id,
+        SupportingDocuments.document_name,
+        SupportingDocuments.document_url,
+    ).where(SupportingDocuments.application_id == application_id)
+
+
+def _isoformat(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _action_user(row, prefix: str) -> Optional[dict]:
+    user_id = row[f"{prefix}_id"]
+    if user_id is None:
+        return None
+    return {
+        "id": str(user_id),
+        "username": row[f"{prefix}_username"],
+        "role": row[f"{prefix}_role"],
+        "department": row[f"{prefix}_department"],
+    }
+
+
+async def load_application_detail(
+    session: AsyncSession, application_id: UUID, user: User
+) -> Optional[dict]:
+    """The detail payload, or None if it does not exist or ``user`` may not see it."""
+    application = (
+        await session.execute(application_query(application_id, user))
+    ).mappings().first()
+    if application is None:
+        return None
+    actions = (await session.execute(actions_query(application_id))).mappings().all()
+    documents = (await session.execute(documents_query(application_id))).all()
+
+    created_by = None
+    if application["creator_id"] is not None:
+        created_by = {
+            "id": str(application["creator_id"]),
+            "username": application["creator_username"],
+            "role": application["creator_role"],
+            "department": application["creator_department"],
+            "tcet_email": application["creator_email"],
+        }
+    return {
+        "id": str(application["id"]),
+        "version": application["version"],
+        "status": application["status"],
+        "to_user": application["to"],
+        "created_at": _isoformat(application["created_at"]),
+        "token_no": application["token_no"],
+        # First document kept for existing clients; every one is in "documents"
+        "document": documents[0].document_url if documents else None,
+        "documents": [
+            {
+                "id": str(document.id),
+                "document_name": document.document_name,
+                "document": document.document_url,
+            }
+            for document in documents
+        ],
+        "accept_reference_number": application["accept_reference_number"],
+        "current_handler_id": str(application["current_handler_id"]),
+        "description": application["description"] or None,
+        "created_by": created_by,
+        "actions": [
+            {
+                "id": str(action["id"]),
+                "action_type": action["action_type"],
+                "comment": action["comments"],
+                "created_at": _isoformat(action["created_at"]),
+                "from_user": _action_user(action, "from"),
+                "to_user": _action_user(action, "to"),
+            }
+            for action in actions
+        ],
+    }
+
+
+async def application_exists(session: AsyncSession, application_id: UUID) -> bool:
+    statement = select(Applications.id).where(Applications.id == application_id)
+    return (await session.execute(statement)).first() is not None
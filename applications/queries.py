@@ -0,0 +1,144 @@
+"""Read-side queries for the application list view."""
+import base64
+import binascii
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import and_, or_, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import Applications, ApplicationStatus
+
+# Only what the list views render; detail fields come from /{application_id}
+LIST_COLUMNS = (
+    Applications.id,
+    Applications.token_no,
+    Applications.subject,
+    Applications.description,
+    Applications.to,
+    Applications.status,
+    Applications.accept_reference_number,
+    Applications.created_by_id,
+    Applications.current_handler_id,
+    Applications.created_at,
+)
+LIST_KEYS = tuple(column.key for column in LIST_COLUMNS)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class ApplicationFilters:
+    statuses: list[ApplicationStatus] = field(default_factory=list)
+    year: Optional[int] = None
+    from_date: Optional[date] = None
+    to_date: Optional[date] = None
+
+    def clauses(self) -> list:
+        clauses = []
+        if self.statuses:
+            clauses.append(Applications.status.in_(self.statuses))
+        if self.year is not None:
+            clauses.append(Applications.year == self.year)
+        if self.from_date is not None:
+            clauses.append(Applications.created_at >= datetime.combine(self.from_date, time.min))
+        if self.to_date is not None:
+            # Inclusive end date: everything before midnight of the next day
+            clauses.append(
+                Applications.created_at < datetime.combine(self.to_date + timedelta(days=1), time.min)
+            )
+        return clauses
+
+
+def parse_statuses(raw: Optional[str]) -> list[ApplicationStatus]:
+    """Parse a comma-separated status filter ('pending,FORWARDED')."""
+    if not raw:
+        return []
+    statuses = []
+    for part in raw.split(","):
+        name = part.strip().upper()
+        if not name:
+            continue
+        if name not in ApplicationStatus.__members__:
+            raise ValueError(f"Invalid status '{part.strip()}'")
+        statuses.append(ApplicationStatus[name])
+    return statuses
+
+
+def encode_cursor(created_at: datetime, application_id: UUID) -> str:
+    raw = json.dumps([created_at.isoformat(), str(application_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, application_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), UUID(application_id)
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise InvalidCursor(str(e)) from e
+
+
+def _visible_page(predicate, filters: ApplicationFilters, after, limit: int):
+    statement = select(*LIST_COLUMNS).where(predicate, *filters.clauses())
+    if after is not None:
+        created_at, application_id = after
+        statement = statement.where(
+            or_(
+                Applications.created_at < created_at,
+                and_(Applications.created_at == created_at, Applications.id < application_id),
+            )
+        )
+    return (
+        statement.order_by(Applications.created_at.desc(), Applications.id.desc())
+        .limit(limit)
+        .subquery()
+    )
+
+
+def application_page_query(
+    user_id: UUID,
+    limit: int,
+    after: Optional[tuple[datetime, UUID]] = None,
+    filters: Optional[ApplicationFilters] = None,
+):
+    """Keyset page (newest first) of applications the user created or handles.
+
+    The creator and handler sides are separate ordered, limited branches
+    combined with UNION, so each side can walk its own
+    (user, created_at, id) index instead of the OR forcing a full scan.
+    """
+    filters = filters or ApplicationFilters()
+    created = _visible_page(Applications.created_by_id == user_id, filters, after, limit)
+    handled = _visible_page(Applications.current_handler_id == user_id, filters, after, limit)
+    merged = union(select(created), select(handled)).subquery()
+    return (
+        select(merged)
+        .order_by(merged.c.created_at.desc(), merged.c.id.desc())
+        .limit(limit)
+    )
+
+
+async def fetch_application_page(
+    session: AsyncSession,
+    user_id: UUID,
+    limit: int,
+    cursor: Optional[str] = None,
+    filters: Optional[ApplicationFilters] = None,
+) -> tuple[list[dict], Optional[str]]:
+    after = decode_cursor(cursor) if cursor else None
+    # One extra row tells us whether another page exists
+    statement = application_page_query(user_id, limit + 1, after, filters)
+    rows = (await session.execute(statement)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return [dict(zip(LIST_KEYS, row)) for row in rows], next_cursor
@@ -1,11 +1,26 @@
-from fastapi.responses import JSONResponse
+from serialization import JSONResponse
 from fastapi import UploadFile, File, Form
 from sqlalchemy import Select as select, func
-from sqlalchemy.orm import Session
 from db.models import User
 from fastapi import APIRouter, Cookie
 import jwt
-from config import JWT_SECRET, JWT_ALGORITHM, engine, ALLOWED_EXTENSIONS, MAX_UPLOAD_SIZE_MB
+from config import (
+    JWT_SECRET,
+    JWT_ALGORITHM,
+    async_session,
+    ALLOWED_EXTENSIONS,
+    MAX_UPLOAD_SIZE_MB,
+    APPLICATION_PAGE_SIZE_DEFAULT,
+    APPLICATION_PAGE_SIZE_MAX,
+    TOKEN_BLOCK_SIZE,
+    DB_RETRY_ATTEMPTS,
+    BULK_TRANSITION_MAX,
+    DOCUMENT_LINK_TTL_SECONDS,
+)
+from auth.utils import create_document_token
+from db.retry import run_in_transaction
+from documents.responses import etag_matches
+from documents.storage import UploadTooLarge, release, stage_upload
 from uuid import UUID
 from db.models import (
     Applications,
@@ -17,20 +32,33 @@ from datetime import datetime
 from .schema import (
     UpdateApplicationSchema,
     ForwardApplicationSchema,
+    BulkTransitionSchema,
 )
 from uuid import uuid4
-from typing import Annotated
+from typing import Annotated, Optional
 from mail import create_message
-from fastapi import APIRouter, Cookie, HTTPException
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session, aliased
+from fastapi import APIRouter, Cookie, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.future import select
 from uuid import UUID
-from datetime import datetime
+from datetime import date, datetime
 from dotenv import load_dotenv
 import os
 import html
-from db.models import UserRole, normalize_role, role_matches
+from db.models import UserRole, normalize_role, role_matches, token_blocks
+from auth.principal_cache import principal_cache
+from .stats import GRANULARITIES, fetch_stats
+from .export import EXPORT_FORMATS, accepts_gzip, export_rows
+from .search import MIN_TOKEN_SIZE, search_engine, tokenize
+from .bulk import BulkTransitionError, apply_bulk_transition, notification_html
+from .cache import detail_cache, detail_etag
+from .detail import application_exists, head_query, load_application_detail, may_open, may_view
+from .queries import (
+    ApplicationFilters,
+    InvalidCursor,
+    fetch_application_page,
+    parse_statuses,
+)
 
 load_dotenv()
 application_router = APIRouter()
@@ -41,7 +69,33 @@ def _safe_extension(filename: str) -> str:
     return "".join(c for c in ext if c.isalnum()).lower() or "bin"
 
 
-def protectRoute(access_token: str):
+async def _stage_document(document: UploadFile):
+    """Validate and stage an uploaded file; a JSONResponse means rejected."""
+    ext = _safe_extension(document.filename)
+    if ext not in ALLOWED_EXTENSIONS:
+        return JSONResponse(
+            content={"message": f"File extension '.{ext}' is not allowed"}, status_code=400
+        )
+    try:
+        return await stage_upload(document, ext, MAX_UPLOAD_SIZE_MB * 1024 * 1024)
+    except UploadTooLarge:
+        return JSONResponse(
+            content={"message": f"File size exceeds maximum allowed ({MAX_UPLOAD_SIZE_MB}MB)"},
+            status_code=400
+        )
+
+
+def _can_view_application(user: User, application: Applications) -> bool:
+    """Creator, current handler, or system admin/principal/clerk."""
+    allowed_roles = [UserRole.SYSTEM_ADMIN, UserRole.PRINCIPAL, UserRole.CLERK]
+    return (
+        user.id == application.created_by_id
+        or user.id == application.current_handler_id
+        or role_matches(user.role, *allowed_roles)
+    )
+
+
+async def protectRoute(access_token: str):
     if not access_token:
         return JSONResponse(
             content={"message": "Unauthorized request"}, status_code=401
@@ -53,13 +107,18 @@ def protectRoute(access_token: str):
             return JSONResponse(
                 content={"message": "Unauthorized request"}, status_code=401
             )
-        with Session(engine) as session:
-            statement = select(User).where(User.id == UUID(decode.get("sub")))
-            result = session.scalars(statement).first()
+        sub = str(decode.get("sub"))
+        cached = principal_cache.get(sub)
+        if cached is not None:
+            return cached
+        async with async_session() as session:
+            statement = select(User).where(User.id == UUID(sub))
+            result = (await session.scalars(statement)).first()
             if not result:
                 return JSONResponse(
                     content={"message": "Unauthorized request"}, status_code=401
                 )
+            principal_cache.put(sub, result)
             return result
     except Exception as e:
         print(f"Token error: {e}")
@@ -77,7 +136,7 @@ async def createApplication(
     for_user: str = Form(...),
     access_token: str = Cookie(None),
 ):
-    user = protectRoute(access_token)
+    user = await protectRoute(access_token)
     if not isinstance(user, User):
         return user
 
@@ -87,54 +146,46 @@ async def createApplication(
             content={"message": "Input exceeds maximum allowed length"},
             status_code=400,
         )
-    document_url = None
+    staged = None
     if document and document.filename:
-        ext = _safe_extension(document.filename)
-        if ext not in ALLOWED_EXTENSIONS:
-            return JSONResponse(
-                content={"message": f"File extension '.{ext}' is not allowed"}, status_code=400
-            )
-        os.makedirs("media", exist_ok=True)
-        unique_filename = f"{uuid4()}.{ext}"
-        document_url = f"media/{unique_filename}"
-        
-        max_bytes = MAX_UPLOAD_SIZE_MB * 1024 * 1024
-        total_size = 0
-        with open(document_url, "wb") as f:
-            while chunk := await document.read(1024 * 1024):  # 1MB chunks
-                total_size += len(chunk)
-                if total_size > max_bytes:
-                    f.close()
-                    if os.path.exists(document_url):
-                        os.remove(document_url)
-                    return JSONResponse(
-                        content={"message": f"File size exceeds maximum allowed ({MAX_UPLOAD_SIZE_MB}MB)"},
-                        status_code=400
-                    )
-                f.write(chunk)
+        staged = await _stage_document(document)
+        if isinstance(staged, JSONResponse):
+            return staged
+    document_url = staged.document_url if staged else None
+
+    application_id = uuid4()
+    year = datetime.now().year
+    # Blocks are reserved before the transaction (see TokenBlocks); with
+    # TOKEN_BLOCK_SIZE 1 the number comes from the counter row inside it
+    token_no = (
+        await token_blocks.reserve(async_session, year, TOKEN_BLOCK_SIZE)
+        if TOKEN_BLOCK_SIZE > 1
+        else None
+    )
 
-    receiver_email = None
-    with Session(engine) as session:
+    async def insert_application(session):
         statement = select(User).where(func.lower(User.role).in_(["clerk", "clerks"]))
-        receiver = session.scalars(statement).first()
-        
+        receiver = (await session.scalars(statement)).first()
         if not receiver:
-            return JSONResponse(
-                content={"message": "No clerk found to handle the application. Please contact system administrator."}, 
-                status_code=404
+            return None
+        if staged:
+            # In place before the row commits, so the row never points at a
+            # missing file; if the commit fails the sweep reclaims the file
+            await staged.commit()
+        # The token counter is sync ORM code; run it on the session's greenlet
+        newApplication = await session.run_sync(
+            lambda sync_session: Applications.create_with_counter(
+                session=sync_session,
+                description=description,
+                created_by_id=user.id,
+                current_handler_id=receiver.id,
+                id=application_id,
+                to=for_user,
+                subject=subject,
+                status=ApplicationStatus.PENDING,
+                year=year,
+                token_no=token_no,
             )
-            
-        receiver_email = receiver.tcet_email
-        application_id = uuid4()
-        newApplication = Applications.create_with_counter(
-            session=session,
-            description=description,
-            created_by_id=user.id,
-            current_handler_id=receiver.id,
-            id=application_id,
-            to=for_user,
-            subject=subject,
-            status=ApplicationStatus.PENDING,
         )
         newApplicationAction = ApplicationActions(
             from_user_id=user.id,
@@ -142,161 +193,240 @@ async def createApplication(
             application_id=newApplication.id,
             action_type="INWARD",
         )
-        if document and document.filename:
-            newDocument = SupportingDocuments(
-                application_id=application_id,
-                document_name=document.filename,
-                document_url=document_url,
+        if document_url:
+            session.add(
+                SupportingDocuments(
+                    application_id=application_id,
+                    document_name=document.filename,
+                    document_url=document_url,
+                )
             )
-            session.add(newDocument)
         session.add(newApplication)
         session.add(newApplicationAction)
-        session.commit()
-        link = f"{os.getenv('CLIENT_URL', '').rstrip('/')}/application/{application_id}"
-        html_message = f"""
-        <h1>Application is Inwarded</h1>
-        <p>Click here to see application <a href="{link}">link</a></p>
-        """
-        subject = "please check this application"
-        if receiver_email:
-            try:
-                await create_message([receiver.tcet_email], subject, html_message)
-            except Exception as e:
-                print(f"Failed to send email notification: {e}")
+        return receiver.tcet_email
+
+    try:
+        receiver_email = await run_in_transaction(
+            async_session, insert_application, attempts=DB_RETRY_ATTEMPTS
+        )
+    finally:
+        if staged:
+            await staged.discard()
+    if receiver_email is None:
+        return JSONResponse(
+            content={"message": "No clerk found to handle the application. Please contact system administrator."},
+            status_code=404
+        )
+    link = f"{os.getenv('CLIENT_URL', '').rstrip('/')}/application/{application_id}"
+    html_message = f"""
+    <h1>Application is Inwarded</h1>
+    <p>Click here to see application <a href="{link}">link</a></p>
+    """
+    subject = "please check this application"
+    try:
+        await create_message([receiver_email], subject, html_message)
+    except Exception as e:
+        print(f"Failed to send email notification: {e}")
     return JSONResponse(content={"message": "Application created"}, status_code=200)
 
 
 
-@application_router.get("/{application_id}")
-async def getApplication(application_id: UUID, access_token: str = Cookie(None)):
-    user = protectRoute(access_token)
+@application_router.get("/document_links/{application_id}")
+async def getDocumentLinks(application_id: UUID, access_token: str = Cookie(None)):
+    """Signed, expiring download links for an application's documents.
+
+    The links are checked by signature alone, so opening them costs no
+    database queries (see server.get_signed_document).
+    """
+    user = await protectRoute(access_token)
     if not isinstance(user, User):
         return user
 
-    with Session(engine) as session:
-        # Create aliases for the User table
-        CreatedByUser = aliased(User, name="created_by")
-        FromUser = aliased(User, name="from_user")
-        ToUser = aliased(User, name="to_user")
-
-        # Query the application along with its actions and related users (created_by, from_user, to_user)
-        statement = (
-            select(Applications, ApplicationActions, CreatedByUser, FromUser, ToUser)
-            .outerjoin(
-                ApplicationActions, ApplicationActions.application_id == Applications.id
-            )
-            .outerjoin(CreatedByUser, Applications.created_by_id == CreatedByUser.id)
-            .outerjoin(FromUser, ApplicationActions.from_user_id == FromUser.id)
-            .outerjoin(ToUser, ApplicationActions.to_user_id == ToUser.id)
-            .where(Applications.id == application_id)
-        )
-
-        # Execute the query and group the results by application
-        results = session.execute(statement).all()
-        statement = select(SupportingDocuments).where(
-            SupportingDocuments.application_id == application_id
-        )
-        documents = session.scalars(statement).all()
-        if not results:
+    async with async_session() as session:
+        statement = select(Applications).where(Applications.id == application_id)
+        application = (await session.scalars(statement)).first()
+        if not application:
             return JSONResponse(
                 content={"message": "Application not found"}, status_code=404
             )
-
-        application_obj = results[0][0]
-        # Authorization check: user must be creator, current handler, or system admin/principal/clerk
-        allowed_roles = [UserRole.SYSTEM_ADMIN, UserRole.PRINCIPAL, UserRole.CLERK]
-        if (
-            user.id != application_obj.created_by_id
-            and user.id != application_obj.current_handler_id
-            and not role_matches(user.role, *allowed_roles)
-        ):
+        if not _can_view_application(user, application):
             return JSONResponse(
                 content={"message": "Unauthorized to view this application"}, status_code=403
             )
+        statement = select(SupportingDocuments).where(
+            SupportingDocuments.application_id == application_id
+        )
+        documents = (await session.scalars(statement)).all()
+
+    links = [
+        {
+            "document_name": document.document_name,
+            "document": document.document_url,
+            "url": f"/api/documents/signed/{create_document_token(document.document_url, user.id)}",
+        }
+        for document in documents
+    ]
+    return JSONResponse(
+        content={"documents": links, "expires_in": DOCUMENT_LINK_TTL_SECONDS},
+        status_code=200,
+    )
 
 
-        # Initialize the application data
-        application_data = None
-        actions_list = []
+@application_router.get("/export")
+async def exportApplications(
+    format: str = "ndjson",
+    status: Optional[str] = None,
+    year: Optional[int] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    accept_encoding: Optional[str] = Header(None),
+    access_token: str = Cookie(None),
+):
+    """Register of applications and their actions, streamed as NDJSON or CSV."""
+    user = await protectRoute(access_token)
+    if not isinstance(user, User):
+        return user
+    if not role_matches(user.role, UserRole.SYSTEM_ADMIN, UserRole.PRINCIPAL):
+        return JSONResponse(
+            content={"message": "You don't have access"}, status_code=403
+        )
+    if format not in EXPORT_FORMATS:
+        return JSONResponse(
+            content={"message": f"format must be one of {', '.join(EXPORT_FORMATS)}"},
+            status_code=400,
+        )
+    try:
+        filters = ApplicationFilters(
+            statuses=parse_statuses(status),
+            year=year,
+            from_date=from_date,
+            to_date=to_date,
+        )
+    except ValueError as e:
+        return JSONResponse(content={"message": str(e)}, status_code=400)
+    compress = accepts_gzip(accept_encoding)
+    period = year or "-".join(str(d) for d in (from_date, to_date) if d) or "all"
+    headers = {
+        "Content-Disposition": f'attachment; filename="applications-{period}.{format}"',
+        "Vary": "Accept-Encoding",
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_rows(filters, format, compress),
+        media_type=EXPORT_FORMATS[format],
+        headers=headers,
+    )
 
-        for row in results:
-            application, action, created_by, from_user, to_user = row
 
-            # Serialize application data (initialize once)
-            if application_data is None:
-                application_data = {
-                    "id": str(application.id),
-                    "status": application.status,
-                    "to_user": application.to,
-                    "created_at": (
-                        application.created_at.isoformat()
-                        if application.created_at
-                        else None
-                    ),
-                    "token_no": application.token_no,
-                    "document": (
-                        documents[0].document_url if len(documents) > 0 else None
-                    ),
-                    "accept_reference_number": (application.accept_reference_number),
-                    "current_handler_id": str(application.current_handler_id),
-                    "description": (
-                        application.description if application.description else None
-                    ),
-                    "created_by": (
-                        {
-                            "id": str(created_by.id) if created_by else None,
-                            "username": created_by.username if created_by else None,
-                            "role": created_by.role if created_by else None,
-                            "department": created_by.department if created_by else None,
-                            "tcet_email": created_by.tcet_email if created_by else None,
-                        }
-                        if created_by
-                        else None
-                    ),
-                }
-
-            # Serialize action data
-            if action:
-                actions_list.append(
-                    {
-                        "id": str(action.id),
-                        "action_type": action.action_type,
-                        "comment": action.comments,
-                        "created_at": (
-                            action.created_at.isoformat() if action.created_at else None
-                        ),
-                        "from_user": (
-                            {
-                                "id": str(from_user.id) if from_user else None,
-                                "username": from_user.username if from_user else None,
-                                "role": from_user.role if from_user else None,
-                                "department": (
-                                    from_user.department if from_user else None
-                                ),
-                            }
-                            if from_user
-                            else None
-                        ),
-                        "to_user": (
-                            {
-                                "id": str(to_user.id) if to_user else None,
-                                "username": to_user.username if to_user else None,
-                                "role": to_user.role if to_user else None,
-                                "department": to_user.department if to_user else None,
-                            }
-                            if to_user
-                            else None
-                        ),
-                    }
+@application_router.get("/search")
+async def searchApplications(
+    q: str,
+    limit: int = Query(APPLICATION_PAGE_SIZE_DEFAULT, ge=1),
+    offset: int = Query(0, ge=0),
+    status: Optional[str] = None,
+    year: Optional[int] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    access_token: str = Cookie(None),
+):
+    """Ranked search over the applications /all would list for the user."""
+    user = await protectRoute(access_token)
+    if not isinstance(user, User):
+        return user
+    terms = tokenize(q)
+    if not terms:
+        return JSONResponse(
+            content={"message": f"Search for at least one word of {MIN_TOKEN_SIZE} or more characters"},
+            status_code=400,
+        )
+    try:
+        filters = ApplicationFilters(
+            statuses=parse_statuses(status),
+            year=year,
+            from_date=from_date,
+            to_date=to_date,
+        )
+    except ValueError as e:
+        return JSONResponse(content={"message": str(e)}, status_code=400)
+    limit = min(limit, APPLICATION_PAGE_SIZE_MAX)
+    async with async_session() as session:
+        applications, has_more = await search_engine.search(
+            session, user.id, terms, filters, limit=limit, offset=offset
+        )
+    return JSONResponse(
+        content={
+            "applications": applications,
+            "next_offset": offset + limit if has_more else None,
+        },
+        status_code=200,
+    )
+
+
+@application_router.get("/{application_id}")
+async def getApplication(
+    application_id: UUID,
+    access_token: str = Cookie(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Detail view; revalidate with the ETag (derived from the version) for a 304."""
+    user = await protectRoute(access_token)
+    if not isinstance(user, User):
+        return user
+
+    async with async_session() as session:
+        application_data = None
+        version = detail_cache.shared_version(application_id)
+        if version is not None:
+            application_data = detail_cache.get(application_id, version)
+        if application_data is not None:
+            if not may_view(user, application_data):
+                return JSONResponse(
+                    content={"message": "Unauthorized to view this application"}, status_code=403
                 )
+        else:
+            # Authorize and revalidate on the version row before paying for the loader
+            head = (await session.execute(head_query(application_id))).first()
+            if head is None:
+                return JSONResponse(
+                    content={"message": "Application not found"}, status_code=404
+                )
+            if not may_open(user, head.created_by_id, head.current_handler_id):
+                return JSONResponse(
+                    content={"message": "Unauthorized to view this application"}, status_code=403
+                )
+            detail_cache.record_versions({application_id: head.version})
+            headers = _detail_headers(application_id, head.version)
+            if if_none_match is not None and etag_matches(if_none_match, headers["ETag"], weak=True):
+                return Response(status_code=304, headers=headers)
+            if head.version != version:
+                application_data = detail_cache.get(application_id, head.version)
+            if application_data is None:
+                application_data = await load_application_detail(session, application_id, user)
+                if application_data is None:
+                    # Deleted or handed over since the version row was read
+                    if await application_exists(session, application_id):
+                        return JSONResponse(
+                            content={"message": "Unauthorized to view this application"}, status_code=403
+                        )
+                    return JSONResponse(
+                        content={"message": "Application not found"}, status_code=404
+                    )
+                detail_cache.put(application_data)
 
-        # Add actions to the application data
-        if application_data:
-            application_data["actions"] = actions_list
+    headers = _detail_headers(application_id, application_data["version"])
+    if if_none_match is not None and etag_matches(if_none_match, headers["ETag"], weak=True):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(
+        content={"application": application_data}, status_code=200, headers=headers
+    )
 
-        return JSONResponse(content={"application": application_data}, status_code=200)
 
-    return JSONResponse(content={"message": "Application not found"}, status_code=404)
+def _detail_headers(application_id: UUID, version: int) -> dict:
+    return {
+        "ETag": detail_etag(application_id, version),
+        "Cache-Control": "private, no-cache",
+    }
 
 
 @application_router.post("/update/{application_id}")
@@ -305,12 +435,12 @@ async def update(
     body: UpdateApplicationSchema,
     access_token: str = Cookie(None),
 ):
-    user = protectRoute(access_token)
+    user = await protectRoute(access_token)
     if not isinstance(user, User):
         return user
-    with Session(engine) as session:
+    async with async_session() as session:
         statement = select(Applications).where(Applications.id == application_id)
-        result = session.scalars(statement).first()
+        result = (await session.scalars(statement)).first()
         if not result:
             return JSONResponse(
                 content={"message": "Application not found"}, status_code=404
@@ -331,6 +461,7 @@ async def update(
             )
         result.accept_reference_number = body.referenceNumber
         result.status = ApplicationStatus[body.status]
+        result.bump_version()
         newApplicationAction = ApplicationActions(
             from_user_id=user.id,
             to_user_id=result.created_by_id,
@@ -339,13 +470,13 @@ async def update(
             comments=body.remark,
         )
         statement = select(User).where(User.id == result.created_by_id)
-        creator = session.scalars(statement).first()
+        creator = (await session.scalars(statement)).first()
         if creator is None:
             return JSONResponse(
                 content={"message": "Some error taken place"}, status_code=401
             )
         session.add(newApplicationAction)
-        session.commit()
+        await session.commit()
         html_message = None
         if body.status == "ACCEPTED":
             if body.referenceNumber:
@@ -372,32 +503,50 @@ async def update(
         if result:
             if body.remark:
                 html_message += f"<p>Remark: {html.escape(body.remark)}</p>"
-            await create_message([creator.tcet_email], subject, html_message)
+            try:
+                await create_message([creator.tcet_email], subject, html_message)
+            except Exception as e:
+                print(f"Failed to send update notification email: {e}")
     return JSONResponse(content={"message": "Application updated"}, status_code=200)
 
 
 @application_router.post("/all")
 async def getAllApplications(
+    limit: int = Query(APPLICATION_PAGE_SIZE_DEFAULT, ge=1),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    year: Optional[int] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
     access_token: str = Cookie(None),
 ):
-    user = protectRoute(access_token)
+    user = await protectRoute(access_token)
     if not isinstance(user, User):
         return user
-    with Session(engine) as session:
-        applications = select(Applications).where(
-            (Applications.created_by_id == user.id)
-            | (Applications.current_handler_id == user.id)
+    try:
+        filters = ApplicationFilters(
+            statuses=parse_statuses(status),
+            year=year,
+            from_date=from_date,
+            to_date=to_date,
         )
-        result = session.scalars(applications).all()
-    ans = [dict(r.__dict__) for r in result]
-    for r in ans:
-        r.pop("_sa_instance_state", None)
-        for key, value in r.items():
-            if isinstance(value, UUID):
-                r[key] = str(value)
-            if isinstance(value, datetime):
-                r[key] = value.isoformat()
-    return JSONResponse(content={"applications": ans}, status_code=200)
+    except ValueError as e:
+        return JSONResponse(content={"message": str(e)}, status_code=400)
+    async with async_session() as session:
+        try:
+            applications, next_cursor = await fetch_application_page(
+                session,
+                user.id,
+                limit=min(limit, APPLICATION_PAGE_SIZE_MAX),
+                cursor=cursor,
+                filters=filters,
+            )
+        except InvalidCursor:
+            return JSONResponse(content={"message": "Invalid cursor"}, status_code=400)
+    return JSONResponse(
+        content={"applications": applications, "next_cursor": next_cursor},
+        status_code=200,
+    )
 
 
 @application_router.post("/forward/{application_id}")
@@ -406,14 +555,14 @@ async def ForwardApplication(
     body: ForwardApplicationSchema,
     access_token: str = Cookie(None),
 ):
-    user = protectRoute(access_token)
+    user = await protectRoute(access_token)
     if not isinstance(user, User):
         return user
-    with Session(engine) as session:
+    async with async_session() as session:
         statement = select(Applications).where(
             Applications.id == UUID(str(application_id))
         )
-        result = session.scalars(statement).first()
+        result = (await session.scalars(statement)).first()
         if not result:
             return JSONResponse(
                 content={"message": "Application not found"}, status_code=404
@@ -430,7 +579,7 @@ async def ForwardApplication(
             func.lower(User.role) == func.lower(body.role),
             func.lower(User.department) == func.lower(body.department),
         )
-        receiver = session.scalars(statement).first()
+        receiver = (await session.scalars(statement)).first()
         if not receiver:
             return JSONResponse(
                 content={"message": "Receiver not found"}, status_code=404
@@ -442,6 +591,7 @@ async def ForwardApplication(
             )
         result.current_handler_id = UUID(str(receiver.id))
         result.status = ApplicationStatus.FORWARDED
+        result.bump_version()
         newApplicationAction = ApplicationActions(
             from_user_id=user.id,
             to_user_id=receiver.id,
@@ -450,7 +600,7 @@ async def ForwardApplication(
             comments=body.remark,
         )
         session.add(newApplicationAction)
-        session.commit()
+        await session.commit()
         link = f"{os.getenv('CLIENT_URL', '').rstrip('/')}/application/{application_id}"
         html_message = f"""
         <h1>Application is Forwarded</h1>
@@ -467,9 +617,12 @@ async def ForwardApplication(
 
 @application_router.get("/get-stats/{some_id}")
 async def getStats(
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    granularity: str = "day",
     access_token: str = Cookie(None),
 ):
-    user = protectRoute(access_token)
+    user = await protectRoute(access_token)
     if not isinstance(user, User):
         return user
     if role_matches(user.role, UserRole.STUDENT):
@@ -477,60 +630,30 @@ async def getStats(
             content={"message": "You are not authorized to view this page"},
             status_code=401,
         )
-    if role_matches(user.role, UserRole.PRINCIPAL):
-        print("principal")
-        with Session(engine) as session:
-            statement = select(Applications)
-            result = session.scalars(statement).all()
-            stats = {}
-            for r in result:
-                date_str = r.created_at.date().isoformat()
-                if date_str not in stats:
-                    stats[date_str] = {
-                        "pending": 0,
-                        "accepted": 0,
-                        "rejected": 0,
-                    }
-                if r.status == ApplicationStatus.PENDING:
-                    stats[date_str]["pending"] += 1
-                elif r.status == ApplicationStatus.ACCEPTED:
-                    stats[date_str]["accepted"] += 1
-                else:
-                    stats[date_str]["rejected"] += 1
-            return JSONResponse(
-                content={"stats": stats},
-                status_code=200,
-            )
-    else:
-        with Session(engine) as session:
-            statement = select(Applications).where(
-                Applications.current_handler_id == UUID(str(user.id))
-            )
-            result = session.scalars(statement).all()
-            stats = {}
-            for r in result:
-                date_str = r.created_at.date().isoformat()
-                if date_str not in stats:
-                    stats[date_str] = {
-                        "pending": 0,
-                        "accepted": 0,
-                        "rejected": 0,
-                    }
-                if r.status == ApplicationStatus.PENDING:
-                    stats[date_str]["pending"] += 1
-                elif r.status == ApplicationStatus.ACCEPTED:
-                    stats[date_str]["accepted"] += 1
-                else:
-                    stats[date_str]["rejected"] += 1
-            return JSONResponse(
-                content={"stats": stats},
-                status_code=200,
-            )
+    if granularity not in GRANULARITIES:
+        return JSONResponse(
+            content={"message": f"granularity must be one of {', '.join(GRANULARITIES)}"},
+            status_code=400,
+        )
+    # The principal sees every handler's applications, everyone else their own
+    handler_id = None if role_matches(user.role, UserRole.PRINCIPAL) else user.id
+    async with async_session() as session:
+        stats = await fetch_stats(
+            session,
+            handler_id=handler_id,
+            from_date=from_date,
+            to_date=to_date,
+            granularity=granularity,
+        )
+    return JSONResponse(
+        content={"stats": stats, "granularity": granularity},
+        status_code=200,
+    )
 
 
 @application_router.post("/verify/{application_id}")
 async def verifyApplication(application_id: UUID, access_token: str = Cookie(None)):
-    user = protectRoute(access_token)
+    user = await protectRoute(access_token)
     if not isinstance(user, User):
         return user
     # Authorization: only clerk or system admin may verify applications
@@ -539,9 +662,9 @@ async def verifyApplication(application_id: UUID, access_token: str = Cookie(Non
             content={"message": "You don't have access to verify applications"},
             status_code=403,
         )
-    with Session(engine) as session:
+    async with async_session() as session:
         statement = select(Applications).where(Applications.id == application_id)
-        result = session.scalars(statement).first()
+        result = (await session.scalars(statement)).first()
         if not result:
             return JSONResponse({"message": "Application not found"}, status_code=404)
         # Handler check for clerks; system admin bypasses
@@ -551,7 +674,7 @@ async def verifyApplication(application_id: UUID, access_token: str = Cookie(Non
                 status_code=403,
             )
         statement = select(User).where(func.lower(User.role) == UserRole.PRINCIPAL.value)
-        receiver = session.scalars(statement).first()
+        receiver = (await session.scalars(statement)).first()
         if not receiver:
             return JSONResponse(
                 content={"message": "Receiver not found"}, status_code=404
@@ -559,6 +682,7 @@ async def verifyApplication(application_id: UUID, access_token: str = Cookie(Non
         result.is_verified = True
         result.status = ApplicationStatus.FORWARDED
         result.current_handler_id = UUID(str(receiver.id))
+        result.bump_version()
         newApplicationAction = ApplicationActions(
             from_user_id=user.id,
             to_user_id=receiver.id,
@@ -566,10 +690,58 @@ async def verifyApplication(application_id: UUID, access_token: str = Cookie(Non
             action_type="VERIFIED",
         )
         session.add(newApplicationAction)
-        session.commit()
+        await session.commit()
     return JSONResponse(content={"message": "Application verified"}, status_code=200)
 
 
+@application_router.post("/bulk")
+async def bulkTransition(body: BulkTransitionSchema, access_token: str = Cookie(None)):
+    """Verify, forward, accept, reject or mark incomplete many applications at once."""
+    user = await protectRoute(access_token)
+    if not isinstance(user, User):
+        return user
+    if len(body.application_ids) > BULK_TRANSITION_MAX:
+        return JSONResponse(
+            content={"message": f"At most {BULK_TRANSITION_MAX} applications per request"},
+            status_code=400,
+        )
+    action = body.action.strip().lower()
+
+    async def transition(session):
+        return await apply_bulk_transition(
+            session,
+            user,
+            action,
+            body.application_ids,
+            role=body.role,
+            department=body.department,
+            remark=body.remark,
+            reference_number=body.referenceNumber,
+        )
+
+    try:
+        outcome = await run_in_transaction(async_session, transition, attempts=DB_RETRY_ATTEMPTS)
+    except BulkTransitionError as e:
+        return JSONResponse(content={"message": e.message}, status_code=e.status_code)
+    subject = "please check these applications"
+    for recipient, applications in outcome.notifications.items():
+        try:
+            await create_message(
+                [recipient],
+                subject,
+                notification_html(action, applications, body.remark, body.referenceNumber),
+            )
+        except Exception as e:
+            print(f"Failed to send bulk notification email: {e}")
+    return JSONResponse(
+        content={
+            "message": f"{outcome.applied} of {len(outcome.results)} applications updated",
+            "results": outcome.results,
+        },
+        status_code=200,
+    )
+
+
 @application_router.post("/update_app/{application_id}")
 async def updateApplication(
     application_id: str,
@@ -579,7 +751,7 @@ async def updateApplication(
     for_user: str = Form(...),
     access_token: str = Cookie(None),
 ):
-    user = protectRoute(access_token)
+    user = await protectRoute(access_token)
     if not isinstance(user, User):
         return user
 
@@ -590,13 +762,39 @@ async def updateApplication(
             status_code=400,
         )
 
-    document_url = None
-    with Session(engine) as session:
+    # Stage the upload before taking a DB connection; it is moved under
+    # media/ only once the transaction below is about to commit
+    staged = None
+    if document and document.filename:
+        staged = await _stage_document(document)
+        if isinstance(staged, JSONResponse):
+            return staged
+    try:
+        response = await _apply_application_update(
+            application_id, user, staged, document, description, subject, for_user
+        )
+    finally:
+        if staged:
+            await staged.discard()
+    if response is not None:
+        return response
+
+    return JSONResponse(
+        content={"message": "Application updated successfully"}, status_code=200
+    )
+
+
+async def _apply_application_update(
+    application_id, user, staged, document, description, subject, for_user
+):
+    """update_app's transaction; returns an error response or None on success."""
+    replaced_urls = []
+    async with async_session() as session:
         # Fetch the application
         statement = select(Applications).where(
             Applications.id == UUID(str(application_id))
         )
-        application = session.scalars(statement).one_or_none()
+        application = (await session.scalars(statement)).one_or_none()
 
         if not application:
             return JSONResponse(
@@ -614,48 +812,19 @@ async def updateApplication(
             )
 
         # Update document if provided
-        if document and document.filename:
-            # Validate extension and size (same policy as create)
-            ext = _safe_extension(document.filename)
-            if ext not in ALLOWED_EXTENSIONS:
-                return JSONResponse(
-                    content={"message": f"File extension '.{ext}' is not allowed"},
-                    status_code=400,
-                )
-            max_bytes = MAX_UPLOAD_SIZE_MB * 1024 * 1024
-            content = await document.read(max_bytes + 1)
-            if len(content) > max_bytes:
-                return JSONResponse(
-                    content={"message": f"File size exceeds maximum allowed ({MAX_UPLOAD_SIZE_MB}MB)"},
-                    status_code=400,
-                )
-            # Delete existing document if it exists
+        if staged:
+            # Drop the old reference; its file goes once nothing else points at it
             existing_document_statement = select(SupportingDocuments).where(
                 SupportingDocuments.application_id == UUID(str(application_id))
             )
-            existing_document = session.scalars(
-                existing_document_statement
-            ).one_or_none()
-
-            if existing_document:
-                try:
-                    os.remove(existing_document.document_url)
-                except FileNotFoundError:
-                    pass
-
-                session.delete(existing_document)
-
-            # Save the new document
-            os.makedirs("media", exist_ok=True)
-            unique_filename = f"{uuid4()}.{ext}"
-            document_url = f"media/{unique_filename}"
-            with open(document_url, "wb") as f:
-                f.write(content)
+            for existing_document in (await session.scalars(existing_document_statement)).all():
+                replaced_urls.append(existing_document.document_url)
+                await session.delete(existing_document)
 
             newDocument = SupportingDocuments(
                 application_id=UUID(str(application_id)),
                 document_name=document.filename,
-                document_url=document_url,
+                document_url=staged.document_url,
             )
             session.add(newDocument)
 
@@ -663,9 +832,12 @@ async def updateApplication(
         application.description = description
         application.subject = subject
         application.to = for_user
-
-        session.commit()
-
-    return JSONResponse(
-        content={"message": "Application updated successfully"}, status_code=200
-    )
+        application.bump_version()
+
+        if staged:
+            # Before the row commits, as in createApplication
+            await staged.commit()
+        await session.commit()
+        for replaced_url in replaced_urls:
+            await release(session, replaced_url)
+    return None
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import Optional
+from uuid import UUID
 
 
 class CreateApplicationSchema(BaseModel):
@@ -18,3 +19,12 @@ class ForwardApplicationSchema(BaseModel):
     role: str = Field(..., max_length=200)
     department: str = Field(..., max_length=200)
     remark: Optional[str] = Field(None, max_length=200)
+
+
+class BulkTransitionSchema(BaseModel):
+    application_ids: list[UUID] = Field(..., min_length=1)
+    action: str
+    role: Optional[str] = Field(None, max_length=200)
+    department: Optional[str] = Field(None, max_length=200)
+    remark: Optional[str] = Field(None, max_length=200)
+    referenceNumber: Optional[str] = Field(None, max_length=200)
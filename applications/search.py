@@ -0,0 +1,462 @@
+"""Ranked full-text search over the applications a user can list.
+
+Matches ``subject``, ``description``, ``to`` and the remarks
+(``ApplicationActions.comments``) of applications the user created or
+currently handles, the same rows /all returns, after the usual status and
+date filters. Results are ranked by relevance (any query word may match;
+more and rarer words rank higher) and paged with limit/offset.
+
+Two engines, picked by SEARCH_ENGINE:
+
+* ``fulltext`` (MySQL): MATCH ... AGAINST over the FULLTEXT indexes
+  declared on both tables, one statement per page.
+* ``memory`` (SQLite and test runs): a per-worker inverted index scored
+  with BM25, built from the database on first use (in a thread, off the
+  event loop). This worker's commits are applied as they happen; every
+  SEARCH_INDEX_REFRESH_SECONDS the index re-reads only the applications
+  whose ``updated_at`` moved past its watermark (every write stamps it,
+  new actions come with one), so other workers' changes show up without
+  reloading the table. Visibility and filters are still checked in SQL,
+  batch by batch down the ranking, which also hides applications deleted
+  elsewhere.
+
+The memory engine keeps a copy of every application in each worker, so it
+is only a fallback for databases without FULLTEXT: ``auto`` (the default)
+uses ``fulltext`` on MySQL and ``memory`` elsewhere, and ``memory`` asked
+for on MySQL is overridden with a warning.
+"""
+import abc
+import asyncio
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import event, func, or_, select, union_all
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, attributes
+
+from config import SEARCH_ENGINE, SEARCH_INDEX_REFRESH_SECONDS, async_engine
+from db.models import ApplicationActions, Applications
+
+from .queries import LIST_COLUMNS, LIST_KEYS, ApplicationFilters
+
+# InnoDB's defaults (innodb_ft_min_token_size and the FULLTEXT stopword
+# list), so both engines ignore the same words
+MIN_TOKEN_SIZE = 3
+STOPWORDS = frozenset(
+    "a about an are as at be by com de en for from how i in is it la of on or "
+    "that the this to was what when where who will with und www".split()
+)
+TEXT_FIELDS = ("subject", "description", "to")
+_WORD = re.compile(r"\w+")
+_PENDING_CHANGES = "search_index_changes"
+# Refreshes re-read this far behind the watermark: a row is stamped when
+# its UPDATE runs, not when it commits, and workers' clocks differ a little
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    if not text:
+        return []
+    return [word for word in _WORD.findall(text.lower()) if len(word) >= MIN_TOKEN_SIZE and word not in STOPWORDS]
+
+
+def _visible(user_id: UUID):
+    # Same rows as /all: created by the user or in their hands
+    return or_(Applications.created_by_id == user_id, Applications.current_handler_id == user_id)
+
+
+def candidates_query(application_ids, user_id: UUID, filters: ApplicationFilters):
+    """The ranked candidates the user may list, for the in-process engine."""
+    return select(*LIST_COLUMNS).where(
+        Applications.id.in_(application_ids), _visible(user_id), *filters.clauses()
+    )
+
+
+def indexed_query(since=None):
+    """Indexed fields of the applications changed since ``since`` (all if None)."""
+    statement = select(
+        Applications.id,
+        Applications.version,
+        Applications.updated_at,
+        *(getattr(Applications, name) for name in TEXT_FIELDS),
+    )
+    if since is not None:
+        statement = statement.where(Applications.updated_at >= since)
+    return statement
+
+
+def remarks_query(since=None):
+    """Remarks of the applications changed since ``since`` (all if None)."""
+    statement = select(ApplicationActions.application_id, ApplicationActions.comments).where(
+        ApplicationActions.comments.is_not(None)
+    )
+    if since is not None:
+        statement = statement.join(
+            Applications, Applications.id == ApplicationActions.application_id
+        ).where(Applications.updated_at >= since)
+    return statement
+
+
+class SearchEngine(abc.ABC):
+    name = ""
+
+    @abc.abstractmethod
+    async def search(
+        self,
+        session: AsyncSession,
+        user_id: UUID,
+        terms: list[str],
+        filters: ApplicationFilters,
+        limit: int,
+        offset: int = 0,
+    ) -> tuple[list[dict], bool]:
+        """A page of matches, best first, and whether another page exists."""
+
+    def apply(self, applications: dict, comments: list, removed: set) -> None:
+        """Committed changes from this worker; engines backed by the database ignore them."""
+
+
+class FulltextSearch(SearchEngine):
+    name = "fulltext"
+
+    def query(self, user_id: UUID, terms: list[str], filters: ApplicationFilters, limit: int, offset: int):
+        against = " ".join(terms)
+        app_score = match(
+            Applications.subject, Applications.description, Applications.to, against=against
+        ).in_natural_language_mode()
+        remark_score = match(ApplicationActions.comments, against=against).in_natural_language_mode()
+        hits = union_all(
+            select(Applications.id.label("id"), app_score.label("score")).where(app_score),
+            select(ApplicationActions.application_id.label("id"), remark_score.label("score")).where(
+                remark_score
+            ),
+        ).subquery()
+        ranked = (
+            select(hits.c.id, func.sum(hits.c.score).label("score"))
+            .group_by(hits.c.id)
+            .subquery()
+        )
+        return (
+            select(*LIST_COLUMNS, ranked.c.score)
+            .join(ranked, ranked.c.id == Applications.id)
+            .where(_visible(user_id), *filters.clauses())
+            .order_by(ranked.c.score.desc(), Applications.id.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+
+    async def search(self, session, user_id, terms, filters, limit, offset=0):
+        rows = (await session.execute(self.query(user_id, terms, filters, limit + 1, offset))).all()
+        results = [{**dict(zip(LIST_KEYS, row)), "score": round(float(row[-1]), 4)} for row in rows]
+        return results[:limit], len(results) > limit
+
+
+class _Snapshot:
+    """Inverted index over the applications; ids are mapped to small ints
+    since hashing and comparing UUIDs dominated scoring."""
+
+    # Field weights folded into the term frequencies
+    WEIGHTS = {"subject": 3.0, "to": 1.5, "description": 1.0, "comments": 1.0}
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, applications, comments):
+        self.ids: list[Optional[UUID]] = []
+        self.docnos: dict[UUID, int] = {}
+        self.fields: dict[int, dict[str, list[str]]] = {}
+        self.comments: dict[int, list[str]] = defaultdict(list)
+        self.versions: dict[int, int] = {}
+        self.lengths: dict[int, float] = {}
+        self.total = 0.0
+        self.postings: dict[str, dict[int, float]] = defaultdict(dict)
+        # Latest updated_at indexed; refreshes re-read from about here
+        self.watermark = None
+        for application_id, version, updated_at, *texts in applications:
+            docno = self._docno(application_id)
+            self.fields[docno] = {name: tokenize(text) for name, text in zip(TEXT_FIELDS, texts)}
+            self.versions[docno] = version
+            self._advance(updated_at)
+        for application_id, comment in comments:
+            docno = self.docnos.get(application_id)
+            if docno is not None:
+                self.comments[docno].extend(tokenize(comment))
+        frequencies = {docno: self._frequencies(docno) for docno in self.fields}
+        self.lengths = {docno: sum(counts.values()) for docno, counts in frequencies.items()}
+        self.total = sum(self.lengths.values())
+        for docno, counts in frequencies.items():
+            self._add_postings(docno, counts)
+
+    @property
+    def average(self) -> float:
+        # Documents are normalized against the average when (re)indexed;
+        # the rest keep theirs, which drifts little
+        return self.total / len(self.lengths) if self.total else 1.0
+
+    def _advance(self, updated_at) -> None:
+        if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+            self.watermark = updated_at
+
+    def _docno(self, application_id: UUID) -> int:
+        docno = self.docnos.get(application_id)
+        if docno is None:
+            docno = self.docnos[application_id] = len(self.ids)
+            self.ids.append(application_id)
+        return docno
+
+    def version(self, application_id: UUID) -> Optional[int]:
+        docno = self.docnos.get(application_id)
+        return self.versions.get(docno) if docno is not None else None
+
+    def _frequencies(self, docno: int) -> dict[str, float]:
+        frequencies: dict[str, float] = {}
+        for name, words in self.fields[docno].items():
+            weight = self.WEIGHTS[name]
+            for word in words:
+                frequencies[word] = frequencies.get(word, 0.0) + weight
+        for word in self.comments.get(docno, ()):
+            frequencies[word] = frequencies.get(word, 0.0) + self.WEIGHTS["comments"]
+        return frequencies
+
+    def _add_postings(self, docno: int, frequencies: dict[str, float]) -> None:
+        length = sum(frequencies.values())
+        self.total += length - self.lengths.get(docno, 0.0)
+        self.lengths[docno] = length
+        # Postings hold BM25's term-frequency part; a query only adds up idf * weight
+        norm = self.K1 * (1 - self.B + self.B * length / self.average)
+        for word, frequency in frequencies.items():
+            self.postings[word][docno] = frequency * (self.K1 + 1) / (frequency + norm)
+
+    def _drop_postings(self, docno: int) -> None:
+        self.total -= self.lengths.pop(docno, 0.0)
+        for word in self._frequencies(docno):
+            posting = self.postings.get(word)
+            if posting is not None:
+                posting.pop(docno, None)
+                if not posting:
+                    del self.postings[word]
+
+    def apply(self, applications: dict, comments: list, removed: set) -> None:
+        touched = {self._docno(application_id) for application_id in applications}
+        touched.update(
+            self.docnos[application_id] for application_id, _ in comments if application_id in self.docnos
+        )
+        gone = {self.docnos[application_id] for application_id in removed if application_id in self.docnos}
+        for docno in touched | gone:
+            if docno in self.fields:
+                self._drop_postings(docno)
+        for application_id, texts in applications.items():
+            self.fields[self.docnos[application_id]] = {
+                name: tokenize(text) for name, text in texts.items()
+            }
+        for application_id, comment in comments:
+            docno = self.docnos.get(application_id)
+            if docno is not None:
+                self.comments[docno].extend(tokenize(comment))
+        for docno in gone:
+            self.fields.pop(docno, None)
+            self.comments.pop(docno, None)
+            self.versions.pop(docno, None)
+            self.docnos.pop(self.ids[docno], None)
+            self.ids[docno] = None
+        for docno in touched - gone:
+            if docno in self.fields:
+                self._add_postings(docno, self._frequencies(docno))
+
+    def reindex(self, documents: dict, remarks: dict) -> None:
+        """Replace re-read applications, remarks included (see _tokenize_changes)."""
+        for application_id, (version, updated_at, fields) in documents.items():
+            docno = self._docno(application_id)
+            if docno in self.fields:
+                self._drop_postings(docno)
+            self.fields[docno] = fields
+            self.comments[docno] = remarks.get(application_id, [])
+            self.versions[docno] = version
+            self._add_postings(docno, self._frequencies(docno))
+            self._advance(updated_at)
+
+    def scores(self, terms: list[str]) -> dict[int, float]:
+        documents = len(self.fields)
+        scores: dict[int, float] = {}
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (documents - len(posting) + 0.5) / (len(posting) + 0.5))
+            for docno, weight in posting.items():
+                scores[docno] = scores.get(docno, 0.0) + idf * weight
+        return scores
+
+
+def _tokenize_changes(applications, comments) -> tuple[dict, dict]:
+    """Rows from indexed_query and remarks_query, tokenized for _Snapshot.reindex."""
+    documents = {
+        application_id: (version, updated_at, {name: tokenize(text) for name, text in zip(TEXT_FIELDS, texts)})
+        for application_id, version, updated_at, *texts in applications
+    }
+    remarks: dict[UUID, list[str]] = defaultdict(list)
+    for application_id, comment in comments:
+        remarks[application_id].extend(tokenize(comment))
+    return documents, remarks
+
+
+class InvertedIndexSearch(SearchEngine):
+    """BM25 over an in-process inverted index of every application."""
+
+    name = "memory"
+    # Ranked ids checked against visibility and filters per query
+    CHUNK = 500
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[_Snapshot] = None
+        self._built_at = 0.0
+        self._rebuilding = False
+        self._replay: list[tuple] = []
+        self._lock = threading.Lock()
+        self._rebuild_lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._snapshot is not None and time.monotonic() - self._built_at < self.refresh_seconds
+
+    async def ensure_fresh(self, session: AsyncSession) -> None:
+        if self._fresh():
+            return
+        async with self._rebuild_lock:
+            if self._fresh():
+                return
+            started = time.monotonic()
+            if self._snapshot is None:
+                await self._build(session)
+            else:
+                await self._refresh(session)
+            self._built_at = started
+
+    async def _build(self, session: AsyncSession) -> None:
+        with self._lock:
+            self._rebuilding = True
+            self._replay = []
+        try:
+            applications = (await session.execute(indexed_query())).all()
+            comments = (await session.execute(remarks_query())).all()
+            # Tokenizing is CPU-bound; a thread keeps the loop serving
+            # requests meanwhile
+            snapshot = await asyncio.to_thread(_Snapshot, applications, comments)
+        except BaseException:
+            with self._lock:
+                self._rebuilding = False
+                self._replay = []
+            raise
+        with self._lock:
+            self._rebuilding = False
+            # Commits since the rows were read
+            for changes in self._replay:
+                snapshot.apply(*changes)
+            self._replay = []
+            self._snapshot = snapshot
+
+    async def _refresh(self, session: AsyncSession) -> None:
+        """Re-index what changed since the watermark, whoever changed it."""
+        watermark = self._snapshot.watermark
+        since = watermark - REFRESH_OVERLAP if watermark is not None else None
+        rows = (await session.execute(indexed_query(since))).all()
+        with self._lock:
+            # The overlap re-reads rows already indexed at this version
+            changed = [row for row in rows if self._snapshot.version(row[0]) != row[1]]
+        if not changed:
+            return
+        wanted = {row[0] for row in changed}
+        remarks = [
+            row for row in (await session.execute(remarks_query(since))).all() if row[0] in wanted
+        ]
+        documents, remarks = await asyncio.to_thread(_tokenize_changes, changed, remarks)
+        with self._lock:
+            self._snapshot.reindex(documents, remarks)
+
+    def apply(self, applications, comments, removed):
+        with self._lock:
+            if self._rebuilding:
+                self._replay.append((applications, comments, removed))
+            if self._snapshot is not None:
+                self._snapshot.apply(applications, comments, removed)
+
+    def _ranked_chunks(self, scores: dict[int, float], wanted: int):
+        """Best-first chunks of (score, docno); only sorts everything if the top few fall short."""
+        head = max(self.CHUNK, wanted * 4)
+        ranked = heapq.nlargest(head, zip(scores.values(), scores.keys()))
+        for start in range(0, len(ranked), self.CHUNK):
+            yield ranked[start:start + self.CHUNK]
+        if len(scores) > head:
+            rest = sorted(zip(scores.values(), scores.keys()), reverse=True)[head:]
+            for start in range(0, len(rest), self.CHUNK):
+                yield rest[start:start + self.CHUNK]
+
+    async def search(self, session, user_id, terms, filters, limit, offset=0):
+        await self.ensure_fresh(session)
+        with self._lock:
+            snapshot = self._snapshot
+            scores = snapshot.scores(terms)
+            ids, docnos = snapshot.ids, snapshot.docnos
+        wanted = offset + limit + 1
+        page: list[dict] = []
+        for ranked in self._ranked_chunks(scores, wanted):
+            chunk = {ids[docno]: score for score, docno in ranked if ids[docno] is not None}
+            rows = (await session.execute(candidates_query(chunk, user_id, filters))).all()
+            rows.sort(key=lambda row: (chunk[row.id], docnos.get(row.id, -1)), reverse=True)
+            page.extend({**dict(zip(LIST_KEYS, row)), "score": round(chunk[row.id], 4)} for row in rows)
+            if len(page) >= wanted:
+                break
+        return page[offset:offset + limit], len(page) > offset + limit
+
+
+SEARCH_ENGINES = {engine.name: engine for engine in (FulltextSearch, InvertedIndexSearch)}
+
+
+def create_search_engine(name: str) -> SearchEngine:
+    if name not in ("auto", *SEARCH_ENGINES):
+        raise RuntimeError(f"SEARCH_ENGINE must be one of auto, {', '.join(SEARCH_ENGINES)}")
+    has_fulltext = async_engine.dialect.name == "mysql"
+    if name == "fulltext" and not has_fulltext:
+        raise RuntimeError("SEARCH_ENGINE=fulltext needs MySQL; use auto or memory")
+    if name == "memory" and has_fulltext:
+        logging.warning("SEARCH_ENGINE=memory ignored: MySQL has FULLTEXT indexes, using fulltext")
+    if has_fulltext:
+        return FulltextSearch()
+    return InvertedIndexSearch(SEARCH_INDEX_REFRESH_SECONDS)
+
+
+search_engine = create_search_engine(SEARCH_ENGINE)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    applications, comments, removed = session.info.setdefault(_PENDING_CHANGES, ({}, [], set()))
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Applications) and (
+            obj in session.new
+            or any(attributes.get_history(obj, name).has_changes() for name in TEXT_FIELDS)
+        ):
+            applications[obj.id] = {name: getattr(obj, name) for name in TEXT_FIELDS}
+        elif isinstance(obj, ApplicationActions) and obj in session.new and obj.comments:
+            comments.append((UUID(str(obj.application_id)), obj.comments))
+    removed.update(obj.id for obj in session.deleted if isinstance(obj, Applications))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    changes = session.info.pop(_PENDING_CHANGES, None)
+    if changes and any(changes):
+        search_engine.apply(*changes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_changes(session, previous_transaction):
+    session.info.pop(_PENDING_CHANGES, None)
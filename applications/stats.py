@@ -0,0 +1,100 @@
+"""get-stats backed by the application_daily_stats rollup table.
+
+Counts are summed with GROUP BY in SQL over rollup rows (one per day, handler
+and status), so a dashboard over years of data costs O(days) regardless of how
+many applications exist. Week/month buckets fold the day rows in Python.
+
+Rebuild the rollup from scratch (e.g. after a restore) with:
+    python -m applications.stats
+"""
+from datetime import date, timedelta
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import delete, func, insert, literal, select, Uuid
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import (
+    Applications,
+    ApplicationDailyStats,
+    ApplicationStatus,
+    UNASSIGNED_HANDLER,
+)
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def bucket_key(day: date, granularity: str) -> str:
+    if granularity == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()  # ISO week's Monday
+    if granularity == "month":
+        return day.strftime("%Y-%m")
+    return day.isoformat()
+
+
+def empty_bucket() -> dict:
+    return {status.value: 0 for status in ApplicationStatus}
+
+
+def stats_query(
+    handler_id: Optional[UUID] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+):
+    statement = select(
+        ApplicationDailyStats.day,
+        ApplicationDailyStats.status,
+        func.sum(ApplicationDailyStats.count),
+    ).group_by(ApplicationDailyStats.day, ApplicationDailyStats.status)
+    if handler_id is not None:
+        statement = statement.where(ApplicationDailyStats.handler_id == handler_id)
+    if from_date is not None:
+        statement = statement.where(ApplicationDailyStats.day >= from_date)
+    if to_date is not None:
+        statement = statement.where(ApplicationDailyStats.day <= to_date)
+    return statement
+
+
+async def fetch_stats(
+    session: AsyncSession,
+    handler_id: Optional[UUID] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    granularity: str = "day",
+) -> dict:
+    """Counts per bucket and status; ``handler_id=None`` covers every handler."""
+    statement = stats_query(handler_id, from_date, to_date)
+    stats: dict[str, dict] = {}
+    for day, status, count in await session.execute(statement):
+        if not count:
+            continue
+        bucket = stats.setdefault(bucket_key(day, granularity), empty_bucket())
+        bucket[status.value] += int(count)
+    return dict(sorted(stats.items()))
+
+
+def rebuild_daily_stats(connection) -> None:
+    """Recompute every rollup row from `applications` (run inside a transaction)."""
+    connection.execute(delete(ApplicationDailyStats))
+    day = func.date(Applications.created_at)
+    handler = func.coalesce(
+        Applications.current_handler_id, literal(UNASSIGNED_HANDLER, Uuid)
+    )
+    source = select(day, handler, Applications.status, func.count()).group_by(
+        day, handler, Applications.status
+    )
+    connection.execute(
+        insert(ApplicationDailyStats).from_select(
+            ["day", "handler_id", "status", "count"], source
+        )
+    )
+
+
+if __name__ == "__main__":
+    from config import engine
+    from db.models import Base
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        rebuild_daily_stats(connection)
+    print("[stats] application_daily_stats rebuilt")
@@ -0,0 +1,59 @@
+"""OTP hashing off the event loop.
+
+``OTP_HASH_MODE`` picks how new OTPs are hashed:
+
+* ``bcrypt`` (default): a bcrypt hash. Each hash or check takes ~200 ms
+  of CPU, so it runs on a small dedicated thread pool (bcrypt releases the
+  GIL) of ``OTP_HASH_WORKERS`` threads; extra logins queue there instead
+  of blocking the event loop or the default pool used for uploads.
+* ``hmac``: HMAC-SHA256 of the email and OTP keyed with JWT_SECRET. A
+  6-digit OTP that expires in 5 minutes after 3 attempts gains nothing
+  from a slow hash unless the store itself leaks, and the key is not in
+  the store. Takes microseconds, so it runs inline.
+
+Checks go by the stored value's format, so switching modes does not
+invalidate OTPs already sent.
+"""
+import asyncio
+import hashlib
+import hmac
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from config import JWT_SECRET, OTP_HASH_MODE, OTP_HASH_WORKERS
+
+_HMAC_PREFIX = "hmac-sha256$"
+
+_executor = ThreadPoolExecutor(max_workers=OTP_HASH_WORKERS, thread_name_prefix="otp-hash")
+
+
+def _hmac_digest(email: str, otp: str) -> str:
+    message = f"{email}\x00{otp}".encode("utf-8")
+    return hmac.new(JWT_SECRET.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def hash_otp_sync(email: str, otp: str, mode: str = OTP_HASH_MODE) -> str:
+    if mode == "hmac":
+        return _HMAC_PREFIX + _hmac_digest(email, otp)
+    return bcrypt.hashpw(otp.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+
+def check_otp_sync(email: str, otp: str, hashed: str) -> bool:
+    if hashed.startswith(_HMAC_PREFIX):
+        return hmac.compare_digest(hashed[len(_HMAC_PREFIX):], _hmac_digest(email, otp))
+    return bcrypt.checkpw(otp.encode("utf-8"), hashed.encode("utf-8"))
+
+
+async def hash_otp(email: str, otp: str, mode: str = OTP_HASH_MODE) -> str:
+    if mode == "hmac":
+        return hash_otp_sync(email, otp, mode)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, hash_otp_sync, email, otp, mode)
+
+
+async def check_otp(email: str, otp: str, hashed: str) -> bool:
+    if hashed.startswith(_HMAC_PREFIX):
+        return check_otp_sync(email, otp, hashed)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, check_otp_sync, email, otp, hashed)
@@ -0,0 +1,149 @@
+"""Per-worker cache of authenticated principals, keyed by the JWT ``sub``.
+
+protectRoute used to open a session and SELECT the user on every request.
+Entries here are bounded (LRU) and expire after PRINCIPAL_CACHE_TTL_SECONDS.
+When a user's role or department changes, the owning worker publishes the
+user id on a Redis channel so every uvicorn worker drops its copy. Without
+Redis only the local worker is invalidated and the others rely on the TTL.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS
+from db.models import User
+from .utils import redis_client, use_redis
+
+INVALIDATION_CHANNEL = "principal-cache:invalidate"
+# Published instead of a user id to drop every entry (e.g. bulk role changes)
+INVALIDATE_ALL = "*"
+
+# Columns copied out of the ORM row; hits rebuild a transient User from these
+_CACHED_COLUMNS = (
+    "id",
+    "username",
+    "role",
+    "department",
+    "tcet_email",
+    "isEmailVerified",
+    "created_at",
+)
+
+
+class PrincipalCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pubsub = None
+        self._listener = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, sub: str) -> Optional[User]:
+        """Return a fresh (transient) User for ``sub`` or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(sub)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[sub]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(sub)
+            self.hits += 1
+            snapshot = entry[1]
+        # A new instance per hit so handlers never share mutable ORM state
+        return User(**snapshot)
+
+    def put(self, sub: str, user: User) -> None:
+        snapshot = {column: getattr(user, column) for column in _CACHED_COLUMNS}
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[sub] = (expires_at, snapshot)
+            self._entries.move_to_end(sub)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, sub: str) -> None:
+        """Drop ``sub`` in this worker and broadcast the drop to the others."""
+        self._discard(sub)
+        if use_redis:
+            try:
+                redis_client.publish(INVALIDATION_CHANNEL, sub)
+            except Exception as e:
+                logging.warning(f"Failed to broadcast principal invalidation: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "shared_invalidation": self._listener is not None,
+        }
+
+    def _discard(self, sub: str) -> None:
+        if sub == INVALIDATE_ALL:
+            self.clear()
+            return
+        with self._lock:
+            if self._entries.pop(sub, None) is not None:
+                self.invalidations += 1
+
+    def _on_message(self, message) -> None:
+        self._discard(message["data"])
+
+    def _on_listener_error(self, exc, pubsub, thread) -> None:
+        # Invalidations may have been missed while disconnected; start cold
+        logging.warning(f"Principal cache listener error, clearing cache: {exc}")
+        self.clear()
+        time.sleep(1)
+
+    def start_listener(self) -> None:
+        """Subscribe to cross-worker invalidations (no-op without Redis)."""
+        if not use_redis or self._listener is not None:
+            return
+        try:
+            self._pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_message})
+            self._listener = self._pubsub.run_in_thread(
+                sleep_time=1.0,
+                daemon=True,
+                exception_handler=self._on_listener_error,
+            )
+        except Exception as e:
+            logging.warning(f"Principal cache invalidation listener unavailable: {e}")
+            self._pubsub = None
+            self._listener = None
+
+    def stop_listener(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+
+principal_cache = PrincipalCache(
+    maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,63 @@
+"""Sliding-window rate limiter: one atomic Redis round trip per check.
+
+Each key holds the timestamps of the requests it allowed within the last
+``window`` seconds (a sorted set in Redis, a JSON list otherwise). A request is
+allowed while fewer than ``limit`` remain, so at most ``limit`` requests
+pass in any window, bursts included. In Redis, pruning, counting and
+recording run in one Lua script against the server clock, so concurrent
+workers cannot race each other past the limit.
+
+Without Redis (or if a call to it fails) the same algorithm runs against
+the cross-worker store from auth/shared_store.py, holding its lock for
+the read-modify-write; each key keeps at most ``limit`` timestamps.
+"""
+import json
+import logging
+import secrets
+import time
+
+# KEYS[1] key; ARGV limit, window in ms, unique member.
+# Returns {allowed (0/1), ms until the next slot frees up}
+_SLIDING_WINDOW = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return {0, tonumber(oldest[2]) + window - now}
+end
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, 0}
+"""
+
+
+class SlidingWindowLimiter:
+    def __init__(self, redis_client=None, store=None):
+        self._script = redis_client.register_script(_SLIDING_WINDOW) if redis_client else None
+        self._store = store
+
+    def hit(self, key: str, limit: int, window: float) -> tuple[bool, float]:
+        """Record a request for ``key`` if allowed; returns (allowed, retry_after)."""
+        if self._script is not None:
+            try:
+                allowed, retry_ms = self._script(
+                    keys=[key], args=[limit, int(window * 1000), secrets.token_hex(8)]
+                )
+                return bool(allowed), retry_ms / 1000
+            except Exception as e:
+                logging.warning(f"Redis rate limiter unavailable, using the shared store: {e}")
+        return self._store_hit(key, limit, window)
+
+    def _store_hit(self, key: str, limit: int, window: float) -> tuple[bool, float]:
+        with self._store.locked():
+            now = time.time()
+            raw = self._store.get(key)
+            hits = [t for t in json.loads(raw) if t > now - window] if raw else []
+            if len(hits) >= limit:
+                return False, hits[0] + window - now
+            hits.append(round(now, 3))
+            self._store.setex(key, window, json.dumps(hits))
+            return True, 0.0
@@ -6,14 +6,13 @@ from .schema import (
 )
 import bcrypt
 from sqlalchemy import Select as select
-from sqlalchemy.orm import Session
 from db.models import User, VerificationToken
 from fastapi import APIRouter, status, Response, Cookie, Request
-from config import engine, ACCESS_TOKEN_EXPIRY, create_access_token, PRODUCTION
+from config import async_session, ACCESS_TOKEN_EXPIRY, create_access_token, PRODUCTION
 from datetime import timedelta
-from mail import create_message
-from .utils import generate_otp, store_otp, verify_otp, can_send_new_otp, store_user_registration_data, get_user_registration_data, client_ip, is_rate_limited
-from fastapi.responses import JSONResponse
+from mail import MailQueueFull, create_message
+from .utils import generate_otp, store_otp, discard_otp, verify_otp, can_send_new_otp, store_user_registration_data, get_user_registration_data, client_ip, is_rate_limited
+from serialization import JSONResponse
 from fastapi.exceptions import HTTPException
 from db.models import UserRole
 from dotenv import load_dotenv
@@ -25,6 +24,24 @@ import os
 
 authRouter = APIRouter()
 
+# Retry-After for OTP requests refused while the mail queue is full
+MAIL_BUSY_RETRY_AFTER_SECONDS = 30
+
+
+async def _send_otp_mail(email: str, subject: str, html: str):
+    """Queue an OTP mail. If the queue is full, drop the OTP just stored
+    (so the resend cooldown does not block a retry) and return a 503."""
+    try:
+        await create_message([email], subject, html)
+    except MailQueueFull:
+        discard_otp(email)
+        return JSONResponse(
+            content={"message": "Could not send the OTP right now. Please try again shortly."},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(MAIL_BUSY_RETRY_AFTER_SECONDS)},
+        )
+    return None
+
 
 @authRouter.post("/signup")
 async def signup(user: SignUpSchema, request: Request):
@@ -36,9 +53,9 @@ async def signup(user: SignUpSchema, request: Request):
             status_code=status.HTTP_429_TOO_MANY_REQUESTS
         )
     # Check if user already exists - use generic message to prevent account enumeration
-    with Session(engine) as session:
+    async with async_session() as session:
         statement = select(User).where(User.tcet_email == user.email)
-        results = session.scalars(statement).first()
+        results = (await session.scalars(statement)).first()
         if results:
             return JSONResponse(
                 content={"message": "If your email is registered, an OTP has been sent"},
@@ -57,7 +74,7 @@ async def signup(user: SignUpSchema, request: Request):
     
     # Generate OTP
     otp = generate_otp()
-    store_otp(user.email, otp)
+    await store_otp(user.email, otp)
     
     # Send OTP via email
     html = f"""<!DOCTYPE html>
@@ -84,8 +101,9 @@ async def signup(user: SignUpSchema, request: Request):
     </html>"""
     
     subject = "Your OTP for Account Verification"
-    emails = [user.email]
-    await create_message(emails, subject, html)
+    failed = await _send_otp_mail(user.email, subject, html)
+    if failed is not None:
+        return failed
     
     # Return a generic response regardless of registration status so the page
     # cannot be used to enumerate registered emails.
@@ -105,7 +123,7 @@ async def verify_signup_otp(verification: OTPVerificationSchema, request: Reques
             status_code=status.HTTP_429_TOO_MANY_REQUESTS
         )
     # Verify the OTP
-    if not verify_otp(verification.email, verification.otp):
+    if not await verify_otp(verification.email, verification.otp):
         return JSONResponse(
             content={"message": "Invalid or expired OTP"},
             status_code=status.HTTP_400_BAD_REQUEST
@@ -131,9 +149,9 @@ async def verify_signup_otp(verification: OTPVerificationSchema, request: Reques
     )
     
     # Save to database
-    with Session(engine) as session:
+    async with async_session() as session:
         statement = select(User).where(User.tcet_email == verification.email)
-        existing_user = session.scalars(statement).first()
+        existing_user = (await session.scalars(statement)).first()
         
         if existing_user:
             return JSONResponse(
@@ -142,7 +160,7 @@ async def verify_signup_otp(verification: OTPVerificationSchema, request: Reques
             )
         
         session.add(newUser)
-        session.commit()
+        await session.commit()
     
     # Create and return JWT token
     access_token = create_access_token(
@@ -176,9 +194,9 @@ async def login(body: LoginSchema, request: Request):
             content={"message": "Too many requests. Please try again later."},
             status_code=status.HTTP_429_TOO_MANY_REQUESTS
         )
-    with Session(engine) as session:
+    async with async_session() as session:
         statement = select(User).where(User.tcet_email == body.email)
-        user = session.scalars(statement).first()
+        user = (await session.scalars(statement)).first()
         # Generic response for non-existent users and unverified emails to prevent enumeration
         if not user:
             return JSONResponse(
@@ -201,7 +219,7 @@ async def login(body: LoginSchema, request: Request):
     
     # Generate OTP
     otp = generate_otp()
-    store_otp(body.email, otp)
+    await store_otp(body.email, otp)
     
     # Send OTP via email
     html = f"""<!DOCTYPE html>
@@ -228,8 +246,9 @@ async def login(body: LoginSchema, request: Request):
     </html>"""
     
     subject = "Your Login OTP"
-    emails = [body.email]
-    await create_message(emails, subject, html)
+    failed = await _send_otp_mail(body.email, subject, html)
+    if failed is not None:
+        return failed
     
     return JSONResponse(
         content={"message": "OTP sent to your email"},
@@ -247,16 +266,16 @@ async def verify_login_otp(verification: OTPVerificationSchema, request: Request
             status_code=status.HTTP_429_TOO_MANY_REQUESTS
         )
     # Verify the OTP
-    if not verify_otp(verification.email, verification.otp):
+    if not await verify_otp(verification.email, verification.otp):
         return JSONResponse(
             content={"message": "Invalid or expired OTP"},
             status_code=status.HTTP_400_BAD_REQUEST
         )
     
     # Get user from database
-    with Session(engine) as session:
+    async with async_session() as session:
         statement = select(User).where(User.tcet_email == verification.email)
-        user = session.scalars(statement).first()
+        user = (await session.scalars(statement)).first()
         
         if not user:
             return JSONResponse(
@@ -297,9 +316,9 @@ async def resend_otp(body: ResendOTPSchema, request: Request):
             status_code=status.HTTP_429_TOO_MANY_REQUESTS
         )
     # Check if user exists
-    with Session(engine) as session:
+    async with async_session() as session:
         statement = select(User).where(User.tcet_email == body.email)
-        user = session.scalars(statement).first()
+        user = (await session.scalars(statement)).first()
         
         # For security reasons, always return success even if user doesn't exist
         if not user:
@@ -317,7 +336,7 @@ async def resend_otp(body: ResendOTPSchema, request: Request):
     
     # Generate OTP
     otp = generate_otp()
-    store_otp(body.email, otp)
+    await store_otp(body.email, otp)
     
     # Send OTP via email
     html = f"""<!DOCTYPE html>
@@ -344,8 +363,9 @@ async def resend_otp(body: ResendOTPSchema, request: Request):
     </html>"""
     
     subject = "Your New OTP"
-    emails = [body.email]
-    await create_message(emails, subject, html)
+    failed = await _send_otp_mail(body.email, subject, html)
+    if failed is not None:
+        return failed
     
     return JSONResponse(
         content={"message": "If your email is registered, an OTP has been sent"},
@@ -0,0 +1,256 @@
+"""Cross-worker TTL key/value store, used in place of Redis when it is down.
+
+uvicorn runs several worker processes, so per-process dicts lose an OTP
+stored by one worker when another handles the verify. This store is one
+fixed-size file (under /dev/shm by default, so RAM) mapped into every
+worker:
+
+* a header, then ``slot_count`` slots of ``slot_size`` bytes, each holding
+  state, expiry (wall clock, which every process shares), key hash, key
+  and value
+* a key hashes to a slot and is found by linear probing over at most
+  PROBE_LIMIT slots, so get/set/delete cost O(1)
+* expired and deleted slots are reused on insert; when a key's whole
+  probe window is live, the entry closest to expiry is evicted, so memory
+  never grows past the file size
+
+Processes serialize on an flock of the file and threads on an RLock.
+The file is opened and mapped on first use, so a worker that never falls
+back never touches it. A file with another layout is never resized in
+place, since other workers may have it mapped (touching a truncated map
+is a SIGBUS): a fresh file is renamed over it, and workers still holding
+the old one reopen when they see the path point elsewhere (workers
+configured with different sizes cannot share a file; each rebuild starts
+empty). The methods are the subset of redis-py's client that auth/utils.py uses,
+so the two are interchangeable there.
+"""
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Optional, Union
+
+MAGIC = b"IOTTL001"
+_HEADER = struct.Struct("<8sQQ")  # magic, slot count, slot size
+HEADER_SIZE = 64
+# state, expires_at, key hash, key length, value length
+_SLOT = struct.Struct("<BdQHI")
+EMPTY, USED, DELETED = 0, 1, 2
+PROBE_LIMIT = 32
+
+
+class ValueTooLarge(ValueError):
+    pass
+
+
+def _key_hash(key: bytes) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def _encode(value: Union[str, bytes]) -> bytes:
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+class SharedTTLStore:
+    def __init__(self, path: str, size_bytes: int, slot_size: int = 1024):
+        self.path = path
+        self.slot_size = slot_size
+        self.slot_count = max(PROBE_LIMIT, (size_bytes - HEADER_SIZE) // slot_size)
+        # Key and value bytes that fit in one slot
+        self.capacity = slot_size - _SLOT.size
+        self.evictions = 0
+        self._size = HEADER_SIZE + self.slot_count * slot_size
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        self._pid = self._inode = None
+
+    def _open(self) -> None:
+        """Map the file at ``path``, creating it (or replacing one with
+        another layout) first."""
+        header = _HEADER.pack(MAGIC, self.slot_count, self.slot_size)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            size = os.fstat(fd).st_size
+            if size == 0:
+                # Just created; nobody can have mapped an empty file
+                os.ftruncate(fd, self._size)
+                os.pwrite(fd, header, 0)
+            elif size != self._size or os.pread(fd, _HEADER.size, 0) != header:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+                fd = self._replace(header)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._close()
+        self._fd, self._pid, self._inode = fd, os.getpid(), os.fstat(fd).st_ino
+        self._map = mmap.mmap(fd, self._size)
+
+    def _replace(self, header: bytes) -> int:
+        """Start empty in a new file renamed over ``path``; returns its fd."""
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self.path) or ".", prefix=".shared-store-"
+        )
+        try:
+            os.ftruncate(fd, self._size)  # zero-filled
+            os.pwrite(fd, header, 0)
+            os.rename(temp_path, self.path)
+        except BaseException:
+            os.close(fd)
+            os.unlink(temp_path)
+            raise
+        return fd
+
+    def _close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        if self._fd is not None and self._pid == os.getpid():
+            os.close(self._fd)
+        self._fd = self._map = None
+
+    def _replaced(self) -> bool:
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    @contextmanager
+    def locked(self):
+        """Hold the store across several calls (e.g. a read-modify-write)."""
+        with self._thread_lock:
+            if self._depth == 0:
+                if self._map is None or os.getpid() != self._pid:
+                    # First use, or forked after opening: an inherited fd
+                    # shares its flock
+                    self._open()
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+                if self._replaced():
+                    # Another worker rebuilt the file; follow it
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                    self._open()
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _offset(self, index: int) -> int:
+        return HEADER_SIZE + index * self.slot_size
+
+    def _probe(self, key: bytes, key_hash: int, now: float):
+        """(slot holding key, first reusable slot, live slot closest to expiry)."""
+        start = key_hash % self.slot_count
+        free = victim = None
+        victim_expiry = math.inf
+        for step in range(PROBE_LIMIT):
+            index = (start + step) % self.slot_count
+            offset = self._offset(index)
+            state, expires_at, slot_hash, key_length, _ = _SLOT.unpack_from(self._map, offset)
+            if state == EMPTY:
+                # Never used: nothing was ever probed past this slot
+                return None, index if free is None else free, victim
+            if state == USED and expires_at > now:
+                body = offset + _SLOT.size
+                if slot_hash == key_hash and self._map[body:body + key_length] == key:
+                    return index, free, victim
+                if expires_at < victim_expiry:
+                    victim, victim_expiry = index, expires_at
+            elif free is None:
+                free = index
+        return None, free, victim
+
+    def _find(self, name: str) -> Optional[int]:
+        key = _encode(name)
+        return self._probe(key, _key_hash(key), time.time())[0]
+
+    def get(self, name: str) -> Optional[str]:
+        with self.locked():
+            index = self._find(name)
+            if index is None:
+                return None
+            offset = self._offset(index)
+            _, _, _, key_length, value_length = _SLOT.unpack_from(self._map, offset)
+            start = offset + _SLOT.size + key_length
+            return self._map[start:start + value_length].decode("utf-8")
+
+    def setex(self, name: str, expiry: Union[int, float, timedelta], value: Union[str, bytes]) -> bool:
+        ttl = expiry.total_seconds() if isinstance(expiry, timedelta) else expiry
+        key, data = _encode(name), _encode(value)
+        if len(key) + len(data) > self.capacity:
+            raise ValueTooLarge(
+                f"{len(key) + len(data)} bytes does not fit a {self.capacity} byte slot"
+            )
+        key_hash = _key_hash(key)
+        with self.locked():
+            now = time.time()
+            index, free, victim = self._probe(key, key_hash, now)
+            if index is None:
+                index = free
+            if index is None:
+                index = victim
+                self.evictions += 1
+            offset = self._offset(index)
+            _SLOT.pack_into(self._map, offset, USED, now + ttl, key_hash, len(key), len(data))
+            body = offset + _SLOT.size
+            self._map[body:body + len(key) + len(data)] = key + data
+        return True
+
+    def delete(self, *names: str) -> int:
+        deleted = 0
+        with self.locked():
+            for name in names:
+                index = self._find(name)
+                if index is not None:
+                    self._map[self._offset(index)] = DELETED
+                    deleted += 1
+        return deleted
+
+    def ttl(self, name: str) -> int:
+        """Whole seconds left, or -2 if missing (as Redis reports it)."""
+        with self.locked():
+            index = self._find(name)
+            if index is None:
+                return -2
+            expires_at = _SLOT.unpack_from(self._map, self._offset(index))[1]
+        return max(0, math.ceil(expires_at - time.time()))
+
+    def purge_expired(self) -> int:
+        """Mark every expired entry deleted; lookups already ignore them."""
+        purged = 0
+        with self.locked():
+            now = time.time()
+            for index in range(self.slot_count):
+                offset = self._offset(index)
+                state, expires_at = _SLOT.unpack_from(self._map, offset)[:2]
+                if state == USED and expires_at <= now:
+                    self._map[offset] = DELETED
+                    purged += 1
+        return purged
+
+    def stats(self) -> dict:
+        live = 0
+        with self.locked():
+            now = time.time()
+            for index in range(self.slot_count):
+                state, expires_at = _SLOT.unpack_from(self._map, self._offset(index))[:2]
+                live += state == USED and expires_at > now
+        return {
+            "path": self.path,
+            "slots": self.slot_count,
+            "slot_size": self.slot_size,
+            "live": live,
+            "evictions": self.evictions,
+        }
@@ -1,27 +1,41 @@
-from config import JWT_SECRET, REDIS_URL
-from itsdangerous import URLSafeTimedSerializer
+from config import (
+    JWT_SECRET,
+    REDIS_URL,
+    DOCUMENT_LINK_TTL_SECONDS,
+    FALLBACK_STORE_MB,
+    FALLBACK_STORE_PATH,
+)
+from itsdangerous import BadSignature, URLSafeTimedSerializer
 import logging
 import secrets
 import string
-import bcrypt
 import json
 from datetime import datetime, timezone, timedelta
 import redis
+from metrics import OTP_SENT, OTP_VERIFY
+from .otp_hash import check_otp, hash_otp
+from .rate_limit import SlidingWindowLimiter
+from .shared_store import SharedTTLStore
 
 serializer = URLSafeTimedSerializer(secret_key=JWT_SECRET, salt="email-configuration")
+# Separate salt: an email token can never be replayed as a download link
+document_link_serializer = URLSafeTimedSerializer(secret_key=JWT_SECRET, salt="document-download")
 
-# Initialize Redis client with fallback to in-memory if Redis is unreachable
+# Initialize Redis client with fallback to the shared store if Redis is unreachable
 try:
     redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
     redis_client.ping()
     use_redis = True
 except Exception as e:
-    logging.warning(f"Redis not available, falling back to in-memory store: {e}")
+    logging.warning(f"Redis not available, falling back to the shared-memory store: {e}")
     use_redis = False
 
-otp_store = {}
-user_reg_data = {}
-rate_limit_store = {}
+# Shared by every worker on this host; stands in for Redis when it is down.
+# Opened on first use, so nothing is mapped while Redis serves everything
+fallback_store = SharedTTLStore(FALLBACK_STORE_PATH, FALLBACK_STORE_MB * 1024 * 1024)
+# OTPs and pending registrations; both support get/setex/delete/ttl
+kv_store = redis_client if use_redis else fallback_store
+rate_limiter = SlidingWindowLimiter(redis_client if use_redis else None, store=fallback_store)
 
 # Per-IP rate limits for auth endpoints (prevent email bombing / OTP brute force)
 IP_RATE_LIMITS = {
@@ -47,150 +61,87 @@ def client_ip(request) -> str:
 def is_rate_limited(key: str, ip: str) -> bool:
     """Return True if the IP exceeded the limit for the given key."""
     limit, window = IP_RATE_LIMITS[key]
-    if use_redis:
-        rl_key = f"rl:{key}:{ip}"
-        current = redis_client.get(rl_key)
-        if current is None:
-            redis_client.setex(rl_key, window, 1)
-            return False
-        if int(current) >= limit:
-            return True
-        redis_client.incr(rl_key)
-        return False
-    now = datetime.now(timezone.utc)
-    store_key = (key, ip)
-    timestamps = [
-        t for t in rate_limit_store.get(store_key, [])
-        if now - t < timedelta(seconds=window)
-    ]
-    if len(timestamps) >= limit:
-        rate_limit_store[store_key] = timestamps
-        return True
-    timestamps.append(now)
-    rate_limit_store[store_key] = timestamps
-    return False
+    allowed, _ = rate_limiter.hit(f"rl:{key}:{ip}", limit, window)
+    return not allowed
 
 def generate_otp(length=6):
     """Generate a numeric OTP of specified length using a CSPRNG"""
     digits = string.digits
     return ''.join(secrets.choice(digits) for _ in range(length))
 
-def store_otp(email, otp, expiry_minutes=5):
+async def store_otp(email, otp, expiry_minutes=5):
     """Store OTP with expiration time"""
-    hashed_otp = bcrypt.hashpw(otp.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    
-    if use_redis:
-        data = {
-            'hashed_otp': hashed_otp,
-            'attempts': 0,
-            'last_sent': datetime.now(timezone.utc).isoformat()
-        }
-        redis_client.setex(f"otp:{email}", timedelta(minutes=expiry_minutes), json.dumps(data))
-    else:
-        expiry_time = datetime.now(timezone.utc) + timedelta(minutes=expiry_minutes)
-        otp_store[email] = {
-            'hashed_otp': hashed_otp,
-            'expiry': expiry_time,
-            'attempts': 0,
-            'last_sent': datetime.now(timezone.utc)
-        }
+    hashed_otp = await hash_otp(email, otp)
+    data = {
+        'hashed_otp': hashed_otp,
+        'attempts': 0,
+        'last_sent': datetime.now(timezone.utc).isoformat()
+    }
+    kv_store.setex(f"otp:{email}", timedelta(minutes=expiry_minutes), json.dumps(data))
+    OTP_SENT.inc()
     return True
 
+def discard_otp(email):
+    """Drop a stored OTP (and with it the resend cooldown), e.g. when its
+    mail could not be queued"""
+    kv_store.delete(f"otp:{email}")
+
 def store_user_registration_data(email, name, department):
     """Store user registration data temporarily until OTP verification"""
-    if use_redis:
-        data = {
-            'name': name,
-            'department': department,
-            'timestamp': datetime.now(timezone.utc).isoformat()
-        }
-        redis_client.setex(f"reg:{email}", timedelta(minutes=30), json.dumps(data))
-    else:
-        user_reg_data[email] = {
-            'name': name,
-            'department': department,
-            'timestamp': datetime.now(timezone.utc)
-        }
+    data = {
+        'name': name,
+        'department': department,
+        'timestamp': datetime.now(timezone.utc).isoformat()
+    }
+    kv_store.setex(f"reg:{email}", timedelta(minutes=30), json.dumps(data))
 
 def get_user_registration_data(email):
     """Retrieve stored user registration data"""
-    if use_redis:
-        val = redis_client.get(f"reg:{email}")
-        if val:
-            redis_client.delete(f"reg:{email}")
-            return json.loads(val)
-        return None
-    else:
-        if email in user_reg_data:
-            data = user_reg_data[email]
-            del user_reg_data[email]
-            return data
-        return None
+    val = kv_store.get(f"reg:{email}")
+    if val:
+        kv_store.delete(f"reg:{email}")
+        return json.loads(val)
+    return None
 
-def verify_otp(email, otp):
+async def verify_otp(email, otp):
     """Verify if OTP is valid and not expired"""
-    if use_redis:
-        val = redis_client.get(f"otp:{email}")
-        if not val:
-            return False
-        otp_data = json.loads(val)
-        otp_data['attempts'] += 1
-        if otp_data['attempts'] > 3:
-            redis_client.delete(f"otp:{email}")
-            return False
-        
-        is_valid = bcrypt.checkpw(otp.encode('utf-8'), otp_data['hashed_otp'].encode('utf-8'))
-        if is_valid:
-            redis_client.delete(f"otp:{email}")
-        else:
-            # Update attempts count back to redis
-            ttl = redis_client.ttl(f"otp:{email}")
-            if ttl > 0:
-                redis_client.setex(f"otp:{email}", ttl, json.dumps(otp_data))
-        return is_valid
-    else:
-        if email not in otp_store:
-            return False
-        otp_data = otp_store[email]
-        if datetime.now(timezone.utc) > otp_data['expiry']:
-            del otp_store[email]
-            return False
-        otp_data['attempts'] += 1
-        if otp_data['attempts'] > 3:
-            del otp_store[email]
-            return False
-        is_valid = bcrypt.checkpw(otp.encode('utf-8'), otp_data['hashed_otp'].encode('utf-8'))
-        if is_valid:
-            del otp_store[email]
-        return is_valid
+    val = kv_store.get(f"otp:{email}")
+    if not val:
+        OTP_VERIFY.inc("missing")
+        return False
+    otp_data = json.loads(val)
+    otp_data['attempts'] += 1
+    if otp_data['attempts'] > 3:
+        kv_store.delete(f"otp:{email}")
+        OTP_VERIFY.inc("exhausted")
+        return False
+    # Count the attempt before the hash check yields to the thread pool, so
+    # concurrent guesses for the same email see it
+    ttl = kv_store.ttl(f"otp:{email}")
+    if ttl > 0:
+        kv_store.setex(f"otp:{email}", ttl, json.dumps(otp_data))
+
+    is_valid = await check_otp(email, otp, otp_data['hashed_otp'])
+    OTP_VERIFY.inc("valid" if is_valid else "invalid")
+    if is_valid:
+        kv_store.delete(f"otp:{email}")
+    return is_valid
 
 def can_send_new_otp(email):
     """Check if we can send a new OTP (rate limiting)"""
-    if use_redis:
-        val = redis_client.get(f"otp:{email}")
-        if not val:
-            return True
-        otp_data = json.loads(val)
-        last_sent = datetime.fromisoformat(otp_data['last_sent'])
-        time_since_last = datetime.now(timezone.utc) - last_sent
-        return time_since_last.total_seconds() >= 60
-    else:
-        if email not in otp_store:
-            return True
-        time_since_last = datetime.now(timezone.utc) - otp_store[email]['last_sent']
-        return time_since_last.total_seconds() >= 60
+    val = kv_store.get(f"otp:{email}")
+    if not val:
+        return True
+    otp_data = json.loads(val)
+    last_sent = datetime.fromisoformat(otp_data['last_sent'])
+    time_since_last = datetime.now(timezone.utc) - last_sent
+    return time_since_last.total_seconds() >= 60
 
 def cleanup_expired_data():
-    """Clean up expired data (run periodically if using memory)"""
+    """Free expired fallback entries (run periodically; Redis expires its own)"""
     if use_redis:
         return
-    now = datetime.now(timezone.utc)
-    for email in list(otp_store.keys()):
-        if now > otp_store[email]['expiry']:
-            del otp_store[email]
-    for email in list(user_reg_data.keys()):
-        if (now - user_reg_data[email]['timestamp']).total_seconds() > 1800:
-            del user_reg_data[email]
+    fallback_store.purge_expired()
 
 def create_url_safe_token(data: dict):
     token = serializer.dumps(data)
@@ -204,3 +155,13 @@ def decode_url_safe_token(token: str):
         logging.error(str(e))
         return None
 
+def create_document_token(document_url: str, user_id) -> str:
+    """Short-lived download token, bound to the user it was issued to."""
+    return document_link_serializer.dumps({"url": document_url, "sub": str(user_id)})
+
+def decode_document_token(token: str):
+    try:
+        return document_link_serializer.loads(token, max_age=DOCUMENT_LINK_TTL_SECONDS)
+    except BadSignature:
+        # Also covers SignatureExpired
+        return None
@@ -0,0 +1,210 @@
+"""Application detail: legacy join loader vs applications.detail, 1–500 actions.
+
+* ``legacy``  – the old getApplication query: Applications × actions × three
+                aliased users (application row repeated per action), then a
+                documents query, then the authorization check in Python
+                (serialization trimmed, so its timings are a lower bound)
+* ``loader``  – load_application_detail: application (authorized in SQL),
+                actions, documents; three queries at any history length
+* ``cached``  – getApplication's read path: current version, then the
+                versioned detail cache (the version row, authorized,
+                without Redis; nothing at all with it)
+
+Reports mean latency and statements executed per load.
+
+Usage:
+    python -m benchmarks.bench_application_detail [--actions 1 10 100 500]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from benchmarks.common import bootstrap_env, print_table
+
+bootstrap_env("bench_application_detail.db")
+
+from sqlalchemy import delete, event, insert, select  # noqa: E402
+from sqlalchemy.orm import aliased  # noqa: E402
+
+from applications.cache import detail_cache  # noqa: E402
+from applications.detail import head_query, load_application_detail, may_open, may_view  # noqa: E402
+from config import async_engine, async_session, engine  # noqa: E402
+from db.models import (  # noqa: E402
+    ApplicationActions,
+    Applications,
+    ApplicationStatus,
+    Base,
+    SupportingDocuments,
+    User,
+    UserRole,
+    role_matches,
+)
+
+
+def seed(action_counts: list[int]):
+    Base.metadata.create_all(engine)
+    users = [uuid4() for _ in range(10)]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    applications = {}
+    with engine.begin() as conn:
+        for model in (ApplicationActions, SupportingDocuments, Applications, User):
+            conn.execute(delete(model))
+        conn.execute(
+            insert(User),
+            [
+                {
+                    "id": uid,
+                    "username": f"user{i}",
+                    "role": "hod" if i else "student",
+                    "department": "CS",
+                    "tcet_email": f"detail{i}@example.com",
+                    "isEmailVerified": True,
+                }
+                for i, uid in enumerate(users)
+            ],
+        )
+        for n, count in enumerate(action_counts):
+            application_id = uuid4()
+            applications[count] = application_id
+            conn.execute(
+                insert(Applications).values(
+                    id=application_id,
+                    description="detail benchmark",
+                    subject=f"detail {count}",
+                    to="HOD",
+                    status=ApplicationStatus.PENDING,
+                    created_by_id=users[0],
+                    current_handler_id=users[1],
+                    created_at=start,
+                    year=1800,
+                    token_no=n + 1,
+                    is_verified=False,
+                )
+            )
+            conn.execute(
+                insert(ApplicationActions),
+                [
+                    {
+                        "id": uuid4(),
+                        "application_id": application_id,
+                        "from_user_id": users[i % 10],
+                        "to_user_id": users[(i + 1) % 10],
+                        "action_type": "FORWARD",
+                        "comments": "forwarded for review",
+                        "created_at": start + timedelta(minutes=i),
+                    }
+                    for i in range(count)
+                ],
+            )
+            conn.execute(
+                insert(SupportingDocuments),
+                [
+                    {
+                        "id": uuid4(),
+                        "application_id": application_id,
+                        "document_name": f"scan{d}.pdf",
+                        "document_url": f"media/{uuid4()}.pdf",
+                    }
+                    for d in range(2)
+                ],
+            )
+    return applications, users[0]
+
+
+async def legacy(application_id, user) -> dict:
+    async with async_session() as session:
+        CreatedByUser = aliased(User, name="created_by")
+        FromUser = aliased(User, name="from_user")
+        ToUser = aliased(User, name="to_user")
+        statement = (
+            select(Applications, ApplicationActions, CreatedByUser, FromUser, ToUser)
+            .outerjoin(ApplicationActions, ApplicationActions.application_id == Applications.id)
+            .outerjoin(CreatedByUser, Applications.created_by_id == CreatedByUser.id)
+            .outerjoin(FromUser, ApplicationActions.from_user_id == FromUser.id)
+            .outerjoin(ToUser, ApplicationActions.to_user_id == ToUser.id)
+            .where(Applications.id == application_id)
+        )
+        results = (await session.execute(statement)).all()
+        documents = (
+            await session.scalars(
+                select(SupportingDocuments).where(SupportingDocuments.application_id == application_id)
+            )
+        ).all()
+        application = results[0][0]
+        allowed = (
+            user.id in (application.created_by_id, application.current_handler_id)
+            or role_matches(user.role, UserRole.SYSTEM_ADMIN, UserRole.PRINCIPAL, UserRole.CLERK)
+        )
+        assert allowed
+        actions = [
+            {"id": str(action.id), "from": from_user.username, "to": to_user.username}
+            for _, action, _, from_user, to_user in results
+            if action
+        ]
+        return {"actions": actions, "document": documents[0].document_url}
+
+
+async def loader(application_id, user) -> dict:
+    async with async_session() as session:
+        return await load_application_detail(session, application_id, user)
+
+
+async def cached(application_id, user) -> dict:
+    async with async_session() as session:
+        version = detail_cache.shared_version(application_id)
+        payload = detail_cache.get(application_id, version) if version is not None else None
+        if payload is not None:
+            assert may_view(user, payload)
+            return payload
+        head = (await session.execute(head_query(application_id))).first()
+        assert may_open(user, head.created_by_id, head.current_handler_id)
+        payload = detail_cache.get(application_id, head.version)
+        if payload is None:
+            payload = await load_application_detail(session, application_id, user)
+            detail_cache.put(payload)
+        return payload
+
+
+async def measure(fn, application_id, user, repeat: int) -> tuple[float, int]:
+    await fn(application_id, user)  # warm up
+    counter = {"statements": 0}
+
+    def count(*_args, **_kwargs):
+        counter["statements"] += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await fn(application_id, user)
+    elapsed = (time.perf_counter() - started) / repeat
+    event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+    return elapsed, counter["statements"] // repeat
+
+
+async def main(args):
+    applications, creator_id = seed(args.actions)
+    async with async_session() as session:
+        user = await session.get(User, creator_id)
+    results = []
+    for count, application_id in applications.items():
+        for label, fn in (("legacy", legacy), ("loader", loader), ("cached", cached)):
+            elapsed, statements = await measure(fn, application_id, user, args.repeat)
+            results.append(
+                {
+                    "actions": count,
+                    "strategy": label,
+                    "ms": round(elapsed * 1000, 2),
+                    "statements": statements,
+                }
+            )
+    await async_engine.dispose()
+    print_table(results, ["actions", "strategy", "ms", "statements"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--actions", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,167 @@
+"""/api/application/all: full ORM load vs keyset page, at 10k/100k/1M rows.
+
+Seeds a scratch database with N applications spread over a few years and
+handlers, then times for the busiest handler (a clerk-like user):
+
+* ``legacy``      – the old query: every visible row as an ORM object,
+                    serialized by copying ``__dict__``
+* ``first page``  – fetch_application_page with the default page size
+* ``deep page``   – the same after walking ``--deep-pages`` pages in
+* ``filtered``    – first page with status + year filters
+
+Usage:
+    python -m benchmarks.bench_application_list [--sizes 10000 100000 1000000]
+
+The legacy run is skipped above ``--legacy-max`` rows since it only measures
+how long it takes to materialize the whole table.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import UUID, uuid4
+
+from benchmarks.common import bootstrap_env, print_table
+
+bootstrap_env("bench_application_list.db")
+
+from sqlalchemy import delete, insert, select  # noqa: E402
+
+from applications.queries import (  # noqa: E402
+    ApplicationFilters,
+    fetch_application_page,
+)
+from config import APPLICATION_PAGE_SIZE_DEFAULT, async_engine, async_session, engine  # noqa: E402
+from db.models import Applications, ApplicationStatus, Base, User  # noqa: E402
+
+STATUSES = list(ApplicationStatus)
+
+
+def seed(size: int) -> UUID:
+    """(Re)build the table with ``size`` rows; returns the busiest handler's id."""
+    Base.metadata.create_all(engine)
+    users = [uuid4() for _ in range(50)]
+    handler = users[0]
+    with engine.begin() as conn:
+        conn.execute(delete(Applications))
+        conn.execute(delete(User))
+        conn.execute(
+            insert(User),
+            [
+                {
+                    "id": uid,
+                    "username": f"user{i}",
+                    "role": "clerk" if uid == handler else "student",
+                    "department": "CS",
+                    "tcet_email": f"user{i}@example.com",
+                    "isEmailVerified": True,
+                }
+                for i, uid in enumerate(users)
+            ],
+        )
+        start = datetime(2022, 1, 1, tzinfo=timezone.utc)
+        # Spread every size over the same four years
+        step = timedelta(days=4 * 365) / size
+        rng = random.Random(size)
+        batch = []
+        tokens: dict[int, int] = {}
+        for n in range(size):
+            created_at = start + step * n
+            tokens[created_at.year] = tokens.get(created_at.year, 0) + 1
+            batch.append(
+                {
+                    "id": uuid4(),
+                    "description": "Request for bonafide certificate",
+                    "subject": f"Application {n}",
+                    "to": "HOD",
+                    "status": rng.choice(STATUSES),
+                    "created_by_id": rng.choice(users[1:]),
+                    # A third of everything lands on the clerk, like inwarding
+                    "current_handler_id": handler if n % 3 == 0 else rng.choice(users),
+                    "created_at": created_at,
+                    "year": created_at.year,
+                    "token_no": tokens[created_at.year],
+                    "is_verified": False,
+                }
+            )
+            if len(batch) == 20_000:
+                conn.execute(insert(Applications), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Applications), batch)
+    return handler
+
+
+async def legacy(user_id: UUID) -> int:
+    async with async_session() as session:
+        statement = select(Applications).where(
+            (Applications.created_by_id == user_id)
+            | (Applications.current_handler_id == user_id)
+        )
+        result = (await session.scalars(statement)).all()
+    rows = [dict(r.__dict__) for r in result]
+    for r in rows:
+        r.pop("_sa_instance_state", None)
+        for key, value in r.items():
+            if isinstance(value, UUID):
+                r[key] = str(value)
+            if isinstance(value, datetime):
+                r[key] = value.isoformat()
+    return len(rows)
+
+
+async def page(user_id: UUID, pages: int = 1, filters=None) -> int:
+    cursor = None
+    rows: list = []
+    async with async_session() as session:
+        for _ in range(pages):
+            rows, cursor = await fetch_application_page(
+                session, user_id, APPLICATION_PAGE_SIZE_DEFAULT, cursor, filters
+            )
+            if cursor is None:
+                break
+    return len(rows)
+
+
+async def timed(label: str, size: int, fn, repeat: int) -> dict:
+    await fn()  # warm caches and the pool
+    started = time.perf_counter()
+    for _ in range(repeat):
+        count = await fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    return {"rows": size, "query": label, "returned": count, "ms": round(elapsed * 1000, 2)}
+
+
+async def main(args):
+    results = []
+    for size in args.sizes:
+        print(f"seeding {size} applications ...", flush=True)
+        handler = seed(size)
+        if size <= args.legacy_max:
+            results.append(await timed("legacy", size, lambda: legacy(handler), 1))
+        results.append(await timed("first page", size, lambda: page(handler), args.repeat))
+        results.append(
+            await timed(
+                f"deep page ({args.deep_pages})",
+                size,
+                lambda: page(handler, args.deep_pages),
+                1,
+            )
+        )
+        filters = ApplicationFilters(statuses=[ApplicationStatus.PENDING], year=2023)
+        results.append(
+            await timed("filtered", size, lambda: page(handler, 1, filters), args.repeat)
+        )
+    await async_engine.dispose()
+    print(f"dialect={engine.dialect.name} page_size={APPLICATION_PAGE_SIZE_DEFAULT}")
+    print_table(results, ["rows", "query", "returned", "ms"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-max", type=int, default=100_000)
+    parser.add_argument("--deep-pages", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
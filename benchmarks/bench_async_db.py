@@ -0,0 +1,98 @@
+"""Concurrency per worker: blocking Session vs AsyncSession on one event loop.
+
+Fires N concurrent "requests" that each run one slow query, the way a single
+uvicorn worker would, first through the old sync ``Session(engine)`` path and
+then through ``config.async_session``. Reports throughput and event-loop lag.
+
+Usage:
+    python -m benchmarks.bench_async_db [--requests 200] [--concurrency 50]
+
+Against MySQL (DB_URL=mysql+mysqlconnector://...) each query is SLEEP(delay).
+The SQLite stand-in registers an equivalent sleep() SQL function so the query
+waits without holding the GIL, like a network round trip would.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import LoopLagMonitor, bootstrap_env, print_table, summarize
+
+bootstrap_env("bench_async_db.db")
+
+from sqlalchemy import event, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from config import async_engine, async_session, engine  # noqa: E402
+
+
+def _register_sleep(dbapi_connection, connection_record):
+    dbapi_connection.create_function("sleep", 1, time.sleep)
+
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _register_sleep)
+    event.listen(async_engine.sync_engine, "connect", _register_sleep)
+
+
+def slow_query(delay: float):
+    return text("SELECT SLEEP(:delay)").bindparams(delay=delay)
+
+
+async def sync_request(delay: float):
+    with Session(engine) as session:
+        session.execute(slow_query(delay))
+
+
+async def async_request(delay: float):
+    async with async_session() as session:
+        await session.execute(slow_query(delay))
+
+
+async def run(mode: str, handler, requests: int, concurrency: int, delay: float) -> dict:
+    gate = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one():
+        async with gate:
+            started = time.perf_counter()
+            await handler(delay)
+            latencies.append(time.perf_counter() - started)
+
+    async with LoopLagMonitor() as monitor:
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+    stats = summarize(latencies)
+    return {
+        "mode": mode,
+        "requests": requests,
+        "concurrency": concurrency,
+        "req_per_s": round(requests / elapsed, 1),
+        "p50_ms": stats["p50_ms"],
+        "p99_ms": stats["p99_ms"],
+        **monitor.summary(),
+    }
+
+
+async def main(args):
+    # Warm both pools so connection setup is not part of the measurement
+    await sync_request(0.001)
+    await async_request(0.001)
+    rows = [
+        await run("sync Session", sync_request, args.requests, args.concurrency, args.delay),
+        await run("AsyncSession", async_request, args.requests, args.concurrency, args.delay),
+    ]
+    await async_engine.dispose()
+    print(f"dialect={engine.dialect.name} delay={args.delay}s per query")
+    print_table(
+        rows,
+        ["mode", "requests", "concurrency", "req_per_s", "p50_ms", "p99_ms", "max_lag_ms", "p99_lag_ms"],
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,154 @@
+"""Register export: memory stays flat as the exported range grows.
+
+Seeds ``--sizes`` export rows (applications with ``--actions`` actions
+each) and, for each size, drains applications.export.export_rows as
+NDJSON, CSV and gzipped CSV. Reports rows/s, output size and the peak
+Python heap (tracemalloc) while streaming, next to the peak of the same
+query loaded at once with ``.all()`` for reference.
+
+Usage:
+    python -m benchmarks.bench_export [--sizes 1000 100000] [--actions 4]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from benchmarks.common import bootstrap_env, print_table
+
+bootstrap_env("bench_export.db")
+
+from sqlalchemy import delete, insert  # noqa: E402
+
+from applications.export import export_query, export_rows  # noqa: E402
+from applications.queries import ApplicationFilters  # noqa: E402
+from config import async_engine, async_session, engine  # noqa: E402
+from db.models import (  # noqa: E402
+    ApplicationActions,
+    Applications,
+    ApplicationStatus,
+    Base,
+    SupportingDocuments,
+    User,
+)
+
+YEAR = 1900  # kept apart from anything else in the scratch database
+
+
+def seed(applications: int, actions: int) -> None:
+    Base.metadata.create_all(engine)
+    users = [uuid4() for _ in range(20)]
+    start = datetime(YEAR, 1, 1, tzinfo=timezone.utc)
+    with engine.begin() as conn:
+        for model in (ApplicationActions, SupportingDocuments, Applications, User):
+            conn.execute(delete(model))
+        conn.execute(
+            insert(User),
+            [
+                {
+                    "id": uid,
+                    "username": f"user{i}",
+                    "role": "student" if i else "clerk",
+                    "department": "CS",
+                    "tcet_email": f"export{i}@example.com",
+                    "isEmailVerified": True,
+                }
+                for i, uid in enumerate(users)
+            ],
+        )
+        for first in range(0, applications, 5_000):
+            batch, history = [], []
+            for n in range(first, min(applications, first + 5_000)):
+                application_id = uuid4()
+                created_at = start + timedelta(minutes=n)
+                batch.append({
+                    "id": application_id,
+                    "description": "Request for bonafide certificate",
+                    "subject": f"Application {n}",
+                    "to": "HOD",
+                    "status": ApplicationStatus.FORWARDED,
+                    "created_by_id": users[1 + n % 19],
+                    "current_handler_id": users[0],
+                    "created_at": created_at,
+                    "year": YEAR,
+                    "token_no": n + 1,
+                    "is_verified": True,
+                })
+                history.extend(
+                    {
+                        "id": uuid4(),
+                        "application_id": application_id,
+                        "from_user_id": users[(n + a) % 20],
+                        "to_user_id": users[(n + a + 1) % 20],
+                        "action_type": "FORWARD",
+                        "comments": "forwarded for review",
+                        "created_at": created_at + timedelta(seconds=a),
+                    }
+                    for a in range(actions)
+                )
+            conn.execute(insert(Applications), batch)
+            conn.execute(insert(ApplicationActions), history)
+
+
+async def streamed(fmt: str, compress: bool) -> tuple[int, float, int]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = 0
+    async for chunk in export_rows(ApplicationFilters(year=YEAR), fmt, compress):
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+async def loaded_at_once() -> tuple[float, int]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    async with async_session() as session:
+        rows = (await session.execute(export_query(ApplicationFilters(year=YEAR)))).all()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del rows
+    return elapsed, peak
+
+
+async def main(args) -> None:
+    results = []
+    for size in args.sizes:
+        applications = max(1, size // args.actions)
+        seed(applications, args.actions)
+        rows = applications * args.actions
+        for label, fmt, compress in (
+            ("ndjson", "ndjson", False),
+            ("csv", "csv", False),
+            ("csv+gzip", "csv", True),
+        ):
+            output, elapsed, peak = await streamed(fmt, compress)
+            results.append({
+                "rows": rows,
+                "strategy": f"stream {label}",
+                "rows_per_s": round(rows / elapsed),
+                "output_mb": round(output / 1e6, 2),
+                "peak_mb": round(peak / 1e6, 2),
+            })
+        elapsed, peak = await loaded_at_once()
+        results.append({
+            "rows": rows,
+            "strategy": ".all() (no encoding)",
+            "rows_per_s": round(rows / elapsed),
+            "output_mb": "",
+            "peak_mb": round(peak / 1e6, 2),
+        })
+    await async_engine.dispose()
+    print_table(results, ["rows", "strategy", "rows_per_s", "output_mb", "peak_mb"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000])
+    parser.add_argument("--actions", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,131 @@
+"""Cost of the metrics middleware, and cross-worker aggregation.
+
+* overhead: a minimal ASGI endpoint called directly, with and without
+  metrics.MetricsMiddleware, over a handful of route templates; the
+  difference is the per-request instrumentation cost
+* scrape: time to render /api/metrics with those series
+* aggregation: ``--workers`` spawned processes each count ``--per-worker``
+  requests and flush; the parent's render must report the exact total,
+  including the snapshot of an exited worker whose pid this one reuses
+
+Usage:
+    python -m benchmarks.bench_metrics [--requests 200000] [--workers 4]
+
+Exits non-zero if the aggregated total is wrong.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.common import bootstrap_env, print_table
+
+bootstrap_env("bench_metrics.db")
+
+SCRATCH = tempfile.mkdtemp(prefix="bench-metrics-")
+os.environ.setdefault("METRICS_DIR", SCRATCH)
+
+import metrics  # noqa: E402
+from serialization import dumps  # noqa: E402
+
+ROUTES = [
+    ("GET", "/api/application/{application_id}", "/api/application/0b7c", {"application_id": "0b7c"}),
+    ("POST", "/api/application/all", "/api/application/all", {}),
+    ("GET", "/api/authenticate", "/api/authenticate", {}),
+    ("GET", "/api/documents/{filename}", "/api/documents/ab.pdf", {"filename": "ab.pdf"}),
+]
+START = {"type": "http.response.start", "status": 200, "headers": []}
+BODY = {"type": "http.response.body", "body": b"{}"}
+
+
+async def endpoint(scope, receive, send):
+    # What the router does before calling a handler
+    scope["route"] = True
+    await send(START)
+    await send(BODY)
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def timed(app, requests: int) -> float:
+    scopes = [
+        {"type": "http", "method": method, "path": path, "path_params": params}
+        for method, _template, path, params in ROUTES
+    ]
+    started = time.perf_counter()
+    for n in range(requests):
+        await app(dict(scopes[n % len(scopes)]), receive, send)
+    return (time.perf_counter() - started) / requests
+
+
+def count_requests(per_worker: int, results) -> None:
+    for _ in range(per_worker):
+        metrics.HTTP_REQUESTS.inc("GET", "/api/health", 200)
+    metrics.flush()
+    results.put(os.getpid())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--per-worker", type=int, default=1000)
+    args = parser.parse_args()
+
+    bare = asyncio.run(timed(endpoint, args.requests))
+    instrumented = asyncio.run(timed(metrics.MetricsMiddleware(endpoint), args.requests))
+    started = time.perf_counter()
+    text = metrics.render()
+    scrape = time.perf_counter() - started
+    print_table(
+        [
+            {"case": "bare endpoint", "us_per_request": round(bare * 1e6, 3)},
+            {"case": "with middleware", "us_per_request": round(instrumented * 1e6, 3)},
+            {"case": "overhead", "us_per_request": round((instrumented - bare) * 1e6, 3)},
+        ],
+        ["case", "us_per_request"],
+    )
+    print(f"scrape: {len(text.splitlines())} lines rendered in {scrape * 1000:.2f} ms")
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=count_requests, args=(args.per_worker, results))
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        results.get(timeout=60)
+    for process in processes:
+        process.join()
+    # An exited worker that had this process's pid
+    with open(os.path.join(SCRATCH, f"{os.getpid()}-1.json"), "wb") as f:
+        f.write(dumps({
+            "pid": os.getpid(),
+            "started": 1,
+            "metrics": {"http_requests_total": [[["GET", "/api/health", 200], args.per_worker]]},
+        }))
+    metrics.HTTP_REQUESTS.inc("GET", "/api/health", 200)  # this worker's live series
+    metrics.flush()
+    expected = (args.workers + 1) * args.per_worker + 1
+    line = f'http_requests_total{{method="GET",route="/api/health",status="200"}} {expected}'
+    ok = line in metrics.render().splitlines()
+    print(
+        f"[{'ok' if ok else 'FAIL':^4}] {args.workers} workers, an exited one with this pid"
+        f" and this one aggregate to {expected}"
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
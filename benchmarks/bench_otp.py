@@ -0,0 +1,82 @@
+"""Login-OTP throughput per worker: store + verify, one event loop.
+
+Each simulated login hashes a fresh OTP and then verifies it, like
+/login followed by /verify-login-otp. ``--concurrency`` logins run at once
+on a single event loop (one uvicorn worker):
+
+* ``legacy``  – bcrypt hash/check called directly on the event loop
+* ``bcrypt``  – auth.otp_hash on its thread pool (OTP_HASH_WORKERS threads)
+* ``hmac``    – auth.otp_hash in HMAC-SHA256 mode, inline
+
+Reports logins per second and how long the loop was blocked meanwhile.
+
+Usage:
+    python -m benchmarks.bench_otp [--logins 40] [--concurrency 20]
+"""
+import argparse
+import asyncio
+import time
+
+import bcrypt
+
+from benchmarks.common import LoopLagMonitor, bootstrap_env, print_table
+
+bootstrap_env("bench_otp.db")
+
+from auth.otp_hash import check_otp, hash_otp  # noqa: E402
+from auth.utils import generate_otp  # noqa: E402
+from config import OTP_HASH_WORKERS  # noqa: E402
+
+
+async def legacy_login(email: str) -> bool:
+    otp = generate_otp()
+    hashed = bcrypt.hashpw(otp.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    await asyncio.sleep(0)  # the check arrives as a separate request
+    return bcrypt.checkpw(otp.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def pooled_login(mode: str):
+    async def login(email: str) -> bool:
+        otp = generate_otp()
+        hashed = await hash_otp(email, otp, mode=mode)
+        await asyncio.sleep(0)  # the check arrives as a separate request
+        return await check_otp(email, otp, hashed)
+
+    return login
+
+
+async def run(login, logins: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(n: int) -> bool:
+        async with semaphore:
+            await asyncio.sleep(0)
+            return await login(f"student{n}@example.com")
+
+    async with LoopLagMonitor() as monitor:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(n) for n in range(logins)))
+        elapsed = time.perf_counter() - started
+    assert all(results), "an OTP failed to verify"
+    return {"logins_per_s": round(logins / elapsed, 1), **monitor.summary()}
+
+
+async def main(args):
+    strategies = (
+        ("legacy", legacy_login),
+        ("bcrypt", pooled_login("bcrypt")),
+        ("hmac", pooled_login("hmac")),
+    )
+    results = []
+    for label, login in strategies:
+        logins = args.logins * 100 if label == "hmac" else args.logins
+        results.append({"mode": label, "logins": logins, **await run(login, logins, args.concurrency)})
+    print(f"concurrency {args.concurrency}, bcrypt pool of {OTP_HASH_WORKERS} threads")
+    print_table(results, ["mode", "logins", "logins_per_s", "max_lag_ms", "p99_lag_ms"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,164 @@
+"""Application search: in-process inverted index vs a LIKE scan.
+
+Seeds ``--sizes`` applications (with a remark on every other one) shared
+between a busy handler and many students, then times, for the handler:
+
+* ``build``  – loading the in-process index (first search after a rebuild)
+* ``refresh``– the periodic refresh after another worker changed 1% of the
+               applications (only those are re-read and re-indexed)
+* ``memory`` – InvertedIndexSearch.search, first page, warm index
+* ``like``   – what the SPA's client-side filter amounts to done in SQL:
+               LIKE '%word%' over every field and remark, no ranking
+
+Usage:
+    python -m benchmarks.bench_search [--sizes 10000 100000] [--queries 50]
+
+The fulltext engine needs MySQL; point DB_URL at one to EXPLAIN its query.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import UUID, uuid4
+
+from benchmarks.common import bootstrap_env, print_table, summarize
+
+bootstrap_env("bench_search.db")
+
+from sqlalchemy import delete, insert, or_, select, update  # noqa: E402
+
+from applications.queries import LIST_COLUMNS, ApplicationFilters  # noqa: E402
+from applications.search import InvertedIndexSearch  # noqa: E402
+from config import APPLICATION_PAGE_SIZE_DEFAULT, async_engine, async_session, engine  # noqa: E402
+from db.models import ApplicationActions, Applications, ApplicationStatus, Base, User  # noqa: E402
+
+SUBJECTS = [
+    "Bonafide certificate", "Leave of absence", "Fee receipt", "Internship letter",
+    "Transfer certificate", "Exam re-evaluation", "Hostel room change", "Scholarship form",
+    "Library card", "Duplicate ID card", "Migration certificate", "Project extension",
+]
+WORDS = (
+    "request kindly grant approval urgent semester department marks attendance "
+    "medical family travel payment scholarship hostel library project internship"
+).split()
+QUERIES = ["bonafide", "certificate", "hostel room", "urgent medical", "scholarship payment", "library"]
+
+
+def seed(size: int) -> UUID:
+    """(Re)build the tables with ``size`` applications; returns the handler's id."""
+    Base.metadata.create_all(engine)
+    users = [uuid4() for _ in range(50)]
+    handler = users[0]
+    rng = random.Random(size)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(delete(ApplicationActions))
+        conn.execute(delete(Applications))
+        conn.execute(delete(User))
+        conn.execute(
+            insert(User),
+            [
+                {
+                    "id": uid,
+                    "username": f"user{i}",
+                    "role": "clerk" if uid == handler else "student",
+                    "department": "CS",
+                    "tcet_email": f"search{i}@example.com",
+                    "isEmailVerified": True,
+                }
+                for i, uid in enumerate(users)
+            ],
+        )
+        for first in range(0, size, 10_000):
+            batch, remarks = [], []
+            for n in range(first, min(size, first + 10_000)):
+                application_id = uuid4()
+                batch.append({
+                    "id": application_id,
+                    "subject": rng.choice(SUBJECTS),
+                    "description": " ".join(rng.choices(WORDS, k=12)),
+                    "to": "HOD",
+                    "status": ApplicationStatus.FORWARDED,
+                    "created_by_id": users[1 + n % 49],
+                    "current_handler_id": handler if n % 2 else users[1 + (n + 7) % 49],
+                    "created_at": start + timedelta(minutes=n),
+                    "updated_at": start + timedelta(minutes=n),
+                    "year": 1700,
+                    "token_no": n + 1,
+                })
+                if n % 2 == 0:
+                    remarks.append({
+                        "id": uuid4(),
+                        "application_id": application_id,
+                        "from_user_id": handler,
+                        "to_user_id": users[1 + n % 49],
+                        "action_type": "FORWARD",
+                        "comments": " ".join(rng.choices(WORDS, k=4)),
+                    })
+            conn.execute(insert(Applications), batch)
+            conn.execute(insert(ApplicationActions), remarks)
+    return handler
+
+
+def like_query(user_id: UUID, words: list[str], limit: int):
+    with_remark = select(ApplicationActions.application_id).where(
+        or_(*(ApplicationActions.comments.like(f"%{word}%") for word in words))
+    )
+    matches = or_(
+        *(
+            column.like(f"%{word}%")
+            for word in words
+            for column in (Applications.subject, Applications.description, Applications.to)
+        ),
+        Applications.id.in_(with_remark),
+    )
+    return (
+        select(*LIST_COLUMNS)
+        .where(or_(Applications.created_by_id == user_id, Applications.current_handler_id == user_id), matches)
+        .order_by(Applications.created_at.desc())
+        .limit(limit)
+    )
+
+
+async def main(args) -> None:
+    rows = []
+    filters = ApplicationFilters()
+    for size in args.sizes:
+        handler = seed(size)
+        index = InvertedIndexSearch(refresh_seconds=float("inf"))
+        async with async_session() as session:
+            started = time.perf_counter()
+            await index.ensure_fresh(session)
+            rows.append({"rows": size, "strategy": "build", **summarize([time.perf_counter() - started])})
+            with engine.begin() as conn:
+                conn.execute(
+                    update(Applications)
+                    .where(Applications.token_no % 100 == 0)
+                    .values(subject="Changed elsewhere", version=Applications.version + 1)
+                )
+            index.refresh_seconds = 0
+            started = time.perf_counter()
+            await index.ensure_fresh(session)
+            rows.append({"rows": size, "strategy": "refresh", **summarize([time.perf_counter() - started])})
+            index.refresh_seconds = float("inf")
+            timings: dict[str, list[float]] = {"memory": [], "like": []}
+            for n in range(args.queries):
+                words = QUERIES[n % len(QUERIES)].split()
+                started = time.perf_counter()
+                await index.search(session, handler, words, filters, APPLICATION_PAGE_SIZE_DEFAULT)
+                timings["memory"].append(time.perf_counter() - started)
+                started = time.perf_counter()
+                (await session.execute(like_query(handler, words, APPLICATION_PAGE_SIZE_DEFAULT))).all()
+                timings["like"].append(time.perf_counter() - started)
+        for strategy, samples in timings.items():
+            rows.append({"rows": size, "strategy": strategy, **summarize(samples)})
+    await async_engine.dispose()
+    print_table(rows, ["rows", "strategy", "count", "p50_ms", "p95_ms", "max_ms"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,116 @@
+"""Serialize 10k applications: legacy ``__dict__`` loop vs serialization.py.
+
+* ``legacy``          – copy ``__dict__``, pop ``_sa_instance_state``, convert
+                        UUID/datetime per value, stdlib JSONResponse
+* ``model + stdlib``  – ModelSerializer, JSON via the stdlib fallback
+* ``model + orjson``  – ModelSerializer, JSON via orjson (if installed)
+* ``rows + orjson``   – list-view projection rows zipped with LIST_KEYS, as
+                        fetch_application_page returns them
+
+Usage:
+    python -m benchmarks.bench_serialization [--count 10000] [--repeat 20]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import UUID, uuid4
+
+from benchmarks.common import bootstrap_env, print_table
+
+bootstrap_env("bench_serialization.db")
+
+from starlette.responses import JSONResponse as StarletteJSONResponse  # noqa: E402
+
+import serialization  # noqa: E402
+from applications.queries import LIST_COLUMNS, LIST_KEYS  # noqa: E402
+from db.models import Applications, ApplicationStatus  # noqa: E402
+
+
+def make_applications(count: int) -> list[Applications]:
+    rng = random.Random(count)
+    users = [uuid4() for _ in range(50)]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        Applications(
+            id=uuid4(),
+            description="Request for bonafide certificate",
+            subject=f"Application {n}",
+            to="HOD",
+            status=rng.choice(list(ApplicationStatus)),
+            created_by_id=rng.choice(users),
+            current_handler_id=rng.choice(users),
+            created_at=start + timedelta(minutes=n),
+            year=2024,
+            token_no=n + 1,
+            is_verified=False,
+            accept_reference_number=None,  # every column loaded, like a query result
+        )
+        for n in range(count)
+    ]
+
+
+def legacy(applications) -> bytes:
+    rows = [dict(a.__dict__) for a in applications]
+    for r in rows:
+        r.pop("_sa_instance_state", None)
+        for key, value in r.items():
+            if isinstance(value, UUID):
+                r[key] = str(value)
+            if isinstance(value, datetime):
+                r[key] = value.isoformat()
+            if isinstance(value, ApplicationStatus):
+                r[key] = value.value
+    return StarletteJSONResponse({"applications": rows}).body
+
+
+def timed(label: str, fn, repeat: int) -> dict:
+    body = fn()  # warm up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    return {"strategy": label, "ms": round(elapsed * 1000, 2), "bytes": len(body)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    applications = make_applications(args.count)
+    serialize = serialization.ModelSerializer(Applications)
+    list_rows = [tuple(getattr(a, column.key) for column in LIST_COLUMNS) for a in applications]
+    orjson = serialization.orjson
+
+    def model_stdlib():
+        serialization.orjson = None
+        try:
+            return serialization.JSONResponse({"applications": serialize.many(applications)}).body
+        finally:
+            serialization.orjson = orjson
+
+    def model_fast():
+        return serialization.JSONResponse({"applications": serialize.many(applications)}).body
+
+    def rows_fast():
+        return serialization.JSONResponse(
+            {"applications": [dict(zip(LIST_KEYS, row)) for row in list_rows]}
+        ).body
+
+    results = [
+        timed("legacy", lambda: legacy(applications), args.repeat),
+        timed("model + stdlib", model_stdlib, args.repeat),
+    ]
+    if orjson is not None:
+        results.append(timed("model + orjson", model_fast, args.repeat))
+        results.append(timed("rows + orjson", rows_fast, args.repeat))
+    else:
+        print("orjson is not installed; skipping the orjson rows")
+    print(f"{args.count} applications, mean of {args.repeat} runs")
+    print_table(results, ["strategy", "ms", "bytes"])
+
+
+if __name__ == "__main__":
+    main()
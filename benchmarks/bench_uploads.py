@@ -0,0 +1,156 @@
+"""Concurrent 5 MB uploads: peak RSS and event-loop lag per upload strategy.
+
+Each strategy runs in its own process (so peak RSS is not shared) and handles
+``--concurrency`` simultaneous uploads, fed from spooled temp files the same
+way Starlette hands UploadFile objects to the routes:
+
+* ``buffered``  – the old update_app: read the whole file, blocking write
+* ``on-loop``   – the old create: 1 MB chunks, blocking writes on the loop
+* ``staged``    – documents.storage.stage_upload + commit (thread offload,
+                  fsync, atomic rename)
+
+Usage:
+    python -m benchmarks.bench_uploads [--concurrency 20] [--size-mb 5]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import tempfile
+import threading
+import time
+from uuid import uuid4
+
+from benchmarks.common import LoopLagMonitor, bootstrap_env, print_table
+
+bootstrap_env("bench_uploads.db")
+
+from fastapi import UploadFile  # noqa: E402
+
+from documents.storage import stage_upload  # noqa: E402
+
+STRATEGIES = ("buffered", "on-loop", "staged")
+
+
+class RssSampler:
+    """Peak resident set size above the starting point, sampled every few ms."""
+
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.baseline = self.peak = self._rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def _rss() -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            # No procfs: fall back to the process high-water mark
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+    @property
+    def peak_mb(self) -> float:
+        return round((self.peak - self.baseline) / (1024 * 1024), 1)
+
+
+def make_uploads(count: int, size: int) -> list[UploadFile]:
+    uploads = []
+    block = os.urandom(1024 * 1024)
+    for n in range(count):
+        spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        remaining = size
+        spooled.write(n.to_bytes(8, "big"))  # distinct content, no dedupe
+        while remaining > 0:
+            spooled.write(block[: min(remaining, len(block))])
+            remaining -= len(block)
+        spooled.seek(0)
+        uploads.append(UploadFile(spooled, filename=f"upload{n}.pdf", size=size + 8))
+    return uploads
+
+
+async def buffered(upload: UploadFile, max_bytes: int):
+    content = await upload.read(max_bytes + 1)
+    os.makedirs("media", exist_ok=True)
+    with open(f"media/{uuid4()}.pdf", "wb") as f:
+        f.write(content)
+
+
+async def on_loop(upload: UploadFile, max_bytes: int):
+    os.makedirs("media", exist_ok=True)
+    with open(f"media/{uuid4()}.pdf", "wb") as f:
+        while chunk := await upload.read(1024 * 1024):
+            f.write(chunk)
+
+
+async def staged(upload: UploadFile, max_bytes: int):
+    staged_upload = await stage_upload(upload, "pdf", max_bytes)
+    await staged_upload.commit()
+
+
+HANDLERS = {"buffered": buffered, "on-loop": on_loop, "staged": staged}
+
+
+async def run(strategy: str, concurrency: int, size: int) -> dict:
+    handler = HANDLERS[strategy]
+    max_bytes = size + 1024
+    # Warm up thread pools and imports so the first measured tick is fair
+    await asyncio.gather(*(handler(upload, max_bytes) for upload in make_uploads(4, 1024)))
+    uploads = make_uploads(concurrency, size)
+    with RssSampler() as rss:
+        async with LoopLagMonitor() as monitor:
+            started = time.perf_counter()
+            await asyncio.gather(*(handler(upload, max_bytes) for upload in uploads))
+            elapsed = time.perf_counter() - started
+    return {
+        "strategy": strategy,
+        "uploads": concurrency,
+        "seconds": round(elapsed, 3),
+        "peak_rss_mb": rss.peak_mb,
+        **monitor.summary(),
+    }
+
+
+def worker(strategy: str, concurrency: int, size: int, results) -> None:
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        results.put(asyncio.run(run(strategy, concurrency, size)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--size-mb", type=float, default=5)
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES))
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024) - 8
+    results = multiprocessing.Queue()
+    rows = []
+    for strategy in args.strategies:
+        process = multiprocessing.Process(target=worker, args=(strategy, args.concurrency, size, results))
+        process.start()
+        rows.append(results.get())
+        process.join()
+    print(f"{args.concurrency} concurrent uploads of {args.size_mb} MB")
+    print_table(rows, ["strategy", "uploads", "seconds", "peak_rss_mb", "max_lag_ms", "p99_lag_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Bulk transitions keep the get-stats rollup in step with `applications`.
+
+Seeds applications spread over a few days, some still with the clerk and
+some elsewhere, then runs bulk verify (clerk), forward (principal) and
+reject (HOD) through apply_bulk_transition in the same transaction wrapper
+as POST /api/application/bulk, plus one batch in which a single row's
+version moved on after it was read, which must fail that item alone.
+After each step, get-stats (fetch_stats,
+for every handler and per handler) must match what it returns once
+application_daily_stats is rebuilt from scratch with rebuild_daily_stats.
+
+Exits non-zero on a mismatch. Wipes users, applications and the rollup,
+so only ever point DB_URL at a scratch database:
+
+    python -m benchmarks.bulk_stats_check
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from benchmarks.common import bootstrap_env
+
+bootstrap_env("bulk_stats_check.db")
+
+from sqlalchemy import delete, select, update  # noqa: E402
+
+from applications.bulk import apply_bulk_transition  # noqa: E402
+from applications.stats import fetch_stats, rebuild_daily_stats  # noqa: E402
+from config import async_engine, async_session, engine  # noqa: E402
+from db.migrations import run_migrations  # noqa: E402
+from db.models import (  # noqa: E402
+    ApplicationActions,
+    ApplicationDailyStats,
+    Applications,
+    ApplicationStatus,
+    SupportingDocuments,
+    User,
+)
+from db.retry import run_in_transaction  # noqa: E402
+
+APPLICATIONS = 40
+
+
+def expect(condition: bool, label: str, failures: list) -> None:
+    print(f"[{'ok' if condition else 'FAIL':^4}] {label}")
+    if not condition:
+        failures.append(label)
+
+
+async def seed() -> tuple[dict[str, User], list]:
+    run_migrations(engine)
+    with engine.begin() as conn:
+        # Users too: forward and verify pick their receiver by role
+        for model in (ApplicationActions, SupportingDocuments, Applications, ApplicationDailyStats, User):
+            conn.execute(delete(model))
+    async with async_session() as session:
+        users = {
+            role: User(
+                username=f"bulk-{role}",
+                role=role,
+                department=department,
+                tcet_email=f"bulk-{role}-{uuid4()}@example.com",
+                isEmailVerified=True,
+            )
+            for role, department in (
+                ("student", "CS"), ("clerk", "System"), ("principal", "Admin"), ("hod", "CS"),
+            )
+        }
+        session.add_all(users.values())
+        await session.flush()
+        start = datetime(2024, 3, 1, tzinfo=timezone.utc)
+        applications = [
+            Applications(
+                id=uuid4(),
+                description="bulk stats",
+                subject=f"Application {n}",
+                to="HOD",
+                created_by_id=users["student"].id,
+                # a quarter stays with the HOD, so not every row moves
+                current_handler_id=users["hod" if n % 4 == 3 else "clerk"].id,
+                status=ApplicationStatus.PENDING,
+                created_at=start + timedelta(hours=7 * n),
+                year=1800,
+                token_no=n + 1,
+            )
+            for n in range(APPLICATIONS)
+        ]
+        session.add_all(applications)
+        await session.commit()
+        return users, [application.id for application in applications]
+
+
+async def all_stats(users: dict[str, User]) -> dict:
+    async with async_session() as session:
+        stats = {"all": await fetch_stats(session)}
+        for role, user in users.items():
+            stats[role] = await fetch_stats(session, handler_id=user.id)
+    return stats
+
+
+async def compare(label: str, users: dict[str, User], failures: list) -> None:
+    maintained = await all_stats(users)
+    with engine.begin() as connection:
+        rebuild_daily_stats(connection)
+    rebuilt = await all_stats(users)
+    for scope in maintained:
+        expect(
+            maintained[scope] == rebuilt[scope],
+            f"{label}: get-stats ({scope}) matches a rebuild",
+            failures,
+        )
+        if maintained[scope] != rebuilt[scope]:
+            print(f"       maintained {maintained[scope]}")
+            print(f"       rebuilt    {rebuilt[scope]}")
+
+
+async def bulk(user: User, action: str, application_ids: list, **kwargs):
+    async def transition(session):
+        return await apply_bulk_transition(session, user, action, application_ids, **kwargs)
+
+    return await run_in_transaction(async_session, transition)
+
+
+async def main() -> int:
+    failures: list[str] = []
+    users, ids = await seed()
+    await compare("seeded", users, failures)
+
+    # The HOD's quarter is skipped: only the current handler may verify
+    outcome = await bulk(users["clerk"], "verify", ids)
+    expect(outcome.applied == APPLICATIONS * 3 // 4, f"verify applied {outcome.applied}", failures)
+    await compare("after verify", users, failures)
+
+    outcome = await bulk(
+        users["principal"], "forward", ids[: APPLICATIONS // 2], role="hod", department="CS"
+    )
+    expect(outcome.applied > 0, f"forward applied {outcome.applied}", failures)
+    await compare("after forward", users, failures)
+
+    async def stale_transition(session):
+        # Load the batch (held, so the identity map keeps it), then move
+        # one row on behind it, as a writer committing in between would
+        session.info["held"] = (
+            await session.scalars(select(Applications).where(Applications.id.in_(ids)))
+        ).all()
+        await session.execute(
+            update(Applications)
+            .where(Applications.id == ids[3])
+            .values(version=Applications.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        return await apply_bulk_transition(session, users["hod"], "incomplete", ids[:4])
+
+    outcome = await run_in_transaction(async_session, stale_transition)
+    results = {result["id"]: result for result in outcome.results}
+    expect(not results[str(ids[3])]["ok"], "a row changed after the read is a conflict", failures)
+    expect(outcome.applied == 3, f"the other items still applied ({outcome.applied})", failures)
+    await compare("after a stale item", users, failures)
+
+    outcome = await bulk(users["hod"], "reject", ids, remark="incomplete form")
+    expect(outcome.applied > 0, f"reject applied {outcome.applied}", failures)
+    await compare("after reject", users, failures)
+
+    await async_engine.dispose()
+    print(f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
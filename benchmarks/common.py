@@ -0,0 +1,90 @@
+"""Shared helpers for the benchmark scripts in this directory.
+
+Every benchmark calls ``bootstrap_env()`` before importing ``config`` so it can
+run against a throwaway SQLite database without a populated .env file.
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def bootstrap_env(db_name: str = "benchmark.db") -> str:
+    """Point the app at a scratch SQLite file unless DB_URL is already set."""
+    os.environ.setdefault("JWT_SECRET", "benchmark-secret-not-for-production")
+    os.environ.setdefault("EMAIL_USERNAME", "bench@example.com")
+    os.environ.setdefault("EMAIL_PASSWORD", "bench")
+    os.environ.setdefault("EMAIL_FROM", "bench@example.com")
+    if not os.getenv("DB_URL"):
+        path = os.path.join(tempfile.gettempdir(), db_name)
+        os.environ["DB_URL"] = f"sqlite:///{path}"
+    return os.environ["DB_URL"]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: list[float]) -> dict:
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3) if ms else 0.0,
+    }
+
+
+def print_table(rows: list[dict], columns: list[str]) -> None:
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
+
+
+class LoopLagMonitor:
+    """Measures how late a 10 ms ticker wakes up while the event loop is busy."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags: list[float] = []
+        self._task = None
+        self._sleeping_since = None
+
+    async def _tick(self):
+        while True:
+            self._sleeping_since = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - self._sleeping_since - self.interval))
+            self._sleeping_since = None
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._tick())
+        await asyncio.sleep(0)  # let the ticker start its first sleep
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._sleeping_since is not None:
+            # A blocked loop may never have let the last tick complete
+            overdue = time.perf_counter() - self._sleeping_since - self.interval
+            if overdue > 0:
+                self.lags.append(overdue)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def summary(self) -> dict:
+        return {
+            "max_lag_ms": round(max(self.lags, default=0.0) * 1000, 3),
+            "p99_lag_ms": round(percentile(self.lags, 99) * 1000, 3),
+        }
@@ -0,0 +1,132 @@
+"""Byte-exact checks for DocumentResponse (ETag, 304, Range, If-Range).
+
+Drives the ASGI response directly with a random file and compares every
+partial body with the matching slice of the file. Exits non-zero on the
+first mismatch:
+
+    python -m benchmarks.document_range_check
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from email.utils import formatdate
+
+from documents.responses import DocumentResponse
+
+SIZE = 300_000  # spans several 64 KB read chunks
+
+
+async def request(path: str, headers: dict, method: str = "GET", extensions=None, etag=None):
+    scope = {
+        "type": "http",
+        "method": method,
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "extensions": extensions or {},
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    await DocumentResponse(path, etag=etag, filename="scan.pdf")(scope, receive, send)
+    start = messages[0]
+    response_headers = {k.decode(): v.decode() for k, v in start["headers"]}
+    body = b"".join(m.get("body", b"") for m in messages[1:] if m["type"] == "http.response.body")
+    return start["status"], response_headers, body, messages
+
+
+def expect(condition: bool, label: str, failures: list) -> None:
+    print(f"[{'ok' if condition else 'FAIL':^4}] {label}")
+    if not condition:
+        failures.append(label)
+
+
+async def main() -> int:
+    failures: list[str] = []
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "scan.pdf")
+        data = os.urandom(SIZE)
+        with open(path, "wb") as f:
+            f.write(data)
+
+        status, headers, body, _ = await request(path, {})
+        etag, last_modified = headers["etag"], headers["last-modified"]
+        expect(status == 200 and body == data, "full GET returns the whole file", failures)
+        expect(headers["content-length"] == str(SIZE), "full GET content-length", failures)
+        expect(headers["accept-ranges"] == "bytes", "advertises byte ranges", failures)
+
+        for header, (start, end) in {
+            "bytes=0-0": (0, 1),
+            "bytes=0-99": (0, 100),
+            "bytes=65530-131080": (65530, 131081),
+            f"bytes={SIZE - 10}-": (SIZE - 10, SIZE),
+            "bytes=-500": (SIZE - 500, SIZE),
+            f"bytes=1000-{SIZE * 2}": (1000, SIZE),
+            f"bytes=-{SIZE * 2}": (0, SIZE),
+        }.items():
+            status, headers, body, _ = await request(path, {"Range": header})
+            expect(
+                status == 206
+                and body == data[start:end]
+                and headers["content-range"] == f"bytes {start}-{end - 1}/{SIZE}"
+                and headers["content-length"] == str(end - start),
+                f"{header} -> 206 with bytes [{start}, {end})",
+                failures,
+            )
+
+        for header in (f"bytes={SIZE}-", f"bytes={SIZE + 5}-{SIZE + 10}", "bytes=-0"):
+            status, headers, body, _ = await request(path, {"Range": header})
+            expect(
+                status == 416 and headers["content-range"] == f"bytes */{SIZE}" and body == b"",
+                f"{header} -> 416",
+                failures,
+            )
+
+        for header in ("bytes=5-1", "lines=1-2", "bytes=0-1,5-6", "bytes=abc"):
+            status, _, body, _ = await request(path, {"Range": header})
+            expect(status == 200 and body == data, f"{header} ignored -> full 200", failures)
+
+        status, _, body, _ = await request(path, {"Range": "bytes=10-19", "If-Range": etag})
+        expect(status == 206 and body == data[10:20], "If-Range with current ETag -> 206", failures)
+        status, _, body, _ = await request(path, {"Range": "bytes=10-19", "If-Range": last_modified})
+        expect(status == 206 and body == data[10:20], "If-Range with current date -> 206", failures)
+        status, _, body, _ = await request(path, {"Range": "bytes=10-19", "If-Range": '"stale"'})
+        expect(status == 200 and body == data, "If-Range with stale ETag -> full 200", failures)
+        status, _, body, _ = await request(path, {"Range": "bytes=10-19", "If-Range": f"W/{etag}"})
+        expect(status == 200 and body == data, "If-Range with weak ETag -> full 200", failures)
+
+        status, headers, body, _ = await request(path, {"If-None-Match": etag})
+        expect(status == 304 and body == b"" and headers["etag"] == etag, "If-None-Match -> 304", failures)
+        status, _, _, _ = await request(path, {"If-None-Match": f'"other", W/{etag}'})
+        expect(status == 304, "If-None-Match list with weak match -> 304", failures)
+        status, _, body, _ = await request(path, {"If-None-Match": '"other"'})
+        expect(status == 200 and body == data, "If-None-Match mismatch -> 200", failures)
+        status, _, _, _ = await request(path, {"If-Modified-Since": last_modified})
+        expect(status == 304, "If-Modified-Since current -> 304", failures)
+        status, _, _, _ = await request(path, {"If-Modified-Since": formatdate(0, usegmt=True)})
+        expect(status == 200, "If-Modified-Since 1970 -> 200", failures)
+        status, _, _, _ = await request(
+            path, {"If-None-Match": '"other"', "If-Modified-Since": last_modified}
+        )
+        expect(status == 200, "If-None-Match takes precedence over If-Modified-Since", failures)
+
+        status, headers, body, _ = await request(path, {}, method="HEAD")
+        expect(status == 200 and body == b"" and headers["content-length"] == str(SIZE), "HEAD", failures)
+
+        _, _, _, messages = await request(path, {}, extensions={"http.response.pathsend": {}})
+        expect(messages[-1] == {"type": "http.response.pathsend", "path": os.path.abspath(path)},
+               "full GET uses pathsend when offered", failures)
+
+        status, headers, _, _ = await request(path, {"If-None-Match": '"abc"'}, etag='"abc"')
+        expect(status == 304 and headers["etag"] == '"abc"', "explicit content ETag", failures)
+
+    print(f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,440 @@
+"""End-to-end load test: server:app under a mixed workload, with local stand-ins.
+
+Boots ``uvicorn server:app`` in a subprocess against:
+
+* a scratch SQLite database, or ``--db-url`` (e.g. a local MySQL)
+* a local Redis with ``--redis-url``; without one the workers share the
+  fallback store, as they would in production without Redis
+* a capturing SMTP sink (aiosmtpd) on a free port, from which virtual
+  users read their login OTPs
+
+It seeds a clerk, a principal, one HOD per department and ``--students``
+students, then runs closed-loop virtual users for ``--duration`` seconds.
+Each one logs in first through /api/auth/login and
+/api/auth/verify-otp/login, then:
+
+* students create applications with a PDF upload, list their own, open
+  one and download its document, and log in again once the OTP cooldown
+  allows
+* the clerk verifies its pending inbox, the principal forwards
+  applications to a department's HOD, and HODs accept or reject them;
+  all of them also list applications and read get-stats
+
+Requests are recorded per route template. The report gives throughput,
+errors and p50/p95/p99 latency per route. It is saved as JSON
+(``--out``), and ``--compare`` prints the change against an earlier
+report:
+
+    python -m benchmarks.load_test [--duration 60] [--students 20] [--workers 1]
+        [--db-url mysql+mysqlconnector://...] [--redis-url redis://localhost:6379/15]
+        [--out load.json] [--compare previous.json]
+
+Needs httpx and aiosmtpd (``pip install httpx aiosmtpd``). With SQLite,
+keep ``--workers 1``, since concurrent writers from several processes get
+"database is locked" errors.
+"""
+import argparse
+import asyncio
+import email
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from email import policy
+
+import httpx
+
+from benchmarks.common import print_table, summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPARTMENTS = ["CS", "IT", "EXTC", "MECH"]
+OTP_COOLDOWN = 61  # auth.utils.can_send_new_otp allows one OTP a minute
+OTP_PATTERN = re.compile(r">\s*(\d{6})\s*<")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class MailSink:
+    """aiosmtpd handler that keeps the latest OTP sent to each recipient."""
+
+    def __init__(self):
+        self.otps: dict[str, str] = {}
+        self.messages = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages += 1
+        message = email.message_from_bytes(envelope.content, policy=policy.default)
+        body = message.get_body(("html", "plain"))
+        match = OTP_PATTERN.search(body.get_content() if body is not None else "")
+        if match:
+            for recipient in envelope.rcpt_tos:
+                self.otps[recipient.lower()] = match.group(1)
+        return "250 Message accepted for delivery"
+
+    async def wait_for_otp(self, address: str, timeout: float = 15.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            otp = self.otps.pop(address.lower(), None)
+            if otp is not None:
+                return otp
+            await asyncio.sleep(0.05)
+        return None
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def request(self, client: httpx.AsyncClient, method: str, route: str, url: str = None, **kwargs):
+        """Send a request and record it under ``method route``; None on a transport error."""
+        label = f"{method} {route}"
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url or route, **kwargs)
+        except httpx.HTTPError:
+            self.latencies[label].append(time.perf_counter() - started)
+            self.errors[label] += 1
+            self.statuses[label][0] += 1
+            return None
+        self.latencies[label].append(time.perf_counter() - started)
+        self.statuses[label][response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for label in sorted(self.latencies):
+            latencies = self.latencies[label]
+            routes[label] = {
+                **summarize(latencies),
+                "rps": round(len(latencies) / elapsed, 2),
+                "errors": self.errors[label],
+                "statuses": {str(code): n for code, n in sorted(self.statuses[label].items())},
+            }
+        everything = [latency for latencies in self.latencies.values() for latency in latencies]
+        total = {
+            **summarize(everything),
+            "rps": round(len(everything) / elapsed, 2),
+            "errors": sum(self.errors.values()),
+        }
+        return {"routes": routes, "total": total}
+
+
+class VirtualUser:
+    def __init__(self, index: int, user_id: str, email_address: str, role: str, department: str, base_url: str):
+        self.id = user_id
+        self.email = email_address
+        self.role = role
+        self.department = department
+        # A distinct client address per user, so per-IP auth limits apply per user
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"X-Forwarded-For": f"198.18.{index // 250}.{index % 250 + 1}"},
+            timeout=60,
+        )
+        self.last_otp = -OTP_COOLDOWN
+        self.applications: list[str] = []
+
+    def can_login(self) -> bool:
+        return time.monotonic() - self.last_otp >= OTP_COOLDOWN
+
+    async def login(self, recorder: Recorder, sink: MailSink) -> bool:
+        self.last_otp = time.monotonic()
+        response = await recorder.request(
+            self.client, "POST", "/api/auth/login", json={"email": self.email}
+        )
+        if response is None or response.status_code != 200:
+            return False
+        otp = await sink.wait_for_otp(self.email)
+        if otp is None:
+            recorder.errors["OTP mail not delivered"] += 1
+            return False
+        response = await recorder.request(
+            self.client, "POST", "/api/auth/verify-otp/login", json={"email": self.email, "otp": otp}
+        )
+        return response is not None and response.status_code == 200
+
+    async def inbox(self, recorder: Recorder, status: str) -> list[dict]:
+        response = await recorder.request(
+            self.client, "POST", "/api/application/all", params={"status": status, "limit": 20}
+        )
+        if response is None or response.status_code != 200:
+            return []
+        return response.json()["applications"]
+
+
+async def student(user: VirtualUser, recorder: Recorder, sink: MailSink, upload: bytes, deadline: float):
+    while time.monotonic() < deadline:
+        action = random.choices(["create", "list", "view", "login"], weights=[2, 3, 3, 1])[0]
+        if action == "login" and not user.can_login():
+            action = "list"
+        if action == "create":
+            await recorder.request(
+                user.client, "POST", "/api/application/create",
+                data={"description": "Load test application", "subject": "Bonafide certificate",
+                      "for_user": random.choice(DEPARTMENTS)},
+                files={"document": ("certificate.pdf", upload, "application/pdf")},
+            )
+        elif action == "list" or not user.applications:
+            response = await recorder.request(user.client, "POST", "/api/application/all")
+            if response is not None and response.status_code == 200:
+                user.applications = [row["id"] for row in response.json()["applications"]]
+        elif action == "view":
+            application_id = random.choice(user.applications)
+            response = await recorder.request(
+                user.client, "GET", "/api/application/{application_id}",
+                f"/api/application/{application_id}",
+            )
+            if response is None or response.status_code != 200:
+                continue
+            document = response.json()["application"]["document"]
+            if document:
+                await recorder.request(
+                    user.client, "GET", "/api/documents/{filename}",
+                    f"/api/documents/{document.rsplit('/', 1)[-1]}",
+                )
+        else:
+            await user.login(recorder, sink)
+
+
+async def staff(user: VirtualUser, recorder: Recorder, deadline: float):
+    inbox_status = "pending" if user.role == "clerk" else "forwarded"
+    while time.monotonic() < deadline:
+        action = random.choices(["work", "stats", "list"], weights=[7, 2, 1])[0]
+        if action == "stats":
+            await recorder.request(user.client, "GET", "/api/application/get-stats/{some_id}",
+                                   "/api/application/get-stats/1")
+            continue
+        if action == "list":
+            await recorder.request(user.client, "POST", "/api/application/all")
+            continue
+        waiting = [row for row in await user.inbox(recorder, inbox_status)
+                   if row["current_handler_id"] == user.id]
+        if not waiting:
+            await asyncio.sleep(0.2)  # nothing to do; poll again shortly
+            continue
+        application_id = random.choice(waiting)["id"]
+        if user.role == "clerk":
+            await recorder.request(user.client, "POST", "/api/application/verify/{application_id}",
+                                   f"/api/application/verify/{application_id}")
+        elif user.role == "principal":
+            await recorder.request(
+                user.client, "POST", "/api/application/forward/{application_id}",
+                f"/api/application/forward/{application_id}",
+                json={"role": "hod", "department": random.choice(DEPARTMENTS), "remark": "Please review"},
+            )
+        else:
+            await recorder.request(
+                user.client, "POST", "/api/application/update/{application_id}",
+                f"/api/application/update/{application_id}",
+                json={"status": random.choice(["ACCEPTED", "REJECTED"]), "remark": "Reviewed"},
+            )
+
+
+def seed(students: int) -> list[tuple[str, str, str, str]]:
+    """Create the schema and users; returns (id, email, role, department) rows."""
+    from sqlalchemy.orm import Session
+
+    from config import engine
+    from db.models import Base, User
+
+    Base.metadata.create_all(engine)
+    people = [("clerk", "System"), ("principal", "Admin")]
+    people += [("hod", department) for department in DEPARTMENTS]
+    people += [("student", DEPARTMENTS[n % len(DEPARTMENTS)]) for n in range(students)]
+    rows = []
+    with Session(engine) as session:
+        for n, (role, department) in enumerate(people):
+            user = User(
+                username=f"{role}{n}", role=role, department=department,
+                tcet_email=f"{role}{n}@load.example.com", isEmailVerified=True,
+            )
+            session.add(user)
+            session.flush()
+            rows.append((str(user.id), user.tcet_email, role, department))
+        session.commit()
+    engine.dispose()
+    return rows
+
+
+def server_env(args, scratch: str, smtp_port: int) -> dict:
+    return {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "PRODUCTION": "false",
+        "MAIL_SERVER": "127.0.0.1",
+        "MAIL_PORT": str(smtp_port),
+        "MAIL_STARTTLS": "false",
+        "MAIL_SSL_TLS": "false",
+        "MAIL_USE_CREDENTIALS": "false",
+        "REDIS_URL": args.redis_url or "redis://127.0.0.1:1/0",
+        "FALLBACK_STORE_PATH": os.path.join(scratch, "store"),
+        "METRICS_DIR": os.path.join(scratch, "metrics"),
+        "CLIENT_URL": "http://127.0.0.1",
+    }
+
+
+async def wait_until_up(process: subprocess.Popen, base_url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with code {process.returncode}")
+            try:
+                if (await client.get("/api/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not come up")
+
+
+async def run(args, users, sink: MailSink, base_url: str) -> tuple[Recorder, float]:
+    recorder = Recorder()
+    upload = b"%PDF-1.4\n" + os.urandom(args.upload_kb * 1024)
+    actors = [
+        VirtualUser(index, *row, base_url) for index, row in enumerate(users)
+    ]
+
+    async def actor(user: VirtualUser):
+        # Everyone starts by logging in; the login is part of the measured load
+        if not await user.login(recorder, sink):
+            return
+        if user.role == "student":
+            await student(user, recorder, sink, upload, deadline)
+        else:
+            await staff(user, recorder, deadline)
+
+    started = time.monotonic()
+    deadline = started + args.duration
+    try:
+        await asyncio.gather(*(actor(user) for user in actors))
+    finally:
+        await asyncio.gather(*(user.client.aclose() for user in actors))
+    return recorder, time.monotonic() - started
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(report: dict, previous: dict) -> None:
+    rows = []
+    for route, now in report["routes"].items():
+        before = previous.get("routes", {}).get(route)
+        if before is None:
+            continue
+        rows.append({
+            "route": route,
+            "rps": f"{before['rps']} -> {now['rps']}",
+            "p95_ms": f"{before['p95_ms']} -> {now['p95_ms']}",
+            "p95_change": f"{(now['p95_ms'] / before['p95_ms'] - 1) * 100:+.1f}%" if before["p95_ms"] else "n/a",
+        })
+    print(f"\ncompared with {previous.get('revision', '?')} ({previous.get('started_at', '?')}):")
+    print_table(rows, ["route", "rps", "p95_ms", "p95_change"])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--upload-kb", type=int, default=200)
+    parser.add_argument("--db-url", help="defaults to a scratch SQLite file")
+    parser.add_argument("--redis-url", help="defaults to the shared fallback store")
+    parser.add_argument("--out", help="report path (default: load-test-<time>.json in the temp dir)")
+    parser.add_argument("--compare", help="an earlier report to compare with")
+    args = parser.parse_args()
+
+    from aiosmtpd.controller import Controller
+
+    scratch = tempfile.mkdtemp(prefix="load-test-")
+    os.environ.setdefault("JWT_SECRET", "load-test-secret-not-for-production")
+    os.environ.setdefault("EMAIL_USERNAME", "load@example.com")
+    os.environ.setdefault("EMAIL_PASSWORD", "load")
+    os.environ.setdefault("EMAIL_FROM", "load@example.com")
+    os.environ["DB_URL"] = args.db_url or f"sqlite:///{os.path.join(scratch, 'load.db')}"
+    users = seed(args.students)
+
+    sink = MailSink()
+    smtp = Controller(sink, hostname="127.0.0.1", port=free_port())
+    smtp.start()
+    # Run from the scratch dir so uploads land in its media/ (static/ is the repo's)
+    os.symlink(os.path.join(ROOT, "static"), os.path.join(scratch, "static"))
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--app-dir", ROOT,
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers),
+         "--log-level", "warning"],
+        cwd=scratch,
+        env=server_env(args, scratch, smtp.port),
+    )
+    try:
+        asyncio.run(wait_until_up(process, base_url))
+        started_at = datetime.now(timezone.utc).isoformat()
+        recorder, elapsed = asyncio.run(run(args, users, sink, base_url))
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        smtp.stop()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "revision": git_revision(),
+        "started_at": started_at,
+        "duration_seconds": round(elapsed, 2),
+        "config": {
+            "students": args.students,
+            "workers": args.workers,
+            "upload_kb": args.upload_kb,
+            "database": os.environ["DB_URL"].split(":", 1)[0],
+            "redis": bool(args.redis_url),
+            "otp_hash_mode": os.getenv("OTP_HASH_MODE", "bcrypt"),
+        },
+        "mail_messages": sink.messages,
+        **recorder.report(elapsed),
+    }
+    rows = [{"route": route, **stats} for route, stats in report["routes"].items()]
+    rows.append({"route": "total", **report["total"]})
+    print_table(rows, ["route", "count", "rps", "errors", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+    if recorder.errors.get("OTP mail not delivered"):
+        print(f"OTP mails not delivered: {recorder.errors['OTP mail not delivered']}")
+
+    out = args.out or os.path.join(
+        tempfile.gettempdir(), f"load-test-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.json"
+    )
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nreport saved to {out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
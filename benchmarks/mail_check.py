@@ -0,0 +1,138 @@
+"""Mail dispatcher against a local SMTP sink (aiosmtpd).
+
+Points MAIL_SERVER/MAIL_PORT at an in-process aiosmtpd server and checks:
+
+* queued mails arrive, over pooled connections (no more than one SMTP
+  session per worker)
+* a mail that cannot be built (newline in the subject) is counted as
+  failed and its worker keeps delivering
+* temporary rejections are retried; enough of them open the circuit
+  breaker, which closes again once the server accepts mail
+* with the server gone, a mail is given up after MAIL_MAX_RETRIES retries
+
+Exits non-zero on a violation:
+
+    python -m benchmarks.mail_check
+"""
+import asyncio
+import os
+import socket
+import sys
+import time
+
+from benchmarks.common import bootstrap_env
+
+bootstrap_env("mail_check.db")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+PORT = _free_port()
+os.environ.update({
+    "MAIL_SERVER": "127.0.0.1",
+    "MAIL_PORT": str(PORT),
+    "MAIL_STARTTLS": "false",
+    "MAIL_SSL_TLS": "false",
+    "MAIL_USE_CREDENTIALS": "false",
+})
+
+from aiosmtpd.controller import Controller  # noqa: E402
+
+import mail  # noqa: E402
+from mail import CircuitBreaker, MailDispatcher  # noqa: E402
+
+
+class Sink:
+    def __init__(self):
+        self.received: list[str] = []
+        self.sessions = 0
+        self.reject = 0  # answer this many DATA commands with a 451
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.reject:
+            self.reject -= 1
+            return "451 Try again later"
+        self.received.extend(envelope.rcpt_tos)
+        return "250 Message accepted for delivery"
+
+
+def expect(condition: bool, label: str, failures: list) -> None:
+    print(f"[{'ok' if condition else 'FAIL':^4}] {label}")
+    if not condition:
+        failures.append(label)
+
+
+async def wait_until(predicate, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.02)
+    return predicate()
+
+
+async def main() -> int:
+    failures: list[str] = []
+    # Retries in milliseconds rather than seconds
+    mail.RETRY_BASE_DELAY_SECONDS = 0.02
+    mail.RETRY_MAX_DELAY_SECONDS = 0.1
+
+    sink = Sink()
+    controller = Controller(sink, hostname="127.0.0.1", port=PORT)
+    controller.start()
+    try:
+        dispatcher = MailDispatcher(workers=2, queue_size=100, max_retries=3)
+        dispatcher.breaker = CircuitBreaker(threshold=3, reset_after=0.3)
+        await dispatcher.start()
+
+        for n in range(10):
+            dispatcher.submit([f"user{n}@example.com"], "Application update", "<p>hello</p>")
+        delivered = await wait_until(lambda: dispatcher.sent == 10)
+        expect(delivered and len(sink.received) == 10, f"10 mails delivered ({len(sink.received)})", failures)
+        expect(sink.sessions <= dispatcher.workers, f"pooled sessions: {sink.sessions} for 2 workers", failures)
+
+        dispatcher.submit(["bad@example.com"], "line\nbreak", "<p>never built</p>")
+        dispatcher.submit(["after@example.com"], "After a bad mail", "<p>still here</p>")
+        await wait_until(lambda: "after@example.com" in sink.received)
+        expect(dispatcher.failed == 1, f"unbuildable mail counted as failed ({dispatcher.failed})", failures)
+        expect(
+            dispatcher.running and all(not task.done() for task in dispatcher._tasks),
+            "every worker still running after it",
+            failures,
+        )
+        expect("after@example.com" in sink.received, "next mail delivered", failures)
+
+        sink.reject = 3
+        dispatcher.submit(["retry@example.com"], "Retried", "<p>451 first</p>")
+        opened = await wait_until(lambda: dispatcher.breaker.state != "closed", timeout=5)
+        expect(opened, f"breaker opened after 3 rejections ({dispatcher.breaker.state})", failures)
+        await wait_until(lambda: "retry@example.com" in sink.received)
+        expect("retry@example.com" in sink.received, "rejected mail delivered once accepted", failures)
+        expect(dispatcher.breaker.state == "closed", "breaker closed after a successful send", failures)
+        expect(dispatcher.retried >= 3, f"retries counted ({dispatcher.retried})", failures)
+    finally:
+        controller.stop()
+
+    failed_before = dispatcher.failed
+    dispatcher.breaker = CircuitBreaker(threshold=100)
+    dispatcher.submit(["gone@example.com"], "Server down", "<p>nobody listening</p>")
+    gave_up = await wait_until(lambda: dispatcher.failed == failed_before + 1)
+    expect(gave_up, "mail given up after max retries with the server down", failures)
+    await dispatcher.drain(timeout=2)
+    stats = dispatcher.stats()
+    print(f"       {stats}")
+    print(f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,147 @@
+"""Query budgets for the hot endpoints, so a creeping query count fails CI.
+
+Drives server.app in-process against a scratch SQLite database: a student
+creates an application with a document, then each endpoint below runs
+under ``query_stats.max_queries`` with its budget, cold (first request
+for that user or application) and warm. Also fails when a request runs
+the same statement QUERY_REPEAT_THRESHOLD times (a likely N+1).
+
+Budgets count every statement, including the auth lookup on a cold
+principal cache. Lower them when an endpoint gets cheaper; raising one
+should come with a reason in the commit. Exits non-zero on a violation:
+
+    python -m benchmarks.query_budget_check
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+from benchmarks.common import bootstrap_env
+
+DB_URL = bootstrap_env("query_budget_check.db")
+if DB_URL.startswith("sqlite:///") and os.path.exists(DB_URL[len("sqlite:///"):]):
+    os.remove(DB_URL[len("sqlite:///"):])
+
+import httpx  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import server  # noqa: E402
+from applications.cache import detail_cache  # noqa: E402
+from config import create_access_token, engine  # noqa: E402
+from db.models import SupportingDocuments, User  # noqa: E402
+from query_stats import QueryBudgetExceeded, max_queries  # noqa: E402
+
+# (label, method, path, role, budget); {id} and {file} come from the seeded application
+BUDGETS = [
+    ("authenticate (cold principal)", "GET", "/api/authenticate", "student", 1),
+    ("authenticate (warm)", "GET", "/api/authenticate", "student", 0),
+    # principal lookup, version row (authorizes, answers If-None-Match),
+    # then the loader's application, actions and documents queries
+    ("getApplication (cold)", "GET", "/api/application/{id}", "clerk", 5),
+    ("getApplication (cached)", "GET", "/api/application/{id}", "clerk", 1),
+    ("getApplication (cached, another viewer)", "GET", "/api/application/{id}", "student", 1),
+    ("get_document", "GET", "/api/documents/{file}", "student", 2),
+    ("all applications", "POST", "/api/application/all", "clerk", 1),
+    ("stats", "GET", "/api/application/get-stats/1", "principal", 2),
+]
+
+
+def expect(condition: bool, label: str, failures: list) -> None:
+    print(f"[{'ok' if condition else 'FAIL':^4}] {label}")
+    if not condition:
+        failures.append(label)
+
+
+def seed_users() -> dict[str, str]:
+    users = {}
+    with Session(engine) as session:
+        for role, department in [
+            ("student", "CS"), ("clerk", "System"), ("principal", "Admin"), ("hod", "CS"),
+        ]:
+            user = User(
+                username=role, role=role, department=department,
+                tcet_email=f"{role}@budget.example.com", isEmailVerified=True,
+            )
+            session.add(user)
+            session.flush()
+            users[role] = create_access_token({"sub": str(user.id)})
+        session.commit()
+    return users
+
+
+async def main() -> int:
+    failures: list[str] = []
+    tokens = seed_users()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://budget") as client:
+        client.cookies.set("access_token", tokens["student"])
+        response = await client.post(
+            "/api/application/create",
+            data={"description": "budget", "subject": "budget", "for_user": "hod"},
+            files={"document": ("scan.pdf", b"%PDF-1.4 " + b"x" * 2048, "application/pdf")},
+        )
+        client.cookies.set("access_token", tokens["clerk"])
+        response = await client.post("/api/application/all")
+        application_id = response.json()["applications"][0]["id"]
+        with Session(engine) as session:
+            document = session.scalars(select(SupportingDocuments.document_url)).one().rsplit("/", 1)[-1]
+        # Nobody has a cached principal yet when the cold rows run
+        server.principal_cache.clear()
+
+        for label, method, path, role, budget in BUDGETS:
+            url = path.format(id=application_id, file=document)
+            client.cookies.set("access_token", tokens[role])
+            try:
+                with max_queries(budget) as stats:
+                    response = await client.request(method, url)
+                within = True
+            except QueryBudgetExceeded as e:
+                print(e)
+                within = False
+            expect(
+                within and response.status_code == 200,
+                f"{label}: {stats.count} queries, budget {budget} (HTTP {response.status_code})",
+                failures,
+            )
+            repeated = stats.repeated()
+            for sql, n in repeated:
+                print(f"       {n}x {sql}")
+            expect(not repeated, f"{label}: no repeated statements", failures)
+
+        # A revalidation after the payload left the cache is answered from
+        # the version row alone; the loader does not run
+        url = f"/api/application/{application_id}"
+        etag = (await client.get(url)).headers["ETag"]
+        detail_cache._entries.clear()
+        try:
+            with max_queries(1) as stats:
+                response = await client.get(url, headers={"If-None-Match": etag})
+            within = True
+        except QueryBudgetExceeded as e:
+            print(e)
+            within = False
+        expect(
+            within and response.status_code == 304,
+            f"getApplication (revalidate, uncached): {stats.count} queries, budget 1 (HTTP {response.status_code})",
+            failures,
+        )
+    await server.async_engine.dispose()
+    print(f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+def run() -> int:
+    # Uploads land in ./media; keep them out of the working tree
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            return asyncio.run(main())
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,236 @@
+"""EXPLAIN every hot query against a seeded database; fail on full scans.
+
+Builds the schema through db.migrations (so the index migration itself is
+exercised), seeds a few thousand rows, then EXPLAINs the statements the hot
+paths actually run, imported from the modules that run them where they are
+built outside the route. Any plan that scans a whole base table (SQLite ``SCAN t``,
+MySQL ``type=ALL``/``index``) is reported and the script exits non-zero, so
+it can gate CI:
+
+    python -m benchmarks.query_plans
+
+Runs on a scratch SQLite file by default. To check MySQL plans set DB_URL to
+an empty scratch schema; never point it at a database holding real data.
+"""
+import re
+import sys
+from datetime import date, datetime, timedelta, timezone
+from uuid import uuid4
+
+from benchmarks.common import bootstrap_env
+
+bootstrap_env("query_plans.db")
+
+from sqlalchemy import Connection, Table, event, func, insert, select, text  # noqa: E402
+from sqlalchemy.sql import visitors  # noqa: E402
+from sqlalchemy.sql.selectable import Alias  # noqa: E402
+
+from applications.detail import (  # noqa: E402
+    actions_query,
+    application_query,
+    document_access_query,
+    documents_query,
+    head_query,
+)
+from applications.queries import ApplicationFilters, application_page_query  # noqa: E402
+from applications.search import (  # noqa: E402
+    REFRESH_OVERLAP,
+    FulltextSearch,
+    candidates_query,
+    indexed_query,
+    remarks_query,
+)
+from applications.stats import stats_query  # noqa: E402
+from config import engine  # noqa: E402
+from db.migrations import run_migrations  # noqa: E402
+from db.models import (  # noqa: E402
+    ApplicationActions,
+    Applications,
+    ApplicationStatus,
+    Base,
+    SupportingDocuments,
+    TokenCounter,
+    User,
+)
+
+SEED_USERS = 50
+SEED_APPLICATIONS = 3000
+
+
+def seed(connection: Connection) -> dict:
+    users = [uuid4() for _ in range(SEED_USERS)]
+    connection.execute(
+        insert(User),
+        [
+            {
+                "id": uid,
+                "username": f"plan{i}",
+                "role": "student",
+                "department": "CS",
+                "tcet_email": f"plan-{uid}@example.com",
+                "isEmailVerified": True,
+            }
+            for i, uid in enumerate(users)
+        ],
+    )
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    token_base = connection.scalar(select(func.coalesce(func.max(Applications.token_no), 0)))
+    applications, actions, documents = [], [], []
+    for n in range(SEED_APPLICATIONS):
+        application_id = uuid4()
+        created_at = start + timedelta(minutes=n * 7)
+        applications.append(
+            {
+                "id": application_id,
+                "description": "plan check",
+                "subject": f"plan {n}",
+                "to": "HOD",
+                "status": list(ApplicationStatus)[n % len(ApplicationStatus)],
+                "created_by_id": users[n % SEED_USERS],
+                "current_handler_id": users[(n * 7) % SEED_USERS],
+                "created_at": created_at,
+                "updated_at": created_at,
+                "year": 1900 + n % 50,
+                "token_no": token_base + n + 1,
+                "is_verified": False,
+            }
+        )
+        actions.append(
+            {
+                "id": uuid4(),
+                "application_id": application_id,
+                "from_user_id": users[n % SEED_USERS],
+                "to_user_id": users[(n * 7) % SEED_USERS],
+                "action_type": "INWARD",
+                "created_at": created_at,
+            }
+        )
+        documents.append(
+            {
+                "id": uuid4(),
+                "application_id": application_id,
+                "document_name": "scan.pdf",
+                "document_url": f"media/{uuid4()}.pdf",
+            }
+        )
+    connection.execute(insert(Applications), applications)
+    connection.execute(insert(ApplicationActions), actions)
+    connection.execute(insert(SupportingDocuments), documents)
+    return {
+        "user_id": users[0],
+        # Transient principals for the role-dependent visibility filters
+        "student": User(id=users[0], role="student"),
+        "clerk": User(id=users[1], role="clerk"),
+        "email": f"plan-{users[0]}@example.com",
+        "application_id": applications[-1]["id"],
+        "application_ids": [row["id"] for row in applications[-500:]],
+        # A search index refresh sees the last few hours' changes
+        "updated_at": applications[-1]["created_at"],
+        "document_url": documents[-1]["document_url"],
+        "cursor": (applications[SEED_APPLICATIONS // 2]["created_at"], applications[SEED_APPLICATIONS // 2]["id"]),
+        "year": applications[-1]["year"],
+    }
+
+
+def hot_queries(s: dict) -> dict:
+    queries = {
+        "protectRoute: user by id": select(User).where(User.id == s["user_id"]),
+        "login/signup: user by email": select(User).where(User.tcet_email == s["email"]),
+        "/all: first page": application_page_query(s["user_id"], 101),
+        "/all: keyset page": application_page_query(s["user_id"], 101, after=s["cursor"]),
+        "/all: filtered page": application_page_query(
+            s["user_id"],
+            101,
+            filters=ApplicationFilters(statuses=[ApplicationStatus.PENDING], from_date=date(2024, 2, 1)),
+        ),
+        "create: token counter": select(TokenCounter.last_value).where(
+            TokenCounter.year == s["year"]
+        ),
+        "create: seed token counter": select(func.max(Applications.token_no)).where(
+            Applications.year == s["year"]
+        ),
+        "detail: version row": head_query(s["application_id"]),
+        "detail: application (as creator/handler)": application_query(s["application_id"], s["student"]),
+        "detail: application (as clerk)": application_query(s["application_id"], s["clerk"]),
+        "detail: actions": actions_query(s["application_id"]),
+        "detail: documents": documents_query(s["application_id"]),
+        "get_document: by url": select(SupportingDocuments.id).where(
+            SupportingDocuments.document_url == s["document_url"]
+        ).limit(1),
+        "get_document: access": document_access_query(s["document_url"], s["student"]),
+        "get-stats: handler": stats_query(s["user_id"]),
+        "get-stats: date range": stats_query(None, date(2024, 1, 1), date(2024, 1, 31)),
+    }
+    filters = ApplicationFilters(statuses=[ApplicationStatus.PENDING])
+    if engine.dialect.name == "mysql":
+        queries["search: fulltext page"] = FulltextSearch().query(
+            s["user_id"], ["plan", "check"], filters, 21, 0
+        )
+    else:
+        since = s["updated_at"] - REFRESH_OVERLAP
+        queries["search: candidates"] = candidates_query(s["application_ids"], s["user_id"], filters)
+        queries["search: index refresh"] = indexed_query(since)
+        queries["search: remarks refresh"] = remarks_query(since)
+    return queries
+
+
+@event.listens_for(engine, "before_cursor_execute", retval=True)
+def _prefix_explain(conn, cursor, statement, parameters, context, executemany):
+    # Let SQLAlchemy bind and expand parameters as usual, then EXPLAIN the result
+    if context is not None and context.execution_options.get("explain"):
+        prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+        statement = prefix + statement
+    return statement, parameters
+
+
+def explain(connection: Connection, statement) -> list[dict]:
+    result = connection.execute(statement.execution_options(explain=True))
+    columns = [column[0] for column in result.cursor.description]
+    return [dict(zip(columns, row)) for row in result.cursor.fetchall()]
+
+
+def full_scans(dialect: str, plan: list, statement) -> list[str]:
+    # Plans name aliased tables (detail's created_by, from_user...) by alias
+    tables = set(Base.metadata.tables) | {
+        element.name
+        for element in visitors.iterate(statement)
+        if isinstance(element, Alias) and isinstance(element.element, Table)
+    }
+    problems = []
+    for row in plan:
+        if dialect == "sqlite":
+            match = re.match(r"SCAN (\S+)", row["detail"])
+            if match and match.group(1) in tables:
+                problems.append(row["detail"])
+        elif row["type"] in ("ALL", "index") and row["table"] in tables:
+            problems.append(f"{row['table']}: type={row['type']} key={row['key']}")
+    return problems
+
+
+def main() -> int:
+    run_migrations(engine)
+    with engine.begin() as connection:
+        sample = seed(connection)
+        if engine.dialect.name == "sqlite":
+            connection.execute(text("ANALYZE"))
+        else:
+            connection.exec_driver_sql(
+                "ANALYZE TABLE users, applications, applicationActions, "
+                "supporting_documents, application_daily_stats"
+            )
+    failures = 0
+    with engine.connect() as connection:
+        for name, statement in hot_queries(sample).items():
+            plan = explain(connection, statement)
+            problems = full_scans(engine.dialect.name, plan, statement)
+            status = "FULL SCAN" if problems else "ok"
+            print(f"[{status:^9}] {name}")
+            for problem in problems:
+                print(f"             {problem}")
+            failures += bool(problems)
+    print(f"{failures} of {len(hot_queries(sample))} hot queries fall back to a full scan")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
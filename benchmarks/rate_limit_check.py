@@ -0,0 +1,105 @@
+"""The auth rate limit must hold with 100 concurrent clients.
+
+``--clients`` threads start together behind a barrier and each fires
+``--requests`` checks at one IP_RATE_LIMITS key for the same IP. Exactly
+``limit`` checks may be allowed. Uses Redis when REDIS_URL is reachable
+(the threads then race in Redis, as uvicorn workers would) and the
+shared fallback store otherwise. With Redis, the old GET + SETEX/INCR
+sequence is run the same way for comparison.
+
+Usage:
+    python -m benchmarks.rate_limit_check [--clients 100] [--requests 5]
+
+Exits non-zero if more (or fewer) than ``limit`` checks were allowed.
+"""
+import argparse
+import sys
+import threading
+import time
+import uuid
+
+from benchmarks.common import bootstrap_env, percentile, print_table
+
+bootstrap_env("rate_limit_check.db")
+
+from auth import utils  # noqa: E402
+
+
+def legacy_is_rate_limited(key: str, ip: str) -> bool:
+    """The pre-Lua implementation: up to two round trips, racy."""
+    limit, window = utils.IP_RATE_LIMITS[key]
+    rl_key = f"rl:{key}:{ip}"
+    current = utils.redis_client.get(rl_key)
+    if current is None:
+        utils.redis_client.setex(rl_key, window, 1)
+        return False
+    if int(current) >= limit:
+        return True
+    utils.redis_client.incr(rl_key)
+    return False
+
+
+def hammer(check, key: str, clients: int, requests: int) -> tuple[int, list[float]]:
+    ip = f"load-test-{uuid.uuid4().hex[:8]}"  # fresh window per run
+    barrier = threading.Barrier(clients)
+    allowed = []
+    latencies = []
+    lock = threading.Lock()
+
+    def client():
+        barrier.wait()
+        mine, timings = 0, []
+        for _ in range(requests):
+            started = time.perf_counter()
+            limited = check(key, ip)
+            timings.append(time.perf_counter() - started)
+            mine += not limited
+        with lock:
+            allowed.append(mine)
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(allowed), latencies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=5)
+    args = parser.parse_args()
+
+    strategies = [("sliding window", utils.is_rate_limited)]
+    if utils.use_redis:
+        strategies.append(("legacy get/incr", legacy_is_rate_limited))
+    else:
+        print("Redis not reachable: checking the shared fallback store")
+
+    results, failures = [], 0
+    for key, (limit, _window) in utils.IP_RATE_LIMITS.items():
+        for label, check in strategies:
+            allowed, latencies = hammer(check, key, args.clients, args.requests)
+            holds = allowed == limit
+            if check is utils.is_rate_limited and not holds:
+                failures += 1
+            results.append(
+                {
+                    "key": key,
+                    "strategy": label,
+                    "limit": limit,
+                    "allowed": allowed,
+                    "holds": "yes" if holds else "NO",
+                    "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+                    "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+                }
+            )
+    print(f"{args.clients} clients x {args.requests} checks per key")
+    print_table(results, ["key", "strategy", "limit", "allowed", "holds", "p50_ms", "p99_ms"])
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
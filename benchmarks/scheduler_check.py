@@ -0,0 +1,105 @@
+"""Each scheduled job must run on exactly one worker per interval.
+
+Starts ``--workers`` processes that each run a Scheduler with the same
+job (like uvicorn workers running the lifespan hook) for ``--seconds``.
+Every run appends "<pid> <time>" to a shared file. Checks that:
+
+* consecutive runs are at least one lease apart (no two workers ran it
+  for the same interval)
+* the job ran about as often as one worker alone would run it
+* a failing job is counted and does not stop its schedule
+
+Uses Redis when REDIS_URL is reachable, otherwise a scratch fallback store.
+Exits non-zero on a violation:
+
+    python -m benchmarks.scheduler_check [--workers 4] [--interval 0.5]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.common import bootstrap_env
+
+bootstrap_env("scheduler_check.db")
+
+SCRATCH = tempfile.mkdtemp(prefix="scheduler-check-")
+os.environ.setdefault("FALLBACK_STORE_PATH", os.path.join(SCRATCH, "store"))
+
+
+def worker(log_path: str, name: str, interval: float, seconds: float, results) -> None:
+    from scheduler import Scheduler
+
+    def record():
+        with open(log_path, "a") as log:
+            log.write(f"{os.getpid()} {time.time()}\n")
+
+    def broken():
+        raise RuntimeError("boom")
+
+    async def main():
+        scheduler = Scheduler()
+        scheduler.register(name, record, interval=interval, jitter=0.2)
+        scheduler.register(f"{name}-broken", broken, interval=interval, jitter=0.2)
+        await scheduler.start()
+        await asyncio.sleep(seconds)
+        await scheduler.stop()
+        results.put(scheduler.stats()["jobs"])
+
+    asyncio.run(main())
+
+
+def expect(condition: bool, label: str, failures: list) -> None:
+    print(f"[{'ok' if condition else 'FAIL':^4}] {label}")
+    if not condition:
+        failures.append(label)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--seconds", type=float, default=6.0)
+    args = parser.parse_args()
+    failures: list[str] = []
+
+    context = multiprocessing.get_context("spawn")
+    log_path = os.path.join(SCRATCH, "runs.log")
+    name = f"check-{os.getpid()}"  # a fresh lease key per invocation
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(log_path, name, args.interval, args.seconds, results))
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    stats = [results.get(timeout=args.seconds + 60) for _ in processes]
+    for process in processes:
+        process.join()
+
+    with open(log_path) as log:
+        runs = [(int(pid), float(at)) for pid, at in (line.split() for line in log)]
+    times = sorted(at for _, at in runs)
+    lease = args.interval * (1 - 0.2)
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    runners = {pid for pid, _ in runs}
+    expected = args.seconds / args.interval
+    print(f"{len(runs)} runs by {len(runners)} worker(s), min gap {min(gaps, default=0):.3f}s, lease {lease:.3f}s")
+    expect(all(gap >= lease * 0.98 for gap in gaps), "runs are at least one lease apart", failures)
+    expect(expected * 0.6 <= len(runs) <= expected * 1.3, f"~{expected:.0f} runs in {args.seconds}s", failures)
+    broken = [s[f"{name}-broken"] for s in stats]
+    expect(
+        sum(s["failures"] for s in broken) >= expected * 0.6 and all(s["runs"] == 0 for s in broken),
+        "failing job keeps its schedule and counts failures",
+        failures,
+    )
+    expect(any(s[name]["last_duration_ms"] is not None for s in stats), "last-run duration reported", failures)
+    print(f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
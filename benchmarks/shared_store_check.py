@@ -0,0 +1,128 @@
+"""The Redis-less fallback store must be shared, bounded and fast.
+
+Runs against a scratch SharedTTLStore file with ``--workers`` processes,
+as uvicorn's workers would use it:
+
+* an OTP-style entry written by one process is read by every other
+* entries expire after their TTL
+* the otp_verify rate limit holds across processes checking the same IP
+* writing far more keys than fit keeps the file size fixed (eviction)
+
+and reports get/setex latency. Exits non-zero on a violation:
+
+    python -m benchmarks.shared_store_check [--workers 4]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.common import bootstrap_env, percentile, print_table
+
+bootstrap_env("shared_store_check.db")
+
+from auth.rate_limit import SlidingWindowLimiter  # noqa: E402
+from auth.shared_store import SharedTTLStore  # noqa: E402
+
+SIZE_BYTES = 1024 * 1024
+
+
+def read_otp(path: str, key: str, results) -> None:
+    store = SharedTTLStore(path, SIZE_BYTES)
+    results.put(store.get(key))
+
+
+def limit_ip(path: str, limit: int, window: float, start, results) -> None:
+    limiter = SlidingWindowLimiter(store=SharedTTLStore(path, SIZE_BYTES))
+    start.wait()
+    results.put(sum(limiter.hit("rl:otp_verify:203.0.113.7", limit, window)[0] for _ in range(25)))
+
+
+def expect(condition: bool, label: str, failures: list) -> None:
+    print(f"[{'ok' if condition else 'FAIL':^4}] {label}")
+    if not condition:
+        failures.append(label)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    failures: list[str] = []
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "store")
+        store = SharedTTLStore(path, SIZE_BYTES)
+
+        otp = json.dumps({"hashed_otp": "x" * 60, "attempts": 0})
+        store.setex("otp:student@example.com", 300, otp)
+        results = context.Queue()
+        readers = [
+            context.Process(target=read_otp, args=(path, "otp:student@example.com", results))
+            for _ in range(args.workers)
+        ]
+        for reader in readers:
+            reader.start()
+        seen = [results.get(timeout=30) for _ in readers]
+        for reader in readers:
+            reader.join()
+        expect(all(value == otp for value in seen), "entry visible to every worker", failures)
+
+        store.setex("reg:short@example.com", 0.2, "{}")
+        expect(store.get("reg:short@example.com") == "{}", "entry readable before expiry", failures)
+        time.sleep(0.3)
+        expect(store.get("reg:short@example.com") is None, "entry gone after its TTL", failures)
+        expect(store.ttl("reg:short@example.com") == -2, "ttl of a missing key is -2", failures)
+
+        limit = 20
+        start = context.Barrier(args.workers)
+        workers = [
+            context.Process(target=limit_ip, args=(path, limit, 60, start, results))
+            for _ in range(args.workers)
+        ]
+        for worker in workers:
+            worker.start()
+        allowed = sum(results.get(timeout=60) for _ in workers)
+        for worker in workers:
+            worker.join()
+        expect(
+            allowed == limit,
+            f"rate limit holds across {args.workers} workers ({allowed}/{limit} allowed)",
+            failures,
+        )
+
+        size_before = os.path.getsize(path)
+        keys = store.slot_count * 4
+        set_times, get_times = [], []
+        for n in range(keys):
+            started = time.perf_counter()
+            store.setex(f"otp:load{n}@example.com", 300, otp)
+            set_times.append(time.perf_counter() - started)
+        for n in range(keys - 1000, keys):
+            started = time.perf_counter()
+            store.get(f"otp:load{n}@example.com")
+            get_times.append(time.perf_counter() - started)
+        expect(os.path.getsize(path) == size_before, f"{keys} keys fit the fixed file size", failures)
+        expect(store.evictions > 0, f"oldest entries evicted ({store.evictions})", failures)
+        recent = sum(store.get(f"otp:load{n}@example.com") is not None for n in range(keys - 100, keys))
+        expect(recent == 100, "most recent entries survive eviction", failures)
+
+        print_table(
+            [
+                {"op": "setex", "p50_us": round(percentile(set_times, 50) * 1e6, 1),
+                 "p99_us": round(percentile(set_times, 99) * 1e6, 1)},
+                {"op": "get", "p50_us": round(percentile(get_times, 50) * 1e6, 1),
+                 "p99_us": round(percentile(get_times, 99) * 1e6, 1)},
+            ],
+            ["op", "p50_us", "p99_us"],
+        )
+    print(f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
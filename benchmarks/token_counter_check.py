@@ -0,0 +1,164 @@
+"""Concurrent application creates must get unique, gap-free token numbers.
+
+Starts ``--workers`` processes, each running ``--concurrency`` coroutines that
+insert applications through the same transaction + retry path as
+/api/application/create, then checks the resulting token numbers for the year:
+
+* no duplicates (with any block size)
+* dense 1..N when ``--block-size`` is 1; with larger blocks, gaps are allowed
+  only for numbers left over in the one block each worker still holds
+  (refills are serialized per worker, so concurrent creates share a block)
+
+Usage:
+    python -m benchmarks.token_counter_check [--workers 4] [--per-worker 50]
+    python -m benchmarks.token_counter_check --block-size 10
+
+Exits non-zero on a violation. Wipes applications and token counters, so only
+ever point DB_URL at a scratch database.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import time
+from datetime import datetime
+from uuid import UUID, uuid4
+
+from benchmarks.common import bootstrap_env
+
+bootstrap_env("token_counter_check.db")
+
+from sqlalchemy import delete, select  # noqa: E402
+
+from config import async_engine, async_session, engine  # noqa: E402
+from db.migrations import run_migrations  # noqa: E402
+from db.models import (  # noqa: E402
+    ApplicationActions,
+    ApplicationDailyStats,
+    Applications,
+    ApplicationStatus,
+    SupportingDocuments,
+    TokenCounter,
+    User,
+    token_blocks,
+)
+from db.retry import run_in_transaction  # noqa: E402
+
+
+def reset() -> UUID:
+    run_migrations(engine)
+    with engine.begin() as conn:
+        for model in (ApplicationActions, SupportingDocuments, Applications, ApplicationDailyStats, TokenCounter):
+            conn.execute(delete(model))
+        user_id = uuid4()
+        conn.execute(
+            User.__table__.insert().values(
+                id=user_id,
+                username="token-check",
+                role="clerk",
+                department="System",
+                tcet_email=f"token-check-{user_id}@example.com",
+                isEmailVerified=True,
+            )
+        )
+    return user_id
+
+
+async def create_many(user_id: UUID, count: int, concurrency: int, block_size: int, attempts: int):
+    year = datetime.now().year
+
+    async def create_one(n: int):
+        # Reserved before the transaction, as /api/application/create does
+        token_no = (
+            await token_blocks.reserve(async_session, year, block_size) if block_size > 1 else None
+        )
+
+        async def work(session):
+            await session.run_sync(
+                lambda sync_session: sync_session.add(
+                    Applications.create_with_counter(
+                        session=sync_session,
+                        description="token check",
+                        created_by_id=user_id,
+                        current_handler_id=user_id,
+                        id=uuid4(),
+                        to="HOD",
+                        subject=f"token check {n}",
+                        status=ApplicationStatus.PENDING,
+                        year=year,
+                        token_no=token_no,
+                    )
+                )
+            )
+
+        await run_in_transaction(async_session, work, attempts=attempts)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(n: int):
+        async with semaphore:
+            await create_one(n)
+
+    await asyncio.gather(*(bounded(n) for n in range(count)))
+    await async_engine.dispose()
+
+
+def worker(user_id: UUID, args) -> None:
+    asyncio.run(create_many(user_id, args.per_worker, args.concurrency, args.block_size, args.attempts))
+
+
+def check(expected: int, args) -> list[str]:
+    year = datetime.now().year
+    with engine.connect() as conn:
+        tokens = list(conn.scalars(select(Applications.token_no).where(Applications.year == year)))
+    problems = []
+    if len(tokens) != expected:
+        problems.append(f"expected {expected} applications, found {len(tokens)}")
+    duplicates = len(tokens) - len(set(tokens))
+    if duplicates:
+        problems.append(f"{duplicates} duplicate token numbers")
+    if tokens:
+        missing = set(range(1, max(tokens) + 1)) - set(tokens)
+        allowed = 0 if args.block_size == 1 else args.workers * args.block_size
+        if len(missing) > allowed:
+            problems.append(f"{len(missing)} gaps (allowed {allowed}), e.g. {sorted(missing)[:10]}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--per-worker", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--block-size", type=int, default=1)
+    parser.add_argument("--attempts", type=int, default=10)
+    args = parser.parse_args()
+
+    user_id = reset()
+    started = time.perf_counter()
+    processes = [
+        multiprocessing.Process(target=worker, args=(user_id, args)) for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    expected = args.workers * args.per_worker
+    problems = check(expected, args)
+    if any(process.exitcode for process in processes):
+        problems.append("a worker process failed (see traceback above)")
+    print(
+        f"dialect={engine.dialect.name} workers={args.workers} block_size={args.block_size} "
+        f"creates={expected} in {elapsed:.2f}s ({expected / elapsed:.0f}/s)"
+    )
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("ok: token numbers are unique" + (" and dense" if args.block_size == 1 else ""))
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import { toast } from "sonner";
+
+// /api/application/all is paginated (newest first); this follows
+// next_cursor until every page is loaded.
+const PAGE_SIZE = 500;
+
+export async function fetchAllApplications<T>(): Promise<T[]> {
+  const applications: T[] = [];
+  let cursor: string | null = null;
+  do {
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+    if (cursor) {
+      params.set("cursor", cursor);
+    }
+    const res = await fetch(`/api/application/all?${params}`, {
+      method: "POST",
+    });
+    if (res.status !== 200) {
+      toast.error("Failed to load application");
+      break;
+    }
+    const page = await res.json();
+    applications.push(...page.applications);
+    cursor = page.next_cursor;
+  } while (cursor);
+  return applications;
+}
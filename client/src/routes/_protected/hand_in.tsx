@@ -6,7 +6,7 @@ import { DocumentRecord } from ".";
 import { getStatusColor, getStatusIcon } from "./index";
 import { Badge } from "@/components/ui/badge";
 import { formatDate } from "@/features/users/component/table";
-import { toast } from "sonner";
+import { fetchAllApplications } from "@/lib/applications";
 import { useLoaderData } from "@tanstack/react-router";
 import { useEffect, useState } from "react";
 import { Input } from "@/components/ui/input";
@@ -21,13 +21,7 @@ import {
 export const Route = createFileRoute("/_protected/hand_in")({
   component: RouteComponent,
   loader: async () => {
-    const res = await fetch("/api/application/all", {
-      method: "POST",
-    });
-    if (res.status !== 200) {
-      toast.error("Failed to load application");
-    }
-    return (await res.json()).applications;
+    return fetchAllApplications<DocumentRecord>();
   },
 });
 
@@ -11,10 +11,10 @@ import {
 import { useState } from "react";
 import { useAtom, useSetAtom, useAtomValue } from "jotai";
 import { useEffect } from "react";
-import { toast } from "sonner";
 import { Card, CardContent, CardTitle, CardHeader } from "@/components/ui/card";
 import { CheckCircle, Clock, XCircle } from "lucide-react";
 import { formatDate } from "@/features/users/component/table";
+import { fetchAllApplications } from "@/lib/applications";
 import { CircleSlash } from "lucide-react";
 import {
   Select,
@@ -39,13 +39,7 @@ export type DocumentRecord = {
 import { Badge } from "@/components/ui/badge";
 export const Route = createFileRoute("/_protected/")({
   loader: async () => {
-    const res = await fetch("/api/application/all", {
-      method: "POST",
-    });
-    if (res.status !== 200) {
-      toast.error("Failed to load application");
-    }
-    return (await res.json()).applications;
+    return fetchAllApplications<DocumentRecord>();
   },
   component: RouteComponent,
 });
@@ -1,21 +1,48 @@
 import dotenv
 import os
+import tempfile
 from typing import Optional
 from db.models import User, Applications
 from datetime import datetime, timedelta, timezone
 import jwt
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 dotenv.load_dotenv()
 db_url: str = os.getenv("DB_URL", "")
-engine = create_engine(
-    db_url,
-    pool_size=20,
-    max_overflow=30,
-    pool_pre_ping=True,
-    pool_recycle=3600,
+
+# Async drivers used by the request path; the sync engine stays for seed.py,
+# create_all and other blocking scripts.
+_ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+mysqlconnector": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Map a sync DB_URL onto its async driver (aiomysql, or aiosqlite for tests)."""
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        return url
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+async_db_url: str = os.getenv("ASYNC_DB_URL") or to_async_url(db_url)
+# SQLite stand-ins use their own pool classes, which reject QueuePool sizing
+_pool_options = (
+    {}
+    if db_url.startswith("sqlite")
+    else {"pool_size": 20, "max_overflow": 30, "pool_recycle": 3600}
 )
+engine = create_engine(db_url, pool_pre_ping=True, **_pool_options)
+async_engine = create_async_engine(async_db_url, pool_pre_ping=True, **_pool_options)
+# expire_on_commit=False: handlers read attributes after commit and async
+# sessions cannot lazy-load them back.
+async_session = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 _jwt_secret = os.getenv("JWT_SECRET")
 if not _jwt_secret:
     raise RuntimeError("JWT_SECRET must be set in the environment")
@@ -25,13 +52,93 @@ ACCESS_TOKEN_EXPIRY = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440")
 EMAIL_USERNAME = os.getenv("EMAIL_USERNAME")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 EMAIL_FROM = os.getenv("EMAIL_FROM")
+# SMTP transport; point MAIL_SERVER/MAIL_PORT at a local sink for testing
+MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+MAIL_PORT = int(os.getenv("MAIL_PORT", "587"))
+MAIL_STARTTLS = os.getenv("MAIL_STARTTLS", "true").lower() == "true"
+MAIL_SSL_TLS = os.getenv("MAIL_SSL_TLS", "false").lower() == "true"
+MAIL_USE_CREDENTIALS = os.getenv("MAIL_USE_CREDENTIALS", "true").lower() == "true"
+MAIL_VALIDATE_CERTS = os.getenv("MAIL_VALIDATE_CERTS", "true").lower() == "true"
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", "1000"))
+MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", "4"))
+MAIL_DRAIN_TIMEOUT_SECONDS = float(os.getenv("MAIL_DRAIN_TIMEOUT_SECONDS", "20"))
 PRODUCTION = os.getenv("PRODUCTION", "false").lower() == "true"
 CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "").split(",") if origin.strip()]
 if PRODUCTION and not CORS_ORIGINS:
     raise RuntimeError("CORS_ORIGINS must be configured in production (fail closed)")
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", "5"))
+# /api/application/all page size; requests above the max are clamped
+APPLICATION_PAGE_SIZE_DEFAULT = int(os.getenv("APPLICATION_PAGE_SIZE_DEFAULT", "100"))
+APPLICATION_PAGE_SIZE_MAX = int(os.getenv("APPLICATION_PAGE_SIZE_MAX", "500"))
+# Rows fetched (and streamed) per batch by /api/application/export
+EXPORT_BATCH_SIZE = max(1, int(os.getenv("EXPORT_BATCH_SIZE", "1000")))
+# /api/application/search engine (see applications/search.py): "fulltext"
+# (MySQL FULLTEXT indexes), "memory" (per-worker inverted index, refreshed
+# every SEARCH_INDEX_REFRESH_SECONDS; only without FULLTEXT, so ignored on
+# MySQL) or "auto" (fulltext on MySQL)
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "auto").strip().lower()
+SEARCH_INDEX_REFRESH_SECONDS = float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "60"))
+# Most applications one /api/application/bulk request may move
+BULK_TRANSITION_MAX = int(os.getenv("BULK_TRANSITION_MAX", "500"))
 ALLOWED_EXTENSIONS = set(os.getenv("ALLOWED_EXTENSIONS", "pdf,jpg,jpeg,png,doc,docx").split(","))
+# Per-worker cache of authenticated principals (see auth/principal_cache.py)
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "2048"))
+# "bcrypt" or "hmac" (keyed HMAC-SHA256, far cheaper; see auth/otp_hash.py)
+OTP_HASH_MODE = os.getenv("OTP_HASH_MODE", "bcrypt").strip().lower()
+# Threads per worker for bcrypt OTP hashing; further logins queue for one
+OTP_HASH_WORKERS = max(1, int(os.getenv("OTP_HASH_WORKERS", "2")))
+# Background jobs (see scheduler.py); each runs on one worker per interval.
+# MEDIA_SWEEP_INTERVAL_SECONDS=0 disables the unreferenced-media sweep
+CLEANUP_INTERVAL_SECONDS = max(1, int(os.getenv("CLEANUP_INTERVAL_SECONDS", "300")))
+MEDIA_SWEEP_INTERVAL_SECONDS = int(os.getenv("MEDIA_SWEEP_INTERVAL_SECONDS", "3600"))
+# /api/metrics: workers publish snapshots here for each other's scrapes
+# (see metrics.py); when METRICS_TOKEN is set, scrapes must send it as a
+# bearer token
+METRICS_DIR = os.getenv(
+    "METRICS_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "inward-outward-metrics"),
+)
+METRICS_FLUSH_SECONDS = max(1, int(os.getenv("METRICS_FLUSH_SECONDS", "5")))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Opt-in request profiling (see profiling.py): requests slower than
+# PROFILE_SLOW_MS, plus a PROFILE_SAMPLE_RATE fraction of all requests, are
+# sampled every PROFILE_INTERVAL_MS and saved to PROFILE_DIR, keeping the
+# newest PROFILE_MAX_FILES. Both 0 (the default) disables it
+PROFILE_SLOW_MS = int(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = max(1, int(os.getenv("PROFILE_INTERVAL_MS", "5")))
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "inward-outward-profiles")
+)
+PROFILE_MAX_FILES = max(1, int(os.getenv("PROFILE_MAX_FILES", "50")))
+# Per-request query counting (see query_stats.py), on by default outside
+# production, where responses also get a Server-Timing header. A statement
+# repeated QUERY_REPEAT_THRESHOLD times in one request is logged as a likely N+1
+QUERY_STATS = os.getenv("QUERY_STATS", "false" if PRODUCTION else "true").lower() == "true"
+QUERY_REPEAT_THRESHOLD = max(2, int(os.getenv("QUERY_REPEAT_THRESHOLD", "3")))
+# Cross-worker store for OTPs, registrations and rate limits when Redis is
+# unavailable (see auth/shared_store.py); a fixed-size file, RAM-backed in /dev/shm
+FALLBACK_STORE_PATH = os.getenv(
+    "FALLBACK_STORE_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "inward-outward-store"),
+)
+FALLBACK_STORE_MB = max(1, int(os.getenv("FALLBACK_STORE_MB", "8")))
+# Signed /api/documents/signed/<token> links (see server.get_signed_document)
+DOCUMENT_LINK_TTL_SECONDS = int(os.getenv("DOCUMENT_LINK_TTL_SECONDS", "300"))
+# Internal nginx location mapped to media/; when set, signed downloads are
+# handed to the proxy with X-Accel-Redirect instead of streamed by Python
+DOCUMENT_ACCEL_REDIRECT_PREFIX = os.getenv("DOCUMENT_ACCEL_REDIRECT_PREFIX", "")
+# Token numbers reserved per worker at a time; 1 keeps tokens gap-free
+TOKEN_BLOCK_SIZE = max(1, int(os.getenv("TOKEN_BLOCK_SIZE", "1")))
+# Attempts for a write transaction that hit a deadlock or lock wait timeout
+DB_RETRY_ATTEMPTS = max(1, int(os.getenv("DB_RETRY_ATTEMPTS", "3")))
+# Serialized application detail payloads (see applications/cache.py); the
+# size bounds the per-worker fallback used when Redis is unavailable
+DETAIL_CACHE_TTL_SECONDS = int(os.getenv("DETAIL_CACHE_TTL_SECONDS", "600"))
+DETAIL_CACHE_SIZE = int(os.getenv("DETAIL_CACHE_SIZE", "1024"))
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
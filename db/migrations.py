@@ -0,0 +1,145 @@
+"""Idempotent schema migrations for databases created before a model change.
+
+``Base.metadata.create_all`` only creates missing tables; it never adds
+indexes or columns to tables that already exist. Each migration below runs
+once and is recorded in ``schema_migrations``. seed.py applies them on
+container start, before the uvicorn workers boot; to run them by hand:
+
+    python -m db.migrations
+"""
+from datetime import datetime, timezone
+from typing import Callable
+
+from sqlalchemy import Connection, Engine, String, func, insert, inspect, select, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.models import (
+    ApplicationActions,
+    ApplicationDailyStats,
+    Applications,
+    Base,
+    SupportingDocuments,
+    User,
+)
+
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    applied_at: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(timezone.utc)
+    )
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+def _assert_unique(connection: Connection, index) -> None:
+    """Refuse to build a unique index over rows that already collide."""
+    columns = list(index.columns)
+    duplicates = connection.execute(
+        select(*columns, func.count())
+        .group_by(*columns)
+        .having(func.count() > 1)
+        .limit(5)
+    ).all()
+    if duplicates:
+        names = ", ".join(c.name for c in columns)
+        raise MigrationError(
+            f"Cannot create unique index {index.name}: duplicate ({names}) values "
+            f"such as {[tuple(row) for row in duplicates]}. Resolve them and re-run "
+            "python -m db.migrations"
+        )
+
+
+def create_declared_indexes(connection: Connection, *models) -> None:
+    for model in models:
+        existing = {column["name"] for column in inspect(connection).get_columns(model.__tablename__)}
+        for index in sorted(model.__table__.indexes, key=lambda i: i.name or ""):
+            # Left to the later migration that adds the column
+            if any(column.name not in existing for column in index.columns):
+                continue
+            if index.unique:
+                _assert_unique(connection, index)
+            index.create(connection, checkfirst=True)
+
+
+def _backfill_daily_stats(connection: Connection) -> None:
+    from applications.stats import rebuild_daily_stats
+
+    if connection.execute(select(ApplicationDailyStats.day).limit(1)).first():
+        return
+    rebuild_daily_stats(connection)
+
+
+def _hot_path_indexes(connection: Connection) -> None:
+    create_declared_indexes(
+        connection,
+        User,
+        Applications,
+        SupportingDocuments,
+        ApplicationActions,
+        ApplicationDailyStats,
+    )
+
+
+def _applications_version(connection: Connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("applications")}
+    if "version" in columns:  # created by create_all after the model change
+        return
+    connection.execute(
+        text("ALTER TABLE applications ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    )
+
+
+def _search_indexes(connection: Connection) -> None:
+    # FULLTEXT indexes are MySQL-only (declared with ddl_if); elsewhere this is a no-op
+    if connection.dialect.name != "mysql":
+        return
+    create_declared_indexes(connection, Applications, ApplicationActions)
+
+
+def _applications_updated_at(connection: Connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("applications")}
+    if "updated_at" not in columns:  # else created by create_all after the model change
+        connection.execute(text("ALTER TABLE applications ADD COLUMN updated_at DATETIME NULL"))
+        connection.execute(text("UPDATE applications SET updated_at = created_at"))
+        # SQLite cannot tighten a column in place; new databases get NOT NULL from create_all
+        if connection.dialect.name == "mysql":
+            connection.execute(text("ALTER TABLE applications MODIFY updated_at DATETIME NOT NULL"))
+    create_declared_indexes(connection, Applications)
+
+
+# Append only; ids are recorded once applied and never re-run
+MIGRATIONS: list[tuple[str, Callable[[Connection], None]]] = [
+    ("0001_backfill_daily_stats", _backfill_daily_stats),
+    ("0002_hot_path_indexes", _hot_path_indexes),
+    ("0003_applications_version", _applications_version),
+    ("0004_search_indexes", _search_indexes),
+    ("0005_applications_updated_at", _applications_updated_at),
+]
+
+
+def run_migrations(engine: Engine) -> list[str]:
+    """Create missing tables, then apply pending migrations in order."""
+    Base.metadata.create_all(engine)
+    with engine.connect() as connection:
+        applied = set(connection.scalars(select(SchemaMigration.id)))
+    ran = []
+    for migration_id, migrate in MIGRATIONS:
+        if migration_id in applied:
+            continue
+        with engine.begin() as connection:
+            migrate(connection)
+            connection.execute(insert(SchemaMigration).values(id=migration_id))
+        ran.append(migration_id)
+    return ran
+
+
+if __name__ == "__main__":
+    from config import engine
+
+    for migration_id in run_migrations(engine):
+        print(f"[migrate] applied {migration_id}")
+    print("[migrate] schema is up to date")
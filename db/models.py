@@ -1,8 +1,13 @@
-from sqlalchemy import String, ForeignKey, func, select
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, Session
+from sqlalchemy import String, ForeignKey, Index, func, select, update, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, Session, attributes
 from uuid import UUID, uuid4
 from enum import Enum as PyEnum
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
+from collections import defaultdict
+import asyncio
 from typing import List, Optional
 
 
@@ -75,6 +80,10 @@ class ActionType(str, PyEnum):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Every login/signup looks users up by email; one account per address
+        Index("ux_users_tcet_email", "tcet_email", unique=True),
+    )
     id: Mapped[UUID] = mapped_column(primary_key=True, default=lambda: uuid4())
     username: Mapped[str] = mapped_column(String(30))
     role: Mapped[UserRole] = mapped_column(String(200), default=UserRole.STUDENT)
@@ -120,6 +129,19 @@ class VerificationToken(Base):
 
 class Applications(Base):
     __tablename__ = "applications"
+    __table_args__ = (
+        # /all walks each side of "created by OR handled by" newest first
+        Index("ix_applications_creator_created", "created_by_id", "created_at", "id"),
+        Index("ix_applications_handler_created", "current_handler_id", "created_at", "id"),
+        Index("ux_applications_year_token", "year", "token_no", unique=True),
+        # The in-process search index refreshes from rows changed since it last looked
+        Index("ix_applications_updated_at", "updated_at"),
+        # /search on MySQL (see applications/search.py); other databases
+        # search an in-process index instead
+        Index(
+            "ft_applications_text", "subject", "description", "to", mysql_prefix="FULLTEXT"
+        ).ddl_if(dialect="mysql"),
+    )
     id: Mapped[UUID] = mapped_column(primary_key=True, default=lambda: uuid4())
     description: Mapped[str] = mapped_column(String(256))
     created_by_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
@@ -152,13 +174,29 @@ class Applications(Base):
     )
     year: Mapped[int] = mapped_column()
     token_no: Mapped[int] = mapped_column()
+    # Bumped by every ORM UPDATE; detail ETags and cache keys derive from it
+    version: Mapped[int] = mapped_column(default=1, server_default="1")
+    # Stamped on insert and by every UPDATE, bulk Core ones included (onupdate)
+    updated_at: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    __mapper_args__ = {"version_id_col": version}
+
+    def bump_version(self) -> None:
+        """Move to the next version even if no column changed, e.g. when
+        only actions or documents were added. The UPDATE still checks the
+        version it read (version_id_col), so a concurrent write fails with
+        StaleDataError instead of being overwritten."""
+        self.version = self.version + 1
 
     @staticmethod
     def get_next_counter(session: Session, year: int) -> int:
-        stmt = select(func.max(Applications.token_no)).where(Applications.year == year).with_for_update()
-        result = session.execute(stmt).scalar()
-        return (result or 0) + 1
-
+        """Next token number for ``year``, straight from the year's
+        token_counters row, so tokens stay dense. For blocks reserved ahead
+        of the transaction see TokenBlocks."""
+        return TokenCounter.allocate(session, year)
 
     @classmethod
     def create_with_counter(
@@ -171,9 +209,14 @@ class Applications(Base):
         to: str,
         subject: str,
         status: ApplicationStatus,
+        year: Optional[int] = None,
+        token_no: Optional[int] = None,
     ) -> "Applications":
-        current_year = datetime.now().year
-        next_counter = cls.get_next_counter(session, current_year)
+        """A new application; ``token_no`` (for ``year``) if already
+        reserved, otherwise the next one from the counter row."""
+        year = year or datetime.now().year
+        if token_no is None:
+            token_no = cls.get_next_counter(session, year)
         return cls(
             description=description,
             created_by_id=created_by_id,
@@ -182,13 +225,99 @@ class Applications(Base):
             to=to,
             subject=subject,
             status=status,
-            year=current_year,
-            token_no=next_counter,
+            year=year,
+            token_no=token_no,
         )
 
 
+class TokenCounter(Base):
+    """Last token number handed out per year (one row per year)."""
+
+    __tablename__ = "token_counters"
+    year: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    last_value: Mapped[int] = mapped_column(default=0)
+
+    @classmethod
+    def allocate(cls, session: Session, year: int, count: int = 1) -> int:
+        """Reserve ``count`` consecutive numbers for ``year``; returns the first.
+
+        The UPDATE locks only this year's counter row until the caller's
+        transaction ends, instead of range-locking every application row.
+        """
+        bumped = session.execute(
+            update(cls)
+            .where(cls.year == year)
+            .values(last_value=cls.last_value + count)
+            .execution_options(synchronize_session=False)
+        )
+        if bumped.rowcount:
+            last = session.execute(select(cls.last_value).where(cls.year == year)).scalar_one()
+            return last - count + 1
+        # First token of the year (or a database that predates this table):
+        # continue from whatever applications already hold.
+        start = session.execute(
+            select(func.max(Applications.token_no)).where(Applications.year == year)
+        ).scalar() or 0
+        try:
+            with session.begin_nested():
+                session.add(cls(year=year, last_value=start + count))
+        except IntegrityError:
+            # Another worker created the row first; take the normal path
+            return cls.allocate(session, year, count)
+        return start + 1
+
+
+class TokenBlocks:
+    """Token numbers reserved per worker, ``block_size`` at a time.
+
+    A block is taken in its own short transaction *before* the create
+    transaction opens, so the counter row lock stays out of creates and a
+    create never holds two pooled connections. Refills are serialized per
+    year: coroutines that find the block empty wait for one refill and then
+    share it instead of each reserving (and mostly wasting) their own.
+    Numbers are lost when a worker exits or a create rolls back, so tokens
+    may have gaps.
+    """
+
+    def __init__(self):
+        self._blocks: dict[int, list[int]] = {}  # year -> [next value, end (exclusive)]
+        self._locks: dict[int, asyncio.Lock] = {}
+
+    def take(self, year: int) -> Optional[int]:
+        block = self._blocks.get(year)
+        if block is None or block[0] >= block[1]:
+            return None
+        value = block[0]
+        block[0] += 1
+        return value
+
+    async def reserve(self, sessionmaker, year: int, block_size: int) -> int:
+        """The next number of this worker's block for ``year``, refilling it if empty."""
+        value = self.take(year)
+        if value is not None:
+            return value
+        async with self._locks.setdefault(year, asyncio.Lock()):
+            value = self.take(year)
+            if value is not None:
+                return value
+            async with sessionmaker() as session:
+                first = await session.run_sync(
+                    lambda sync_session: TokenCounter.allocate(sync_session, year, block_size)
+                )
+                await session.commit()
+            self._blocks[year] = [first + 1, first + block_size]
+            return first
+
+
+token_blocks = TokenBlocks()
+
+
 class SupportingDocuments(Base):
     __tablename__ = "supporting_documents"
+    __table_args__ = (
+        Index("ix_supporting_documents_url", "document_url"),
+        Index("ix_supporting_documents_application", "application_id"),
+    )
     id: Mapped[UUID] = mapped_column(primary_key=True, default=lambda: uuid4())
     document_name: Mapped[UUID] = mapped_column(String(200))
     document_url: Mapped[str] = mapped_column(String(200))
@@ -200,6 +329,12 @@ class SupportingDocuments(Base):
 
 class ApplicationActions(Base):
     __tablename__ = "applicationActions"
+    __table_args__ = (
+        Index("ix_application_actions_application", "application_id", "created_at"),
+        Index("ft_application_actions_comments", "comments", mysql_prefix="FULLTEXT").ddl_if(
+            dialect="mysql"
+        ),
+    )
     id: Mapped[UUID] = mapped_column(primary_key=True, default=lambda: uuid4())
     application_id: Mapped[str] = mapped_column(ForeignKey("applications.id"))
     from_user_id: Mapped[str] = mapped_column(ForeignKey("users.id"))
@@ -220,3 +355,83 @@ class ApplicationActions(Base):
     created_at: Mapped[datetime] = mapped_column(
         default=lambda: datetime.now(timezone.utc)
     )
+
+
+# Rollup bucket for applications that currently have no handler
+UNASSIGNED_HANDLER = UUID(int=0)
+
+
+class ApplicationDailyStats(Base):
+    """Application counts per creation day, current handler and status.
+
+    Kept in step with `applications` by the after_flush hook below so
+    get-stats reads O(days) rollup rows instead of every application.
+    """
+
+    __tablename__ = "application_daily_stats"
+    __table_args__ = (Index("ix_application_daily_stats_handler_day", "handler_id", "day"),)
+    day: Mapped[date] = mapped_column(primary_key=True)
+    handler_id: Mapped[UUID] = mapped_column(primary_key=True)
+    status: Mapped[ApplicationStatus] = mapped_column(primary_key=True)
+    count: Mapped[int] = mapped_column(default=0)
+
+
+def daily_stats_key(created_at: datetime, handler_id, status) -> tuple:
+    """The rollup row an application with these values is counted in."""
+    return (created_at.date(), handler_id or UNASSIGNED_HANDLER, status)
+
+
+def _previous(obj, key: str):
+    history = attributes.get_history(obj, key)
+    return history.deleted[0] if history.deleted else getattr(obj, key)
+
+
+def apply_daily_stats_deltas(connection, deltas: dict) -> None:
+    """Add signed counts to rollup rows, creating missing rows (one statement)."""
+    rows = [
+        {"day": day, "handler_id": handler_id, "status": status, "count": delta}
+        for (day, handler_id, status), delta in deltas.items()
+        if delta
+    ]
+    if not rows:
+        return
+    table = ApplicationDailyStats.__table__
+    if connection.dialect.name == "mysql":
+        statement = mysql_insert(table)
+        statement = statement.on_duplicate_key_update(
+            count=table.c.count + statement.inserted["count"]
+        )
+    else:
+        statement = sqlite_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.handler_id, table.c.status],
+            set_={"count": table.c.count + statement.excluded["count"]},
+        )
+    connection.execute(statement, rows)
+
+
+@event.listens_for(Session, "after_flush")
+def _maintain_daily_stats(session, flush_context):
+    deltas: dict = defaultdict(int)
+    for obj in session.new:
+        if isinstance(obj, Applications):
+            deltas[daily_stats_key(obj.created_at, obj.current_handler_id, obj.status)] += 1
+    for obj in session.dirty:
+        if not isinstance(obj, Applications):
+            continue
+        if not (
+            attributes.get_history(obj, "status").has_changes()
+            or attributes.get_history(obj, "current_handler_id").has_changes()
+        ):
+            continue
+        old = daily_stats_key(obj.created_at, _previous(obj, "current_handler_id"), _previous(obj, "status"))
+        new = daily_stats_key(obj.created_at, obj.current_handler_id, obj.status)
+        deltas[old] -= 1
+        deltas[new] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Applications):
+            deltas[
+                daily_stats_key(obj.created_at, _previous(obj, "current_handler_id"), _previous(obj, "status"))
+            ] -= 1
+    if deltas:
+        apply_daily_stats_deltas(session.connection(), deltas)
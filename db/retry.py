@@ -0,0 +1,49 @@
+"""Retry write transactions that lost a deadlock or a lock wait."""
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, TypeVar
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+T = TypeVar("T")
+
+# MySQL: 1213 deadlock found, 1205 lock wait timeout exceeded
+_MYSQL_RETRYABLE = {1213, 1205}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if not isinstance(exc, DBAPIError):
+        return False
+    args = getattr(exc.orig, "args", ())
+    if args and args[0] in _MYSQL_RETRYABLE:
+        return True
+    message = str(exc.orig).lower()
+    return "deadlock" in message or "database is locked" in message
+
+
+async def run_in_transaction(
+    sessionmaker: async_sessionmaker,
+    work: Callable[[AsyncSession], Awaitable[T]],
+    attempts: int = 3,
+    base_delay: float = 0.05,
+) -> T:
+    """Run ``work`` in a fresh session and commit, retrying on deadlocks.
+
+    The database rolled the losing transaction back, so ``work`` is called
+    again from the start; it must not have side effects outside the session.
+    """
+    for attempt in range(1, attempts + 1):
+        async with sessionmaker() as session:
+            try:
+                result = await work(session)
+                await session.commit()
+                return result
+            except DBAPIError as e:
+                await session.rollback()
+                if attempt == attempts or not is_retryable(e):
+                    raise
+                logging.warning(f"Retrying transaction after {e.orig!r} (attempt {attempt})")
+        await asyncio.sleep(base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+    raise AssertionError("unreachable")
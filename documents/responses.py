@@ -0,0 +1,177 @@
+"""File response with validators, conditional GET and byte ranges.
+
+Implemented here rather than relying on the installed Starlette so behaviour
+does not depend on its version (older releases have no Range support and
+none answer If-None-Match). Covers what browsers and PDF viewers send:
+
+* strong ``ETag`` / ``Last-Modified``; ``If-None-Match`` (takes precedence)
+  and ``If-Modified-Since`` answer 304
+* a single ``Range`` (``a-b``, ``a-``, ``-n``) answers 206, unsatisfiable
+  ranges 416; ``If-Range`` falls back to the full 200 when stale. Multi-range
+  requests are answered with the full file, which RFC 9110 allows
+* full bodies use the ASGI ``pathsend`` extension (the server sendfile()s
+  the path) when offered, otherwise the file is streamed from a thread.
+  ``zerocopysend`` is not used: BaseHTTPMiddleware (see server.py) only
+  forwards ``pathsend``
+"""
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+from urllib.parse import quote
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header: str, size: int):
+    """(start, end_exclusive) for a single byte range, None to ignore the
+    header, or "unsatisfiable"."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            suffix = int(last)
+            if suffix < 0:
+                return None
+            if suffix == 0 or size == 0:
+                return "unsatisfiable"
+            return max(0, size - suffix), size
+        start = int(first)
+        end = int(last) + 1 if last != "" else size
+    except ValueError:
+        return None
+    if start < 0 or (last != "" and end <= start):
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    return start, min(end, size)
+
+
+def etag_matches(header: str, etag: str, weak: bool) -> bool:
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _not_after(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since
+
+
+class DocumentResponse(Response):
+    def __init__(
+        self,
+        path: str,
+        etag: Optional[str] = None,
+        filename: Optional[str] = None,
+        media_type: str = "application/octet-stream",
+        stat_result: Optional[os.stat_result] = None,
+        headers: Optional[dict] = None,
+    ):
+        self.path = path
+        self.status_code = 200
+        self.media_type = media_type
+        self.background = None
+        self.stat_result = stat_result or os.stat(path)
+        if not stat.S_ISREG(self.stat_result.st_mode):
+            raise FileNotFoundError(path)
+        self.init_headers(headers)
+        # Files never change in place, so size + mtime identify the bytes
+        self.etag = etag or f'"{self.stat_result.st_size:x}-{self.stat_result.st_mtime_ns:x}"'
+        self.headers["etag"] = self.etag
+        self.headers["last-modified"] = formatdate(self.stat_result.st_mtime, usegmt=True)
+        self.headers["accept-ranges"] = "bytes"
+        # Cacheable by the browser only, and revalidated on every use
+        self.headers["cache-control"] = "private, no-cache"
+        if filename:
+            quoted = quote(filename)
+            if quoted != filename:
+                self.headers["content-disposition"] = f"attachment; filename*=utf-8''{quoted}"
+            else:
+                self.headers["content-disposition"] = f'attachment; filename="{filename}"'
+
+    def _not_modified(self, request_headers: Headers) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag_matches(if_none_match, self.etag, weak=True)
+        if_modified_since = request_headers.get("if-modified-since")
+        return if_modified_since is not None and _not_after(if_modified_since, self.stat_result.st_mtime)
+
+    def _range_allowed(self, request_headers: Headers) -> bool:
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            return etag_matches(if_range, self.etag, weak=False)  # strong comparison
+        return if_range == self.headers["last-modified"]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        method = scope.get("method", "GET").upper()
+        size = self.stat_result.st_size
+
+        if method in ("GET", "HEAD") and self._not_modified(request_headers):
+            for name in ("content-length", "content-type", "content-disposition"):
+                if name in self.headers:
+                    del self.headers[name]
+            await send({"type": "http.response.start", "status": 304, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        byte_range = None
+        range_header = request_headers.get("range")
+        if method == "GET" and range_header and self._range_allowed(request_headers):
+            byte_range = parse_range(range_header, size)
+        if byte_range == "unsatisfiable":
+            self.headers["content-range"] = f"bytes */{size}"
+            self.headers["content-length"] = "0"
+            await send({"type": "http.response.start", "status": 416, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        start, end = byte_range or (0, size)
+        status = 206 if byte_range else 200
+        if byte_range:
+            self.headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+        self.headers["content-length"] = str(end - start)
+        await send({"type": "http.response.start", "status": status, "headers": self.raw_headers})
+        if method == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await self._send_body(scope, send, start, end)
+
+    async def _send_body(self, scope: Scope, send: Send, start: int, end: int) -> None:
+        extensions = scope.get("extensions") or {}
+        if "http.response.pathsend" in extensions and (start, end) == (0, self.stat_result.st_size):
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+            return
+        async with await anyio.open_file(self.path, "rb") as file:
+            await file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining or end == start:
+                await send({"type": "http.response.body", "body": b""})
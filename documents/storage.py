@@ -0,0 +1,281 @@
+"""Content-addressed storage for supporting documents.
+
+Uploads are hashed while they stream into a temp file (off the event loop)
+and, just before the request's transaction commits, moved into place once per
+distinct content under ``media/ab/cd/<sha256>.<ext>``. The database keeps the flat
+``media/<sha256>.<ext>`` form in ``SupportingDocuments.document_url`` (the
+client builds ``/api/documents/<name>`` from it), so every row pointing at
+the same bytes shares one URL and the rows themselves are the reference
+count. Files from before this layout stay at ``media/<uuid>.<ext>`` and are
+served from there.
+
+Moving content into place and removing unreferenced content both run under
+``storage_lock`` (an flock, so it holds across workers). ``release`` checks
+the reference count under it, and content moved into place (or found there
+already) has its mtime refreshed, so a file is never removed between an
+upload putting it in place and its row committing: either the row is
+visible, or the file is younger than ORPHAN_GRACE_SECONDS and stays. A
+transaction that fails after its file was placed leaves an unreferenced
+file, which the next release or sweep of that content removes.
+"""
+import asyncio
+import contextlib
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Optional
+
+from fastapi import UploadFile
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import SupportingDocuments
+from metrics import UPLOAD_BYTES, UPLOAD_LATENCY, UPLOAD_SIZE
+
+MEDIA_DIR = "media"
+CHUNK_SIZE = 256 * 1024
+# A file referenced by an upload that has not committed yet is never older
+# than this; younger unreferenced files are left for the next release/sweep
+ORPHAN_GRACE_SECONDS = 300
+
+_CONTENT_NAME = re.compile(r"^([0-9a-f]{64})\.([a-z0-9]+)$")
+_LOCK_NAME = ".storage.lock"
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def physical_path(document_url: str) -> str:
+    """Where the bytes behind a ``media/<name>`` document URL live on disk."""
+    name = os.path.basename(document_url)
+    match = _CONTENT_NAME.match(name)
+    if match:
+        digest = match.group(1)
+        return os.path.join(MEDIA_DIR, digest[:2], digest[2:4], name)
+    return os.path.join(MEDIA_DIR, name)  # legacy flat upload
+
+
+def content_etag(document_url: str) -> Optional[str]:
+    """Strong ETag for content-addressed files: the digest already names the bytes."""
+    match = _CONTENT_NAME.match(os.path.basename(document_url))
+    return f'"{match.group(1)}"' if match else None
+
+
+class StagedUpload:
+    """An upload written to a temp file that is not visible under media/ yet.
+
+    Routes stage before touching the database, ``commit()`` just before
+    their transaction commits (so a committed row never points at a missing
+    file) and ``discard()`` on every path (a no-op once committed). A
+    transaction that then fails leaves an unreferenced file for the sweep.
+    """
+
+    def __init__(self, ext: str):
+        self.ext = ext
+        self.size = 0
+        self.sha256 = ""
+        self._digest = hashlib.sha256()
+        fd, self.temp_path = tempfile.mkstemp(dir=MEDIA_DIR, prefix=".upload-")
+        self._file = os.fdopen(fd, "wb")
+        self._done = False
+
+    @property
+    def document_url(self) -> str:
+        return f"{MEDIA_DIR}/{self.sha256}.{self.ext}"
+
+    def _write(self, chunk: bytes) -> None:
+        self._digest.update(chunk)
+        self._file.write(chunk)
+
+    def _finish(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self.sha256 = self._digest.hexdigest()
+
+    def _commit(self) -> bool:
+        target = physical_path(self.document_url)
+        try:
+            # Same bytes already stored; refresh mtime so a concurrent
+            # release does not treat the file as an orphan
+            os.utime(target)
+            os.remove(self.temp_path)
+            return True
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(target)
+        os.makedirs(directory, exist_ok=True)
+        os.replace(self.temp_path, target)
+        _fsync_directory(directory)
+        return False
+
+    def _discard(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    async def commit(self) -> bool:
+        """Move the file into place; returns True if the content was already stored.
+
+        Calling it again (a retried transaction) only refreshes the mtime.
+        """
+        async with storage_lock():
+            if self._done:
+                await asyncio.to_thread(os.utime, physical_path(self.document_url))
+                return True
+            deduplicated = await asyncio.to_thread(self._commit)
+        self._done = True
+        return deduplicated
+
+    async def discard(self) -> None:
+        if not self._done:
+            self._done = True
+            await asyncio.to_thread(self._discard)
+
+
+def _lock_media() -> int:
+    os.makedirs(MEDIA_DIR, exist_ok=True)
+    fd = os.open(os.path.join(MEDIA_DIR, _LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+@contextlib.asynccontextmanager
+async def storage_lock():
+    """Exclusive across coroutines and workers (each holder opens its own descriptor)."""
+    fd = await asyncio.to_thread(_lock_media)
+    try:
+        yield
+    finally:
+        os.close(fd)  # releases the flock
+
+
+def _fsync_directory(path: str) -> None:
+    # Persist the rename itself; not supported on every platform
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+async def stage_upload(upload: UploadFile, ext: str, max_bytes: int) -> StagedUpload:
+    """Stream ``upload`` into a temp file, hashing as it goes.
+
+    File I/O runs in worker threads so large uploads never block the event
+    loop. Raises UploadTooLarge as soon as more than ``max_bytes`` have been
+    read; the temp file is removed on that and any other failure.
+    """
+    started = time.perf_counter()
+    await asyncio.to_thread(os.makedirs, MEDIA_DIR, exist_ok=True)
+    staged = await asyncio.to_thread(StagedUpload, ext)
+    try:
+        while chunk := await upload.read(CHUNK_SIZE):
+            staged.size += len(chunk)
+            if staged.size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            await asyncio.to_thread(staged._write, chunk)
+        await asyncio.to_thread(staged._finish)
+    except BaseException as e:
+        await staged.discard()
+        outcome = "too_large" if isinstance(e, UploadTooLarge) else "error"
+        UPLOAD_LATENCY.observe(time.perf_counter() - started, outcome)
+        raise
+    UPLOAD_LATENCY.observe(time.perf_counter() - started, "staged")
+    UPLOAD_BYTES.inc(amount=staged.size)
+    UPLOAD_SIZE.observe(staged.size)
+    return staged
+
+
+async def reference_count(session: AsyncSession, document_url: str) -> int:
+    statement = select(func.count()).where(SupportingDocuments.document_url == document_url)
+    return (await session.execute(statement)).scalar_one()
+
+
+def _remove_unreferenced(path: str) -> bool:
+    try:
+        if _CONTENT_NAME.match(os.path.basename(path)):
+            if time.time() - os.path.getmtime(path) < ORPHAN_GRACE_SECONDS:
+                return False
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logging.warning(f"Could not remove document {path}: {e}")
+        return False
+
+
+async def release(session: AsyncSession, document_url: Optional[str]) -> bool:
+    """Delete the file behind ``document_url`` once no row references it.
+
+    Call after the transaction that removed a reference has committed: the
+    count runs in a fresh transaction (the session's current one is rolled
+    back, so it sees every row committed so far, whatever the isolation
+    level). Returns True if the file was removed.
+    """
+    if not document_url:
+        return False
+    async with storage_lock():
+        # Counted under the lock, so an upload of the same content either
+        # committed its row first or moves its own copy back in afterwards
+        await session.rollback()
+        if await reference_count(session, document_url):
+            return False
+        return await asyncio.to_thread(_remove_unreferenced, physical_path(document_url))
+
+
+def _sweep_candidates() -> tuple[list[str], list[str]]:
+    """Remove stale temp files; list content files (runs in a thread)."""
+    removed, candidates = [], []
+    for root, _dirs, files in os.walk(MEDIA_DIR):
+        if root == MEDIA_DIR:
+            # Legacy flat files are left alone; temp files from a crashed
+            # worker are removed once nothing could still be writing them
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if name.startswith(".upload-") and time.time() - os.path.getmtime(path) > ORPHAN_GRACE_SECONDS:
+                        os.remove(path)
+                        removed.append(name)
+                except FileNotFoundError:
+                    pass
+            continue
+        candidates.extend(name for name in files if _CONTENT_NAME.match(name))
+    return removed, candidates
+
+
+async def sweep_orphans(session: AsyncSession) -> list[str]:
+    """Remove unreferenced content files and stale temp files (past the grace period)."""
+    removed, candidates = await asyncio.to_thread(_sweep_candidates)
+    for name in candidates:
+        if await release(session, f"{MEDIA_DIR}/{name}"):
+            removed.append(name)
+    return removed
+
+
+if __name__ == "__main__":
+    from config import async_engine, async_session
+
+    async def main():
+        async with async_session() as session:
+            removed = await sweep_orphans(session)
+        await async_engine.dispose()
+        print(f"[documents] removed {len(removed)} unreferenced files")
+
+    asyncio.run(main())
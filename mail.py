@@ -1,32 +1,273 @@
-from fastapi_mail import FastMail, ConnectionConfig, MessageSchema, MessageType
-from config import EMAIL_USERNAME, EMAIL_PASSWORD, EMAIL_FROM
+"""Outbound mail: a bounded in-process queue drained by pooled SMTP workers.
+
+Handlers call ``create_message`` which only enqueues, so request latency no
+longer includes an SMTP handshake and a failed send can't fail a request whose
+transaction already committed. Each worker keeps one authenticated SMTP
+connection open and reuses it; sends are retried with exponential backoff and
+a shared circuit breaker stops hammering the server while it is down. The
+lifespan hook in server.py drains the queue on shutdown.
+"""
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from email.message import EmailMessage
+from email.utils import formataddr, formatdate, make_msgid
 from pathlib import Path
+from typing import Optional
+
+import aiosmtplib
+
+from config import (
+    EMAIL_USERNAME,
+    EMAIL_PASSWORD,
+    EMAIL_FROM,
+    MAIL_SERVER,
+    MAIL_PORT,
+    MAIL_STARTTLS,
+    MAIL_SSL_TLS,
+    MAIL_USE_CREDENTIALS,
+    MAIL_VALIDATE_CERTS,
+    MAIL_WORKERS,
+    MAIL_QUEUE_SIZE,
+    MAIL_MAX_RETRIES,
+)
+from metrics import SMTP_LATENCY
 
 BASE_DIR = Path(__file__).resolve().parent
 
+# Close a pooled connection after this long without traffic (servers drop
+# idle sessions anyway; reconnecting lazily is cheaper than a failed send).
+IDLE_DISCONNECT_SECONDS = 120
+RETRY_BASE_DELAY_SECONDS = 1.0
+RETRY_MAX_DELAY_SECONDS = 60.0
 
-mail_config = ConnectionConfig(
-    MAIL_USERNAME=EMAIL_USERNAME or "",
-    MAIL_PASSWORD=EMAIL_PASSWORD,  # type: ignore
-    MAIL_FROM=EMAIL_USERNAME,  # type: ignore
-    MAIL_PORT=587,
-    MAIL_SERVER="smtp.gmail.com",
-    MAIL_FROM_NAME=EMAIL_FROM,
-    MAIL_STARTTLS=True,
-    MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-)
+
+class MailQueueFull(Exception):
+    """Raised when the dispatcher queue is at MAIL_QUEUE_SIZE."""
+
+
+@dataclass
+class OutgoingMail:
+    recipients: list[str]
+    subject: str
+    body: str
+    attempts: int = 0
 
 
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures for ``reset_after`` seconds."""
 
-mail = FastMail(config=mail_config)
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
 
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
 
-def create_message(recipients: list[str], subject: str, body: str):
+    def retry_in(self) -> float:
+        """Seconds until a trial send is allowed (0 when closed or half-open)."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_after - (time.monotonic() - self.opened_at))
 
-    message = MessageSchema(
-        recipients=recipients, subject=subject, body=body, subtype=MessageType.html  # type: ignore[arg-type]  # fastapi-mail types recipients as List[NameEmail]; str is accepted at runtime
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold or self.opened_at is not None:
+            # A failed half-open trial re-opens the breaker for a full period
+            self.opened_at = time.monotonic()
+
+
+def build_message(recipients: list[str], subject: str, body: str) -> EmailMessage:
+    message = EmailMessage()
+    # Display name is EMAIL_FROM, envelope address the authenticated account
+    message["From"] = (
+        formataddr((EMAIL_FROM or "", EMAIL_USERNAME)) if EMAIL_USERNAME else EMAIL_FROM or ""
     )
+    message["To"] = ", ".join(recipients)
+    message["Subject"] = subject
+    message["Date"] = formatdate(localtime=True)
+    message["Message-ID"] = make_msgid()
+    message.set_content(body, subtype="html")
+    return message
+
+
+class MailDispatcher:
+    def __init__(self, workers: int, queue_size: int, max_retries: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def _new_client(self) -> aiosmtplib.SMTP:
+        return aiosmtplib.SMTP(
+            hostname=MAIL_SERVER,
+            port=MAIL_PORT,
+            username=EMAIL_USERNAME if MAIL_USE_CREDENTIALS else None,
+            password=EMAIL_PASSWORD if MAIL_USE_CREDENTIALS else None,
+            use_tls=MAIL_SSL_TLS,
+            start_tls=MAIL_STARTTLS,
+            validate_certs=MAIL_VALIDATE_CERTS,
+            timeout=30,
+        )
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def _spawn_workers(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f"mail-worker-{n}")
+            for n in range(self.workers)
+        ]
+
+    async def start(self) -> None:
+        if not self.running:
+            self._spawn_workers()
+
+    def submit(self, recipients: list[str], subject: str, body: str) -> None:
+        """Queue a message for delivery; raises MailQueueFull when saturated."""
+        if not self.running:
+            # Scripts and tests may send without going through the lifespan hook
+            self._spawn_workers()
+        assert self._queue is not None
+        try:
+            self._queue.put_nowait(OutgoingMail(list(recipients), subject, body))
+        except asyncio.QueueFull:
+            raise MailQueueFull(f"mail queue is full ({self.queue_size} messages)")
+
+    async def drain(self, timeout: float) -> None:
+        """Deliver what is queued (bounded by ``timeout``), then stop the workers."""
+        if self._queue is not None and self.running:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logging.warning(
+                    f"Mail drain timed out with {self._queue.qsize()} message(s) still queued"
+                )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "breaker": self.breaker.state,
+        }
+
+    async def _worker(self, n: int) -> None:
+        queue = self._queue
+        assert queue is not None
+        client = self._new_client()
+        try:
+            while True:
+                try:
+                    mail = await asyncio.wait_for(
+                        queue.get(), timeout=IDLE_DISCONNECT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    await self._disconnect(client)
+                    continue
+                try:
+                    await self._deliver(client, mail)
+                except Exception as e:
+                    # A message that cannot even be built (bad header, bad
+                    # address) must not take its worker down with it
+                    self.failed += 1
+                    logging.error(f"Dropping mail to {mail.recipients}: {e!r}")
+                finally:
+                    queue.task_done()
+        finally:
+            await self._disconnect(client)
+
+    async def _deliver(self, client: aiosmtplib.SMTP, mail: OutgoingMail) -> None:
+        message = build_message(mail.recipients, mail.subject, mail.body)
+        while True:
+            wait = self.breaker.retry_in()
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                await self._send(client, message)
+                self.breaker.record_success()
+                self.sent += 1
+                return
+            except Exception as e:
+                self.breaker.record_failure()
+                await self._disconnect(client)
+                mail.attempts += 1
+                if mail.attempts > self.max_retries:
+                    self.failed += 1
+                    logging.error(
+                        f"Giving up on mail to {mail.recipients} after {mail.attempts} attempts: {e}"
+                    )
+                    return
+                self.retried += 1
+                delay = min(
+                    RETRY_MAX_DELAY_SECONDS,
+                    RETRY_BASE_DELAY_SECONDS * 2 ** (mail.attempts - 1),
+                )
+                logging.warning(f"Mail send failed ({e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def _send(self, client: aiosmtplib.SMTP, message: EmailMessage) -> None:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            await self._send_once(client, message)
+            outcome = "sent"
+        finally:
+            SMTP_LATENCY.observe(time.perf_counter() - started, outcome)
+
+    async def _send_once(self, client: aiosmtplib.SMTP, message: EmailMessage) -> None:
+        if not client.is_connected:
+            await client.connect()
+        try:
+            await client.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # The pooled session went stale between sends; one fresh attempt
+            await self._disconnect(client)
+            await client.connect()
+            await client.send_message(message)
+
+    @staticmethod
+    async def _disconnect(client: aiosmtplib.SMTP) -> None:
+        if not client.is_connected:
+            return
+        try:
+            await client.quit()
+        except Exception:
+            client.close()
+
+
+mail_dispatcher = MailDispatcher(
+    workers=MAIL_WORKERS, queue_size=MAIL_QUEUE_SIZE, max_retries=MAIL_MAX_RETRIES
+)
+
 
-    return mail.send_message(message=message)
+async def create_message(recipients: list[str], subject: str, body: str):
+    """Queue an HTML mail for background delivery (see MailDispatcher)."""
+    mail_dispatcher.submit(recipients, subject, body)
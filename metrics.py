@@ -0,0 +1,376 @@
+"""Prometheus text-format metrics, aggregated across uvicorn workers.
+
+Counters and histograms are plain dicts keyed by label tuples, so
+recording a value costs a dict lookup and, for histograms, a bisect.
+Every METRICS_FLUSH_SECONDS each worker writes a snapshot of its series
+to ``METRICS_DIR/<pid>-<start time>.json`` (a worker that reuses an
+exited one's pid gets its own file, never overwriting those totals); a
+scrape of /api/metrics, served by
+whichever worker gets it, merges its own live series with the other
+workers' latest snapshots (so they lag by at most one flush):
+
+* counters and histograms are summed over every snapshot, including
+  exited workers, so totals never go backwards while the container runs
+* gauges are summed over workers that are still alive (for a pid with
+  several files, only the latest start counts)
+
+Updates from threads are not locked; the few made off the event loop
+(e.g. Redis calls from a job thread) may rarely lose an increment.
+"""
+import asyncio
+import glob
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event
+
+from config import METRICS_DIR, METRICS_FLUSH_SECONDS
+from serialization import dumps, loads
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (16e3, 64e3, 256e3, 1e6, 2e6, 5e6, 10e6)
+
+_registry: dict[str, "_Metric"] = {}
+_started = time.time_ns()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        if name in _registry:
+            raise ValueError(f"Metric {name} is already registered")
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._series: dict = {}
+        _registry[name] = self
+
+    def snapshot(self) -> list:
+        return [[list(labels), value] for labels, value in self._series.items()]
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        series = self._series
+        series[labels] = series.get(labels, 0) + amount
+
+    def merge(self, snapshots: list[list]) -> dict:
+        merged: dict = {}
+        for series in snapshots:
+            for labels, value in series:
+                key = tuple(labels)
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def render(self, merged: dict) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in sorted(merged.items())
+        ]
+
+
+class Gauge(Counter):
+    """Sampled at snapshot time from a callback returning {labels: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._callbacks: list[Callable[[], dict]] = []
+
+    def set_function(self, callback: Callable[[], dict]) -> None:
+        self._callbacks.append(callback)
+
+    def snapshot(self) -> list:
+        series: dict = {}
+        for callback in self._callbacks:
+            try:
+                series.update(callback())
+            except Exception as e:
+                logging.warning(f"Gauge {self.name} callback failed: {e}")
+        return [[list(labels), value] for labels, value in series.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        # Per series: one count per bucket (plus +Inf), then the sum
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def merge(self, snapshots: list[list]) -> dict:
+        merged: dict = {}
+        for series in snapshots:
+            for labels, values in series:
+                key = tuple(labels)
+                total = merged.get(key)
+                if total is None:
+                    merged[key] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        total[i] += value
+        return merged
+
+    def render(self, merged: dict) -> list[str]:
+        lines = []
+        for labels, values in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), values):
+                cumulative += count
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+# --- Snapshots shared between workers ---
+
+def snapshot() -> dict:
+    return {
+        "pid": os.getpid(),
+        "started": _started,
+        "metrics": {name: metric.snapshot() for name, metric in _registry.items()},
+    }
+
+
+def flush() -> None:
+    """Publish this worker's series for the other workers' scrapes."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}-{_started}.json")
+    temp = f"{path}.tmp"
+    with open(temp, "wb") as f:
+        f.write(dumps(snapshot()))
+    os.replace(temp, path)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _other_snapshots() -> list[dict]:
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            with open(path, "rb") as f:
+                data = loads(f.read())
+        except (OSError, ValueError):
+            continue  # being replaced, or a partial write from a crash
+        if (data.get("pid"), data.get("started")) != (os.getpid(), _started):
+            snapshots.append(data)
+    return snapshots
+
+
+def render() -> str:
+    snapshots = [snapshot(), *_other_snapshots()]
+    # A live pid may be a new worker that took an exited one's pid
+    latest: dict[int, int] = {}
+    for data in snapshots:
+        latest[data["pid"]] = max(latest.get(data["pid"], 0), data.get("started", 0))
+    live = [snapshots[0]] + [
+        data for data in snapshots[1:]
+        if data.get("started", 0) == latest[data["pid"]] and _alive(data["pid"])
+    ]
+    lines = []
+    for name, metric in _registry.items():
+        series = [
+            data["metrics"].get(name, [])
+            for data in (live if isinstance(metric, Gauge) else snapshots)
+        ]
+        lines.extend(metric.header())
+        lines.extend(metric.render(metric.merge(series)))
+    return "\n".join(lines) + "\n"
+
+
+async def flush_periodically() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(flush)
+        except Exception as e:
+            logging.warning(f"Failed to flush metrics: {e}")
+        await asyncio.sleep(METRICS_FLUSH_SECONDS)
+
+
+# --- Instrumented resources ---
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+)
+DB_POOL = Gauge(
+    "db_pool_connections", "Pooled DB connections by engine and state.", ("engine", "state")
+)
+DB_POOL_HELD = Histogram(
+    "db_pool_checkout_duration_seconds",
+    "Time a pooled DB connection stays checked out.",
+    ("engine",),
+)
+DB_POOL_EVENTS = Counter(
+    "db_pool_events_total", "Pool checkouts and new DB connections by engine.", ("engine", "event")
+)
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds", "Redis command latency.", ("command",)
+)
+REDIS_ERRORS = Counter("redis_command_errors_total", "Failed Redis commands.", ("command",))
+SMTP_LATENCY = Histogram("smtp_send_duration_seconds", "SMTP send latency by outcome.", ("outcome",))
+UPLOAD_BYTES = Counter("upload_bytes_total", "Bytes of staged document uploads.")
+UPLOAD_LATENCY = Histogram(
+    "upload_duration_seconds", "Time to stage an upload by outcome.", ("outcome",)
+)
+UPLOAD_SIZE = Histogram("upload_size_bytes", "Size of staged uploads.", buckets=SIZE_BUCKETS)
+OTP_SENT = Counter("otp_sent_total", "OTPs generated and stored.")
+OTP_VERIFY = Counter("otp_verify_total", "OTP verification attempts by result.", ("result",))
+
+
+def instrument_engine(engine, label: str) -> None:
+    """Pool gauges, checkout counts and hold times for a (sync or async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    def pool_state() -> dict:
+        pool = sync_engine.pool
+        if not hasattr(pool, "checkedout"):
+            return {}
+        state = {
+            (label, "checked_out"): pool.checkedout(),
+            (label, "idle"): pool.checkedin(),
+        }
+        if hasattr(pool, "overflow"):
+            state[(label, "overflow")] = max(0, pool.overflow())
+            state[(label, "size")] = pool.size()
+        return state
+
+    DB_POOL.set_function(pool_state)
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, record):
+        DB_POOL_EVENTS.inc(label, "connect")
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection, record, proxy):
+        DB_POOL_EVENTS.inc(label, "checkout")
+        record.info["metrics_checked_out"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_connection, record):
+        started = record.info.pop("metrics_checked_out", None)
+        if started is not None:
+            DB_POOL_HELD.observe(time.perf_counter() - started, label)
+
+
+def instrument_redis(client) -> None:
+    execute = client.execute_command
+
+    def timed_execute(*args, **options):
+        command = str(args[0]).upper() if args else "?"
+        started = time.perf_counter()
+        try:
+            return execute(*args, **options)
+        except Exception:
+            REDIS_ERRORS.inc(command)
+            raise
+        finally:
+            REDIS_LATENCY.observe(time.perf_counter() - started, command)
+
+    client.execute_command = timed_execute
+
+
+def route_template(scope) -> str:
+    """The matched path with parameter values put back as ``{name}``.
+
+    Rebuilt from the request path rather than read off the route, whose
+    ``path`` omits include_router prefixes in some FastAPI versions.
+    """
+    if scope.get("route") is None and not scope.get("endpoint"):
+        return "unmatched"
+    path = scope["path"]
+    params = scope.get("path_params")
+    if not params:
+        return path
+    segments = path.split("/")
+    for name, value in params.items():
+        value = str(value)
+        if "/" in value or not value:
+            # A {name:path} parameter swallows the rest of the path
+            if path.endswith(value):
+                return "/".join(segments)[: len(path) - len(value)] + f"{{{name}}}"
+            continue
+        segments = [f"{{{name}}}" if segment == value else segment for segment in segments]
+    return "/".join(segments)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency and status counts.
+
+    Routes are labelled by their template (``/api/application/{application_id}``),
+    so ids never become label values; unmatched paths share one label.
+    """
+
+    def __init__(self, app, skip_paths: tuple = ("/api/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            template = route_template(scope)
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, template, status)
+            HTTP_LATENCY.observe(elapsed, method, template)
+
+
+def authorized(authorization: Optional[str], token: str) -> bool:
+    return not token or authorization == f"Bearer {token}"
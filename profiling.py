@@ -0,0 +1,228 @@
+"""Opt-in sampling profiler for slow requests.
+
+While a request is in flight, a background thread snapshots every
+thread's Python stack each PROFILE_INTERVAL_MS. If the request turns out
+slower than PROFILE_SLOW_MS, or was picked by PROFILE_SAMPLE_RATE, its
+samples are saved to PROFILE_DIR in folded-stack format (``a;b;c 12``),
+which flamegraph.pl and speedscope read directly. Only the newest
+PROFILE_MAX_FILES profiles are kept, across all workers.
+
+Samples show what the whole worker was doing during the request, so a
+slow request also shows the bcrypt hash or serialization of a concurrent
+one that held the event loop. Time awaiting the DB, SMTP or Redis shows
+up on MainThread as the loop's ``select``. Idle pool threads are left out.
+
+cProfile is not used: it traces one thread at a time, cannot tell
+concurrent requests apart and slows every call it sees.
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from config import (
+    PROFILE_DIR,
+    PROFILE_INTERVAL_MS,
+    PROFILE_MAX_FILES,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_SLOW_MS,
+)
+from metrics import route_template
+
+# <UTC time>-<ms>ms-<method>-<route>-<pid>-<slow|sampled>.folded
+_NAME = re.compile(
+    r"^(?P<at>\d{8}T\d{6}\.\d{3})-(?P<ms>\d+)ms-(?P<method>[A-Z]+)-(?P<route>[\w.-]*)"
+    r"-(?P<pid>\d+)-(?P<reason>slow|sampled)\.folded$"
+)
+# Leaf frames of pool threads waiting for work
+_IDLE = ("threading.py", "queue.py", "thread.py")
+
+
+class Capture:
+    __slots__ = ("samples", "count")
+
+    def __init__(self):
+        self.samples: dict[str, int] = {}
+        self.count = 0
+
+
+class StackSampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._active: set[Capture] = set()
+        self._lock = threading.Lock()
+        self._busy = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: dict = {}
+
+    def begin(self) -> Capture:
+        capture = Capture()
+        with self._lock:
+            self._active.add(capture)
+            self._busy.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return capture
+
+    def end(self, capture: Capture) -> None:
+        with self._lock:
+            self._active.discard(capture)
+            if not self._active:
+                self._busy.clear()
+
+    def _run(self) -> None:
+        while True:
+            self._busy.wait()
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            stacks = self.sample()
+            # Under the lock, so a capture is complete once end() returns
+            with self._lock:
+                for capture in self._active:
+                    capture.count += 1
+                    samples = capture.samples
+                    for stack in stacks:
+                        samples[stack] = samples.get(stack, 0) + 1
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            path = code.co_filename.replace("\\", "/").split("/")
+            label = self._labels[code] = f"{'/'.join(path[-2:])}:{code.co_qualname}"
+        return label
+
+    def sample(self) -> list[str]:
+        """One folded stack per busy thread, root first."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        me = threading.get_ident()
+        main = threading.main_thread().ident
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if ident != main and frame.f_code.co_filename.endswith(_IDLE):
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(self._label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(ident, str(ident)))
+            stacks.append(";".join(reversed(labels)))
+        return stacks
+
+
+class ProfileStore:
+    def __init__(self, directory: str, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+
+    def save(self, capture: Capture, method: str, route: str, elapsed: float, reason: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        at = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%f")[:-3]
+        slug = re.sub(r"[^\w.-]+", "_", route).strip("_")
+        name = f"{at}-{int(elapsed * 1000)}ms-{method}-{slug}-{os.getpid()}-{reason}.folded"
+        path = os.path.join(self.directory, name)
+        temp = f"{path}.tmp"
+        with open(temp, "w") as f:
+            for stack, count in sorted(capture.samples.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+        os.replace(temp, path)
+        self.rotate()
+        return name
+
+    def rotate(self) -> None:
+        names = sorted(name for name in os.listdir(self.directory) if _NAME.match(name))
+        for name in names[: max(0, len(names) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass  # another worker rotated it first
+
+    def entries(self) -> list[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            match = _NAME.match(name)
+            if not match:
+                continue
+            try:
+                size = os.path.getsize(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            profiles.append({
+                "name": name,
+                "captured_at": datetime.strptime(match["at"], "%Y%m%dT%H%M%S.%f")
+                .replace(tzinfo=timezone.utc).isoformat(),
+                "duration_ms": int(match["ms"]),
+                "method": match["method"],
+                "route": match["route"],
+                "pid": int(match["pid"]),
+                "reason": match["reason"],
+                "size_bytes": size,
+            })
+        return profiles
+
+    def path(self, name: str) -> Optional[str]:
+        """Path of a captured profile, or None for any other name."""
+        if not _NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that keeps the profiles of slow or sampled requests."""
+
+    def __init__(
+        self,
+        app,
+        slow_ms: int = PROFILE_SLOW_MS,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        sampler: Optional[StackSampler] = None,
+        store: Optional[ProfileStore] = None,
+    ):
+        self.app = app
+        self.slow = slow_ms / 1000 if slow_ms > 0 else None
+        self.sample_rate = sample_rate
+        self.sampler = sampler or stack_sampler
+        self.store = store or profile_store
+
+    async def __call__(self, scope, receive, send):
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if scope["type"] != "http" or not (sampled or self.slow):
+            await self.app(scope, receive, send)
+            return
+        capture = self.sampler.begin()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.sampler.end(capture)
+            slow = self.slow is not None and elapsed >= self.slow
+            if (slow or sampled) and capture.count:
+                try:
+                    # The response has been sent; only this task waits for the write
+                    await asyncio.to_thread(
+                        self.store.save, capture, scope["method"], route_template(scope),
+                        elapsed, "slow" if slow else "sampled",
+                    )
+                except Exception as e:
+                    logging.warning(f"Failed to save request profile: {e}")
+
+
+def enabled() -> bool:
+    return PROFILE_SLOW_MS > 0 or PROFILE_SAMPLE_RATE > 0
+
+
+stack_sampler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+profile_store = ProfileStore(PROFILE_DIR, PROFILE_MAX_FILES)
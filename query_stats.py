@@ -0,0 +1,136 @@
+"""Per-request SQL query counts, DB time and N+1 warnings.
+
+``instrument(engine)`` hooks the engine's cursor events; every statement
+run while a request (or a ``count_queries()`` block) is being tracked is
+counted against it, whichever engine, thread or greenlet runs it. The
+tracked request's response carries, outside production:
+
+    Server-Timing: db;dur=3.12;desc="4 queries", app;dur=11.70
+
+The same statement text (parameters aside) run QUERY_REPEAT_THRESHOLD
+times or more in one request is logged as a likely N+1 pattern.
+
+Tests and check scripts bound a block's queries with ``max_queries``:
+
+    with max_queries(4):
+        await client.get(f"/api/application/{id}")
+"""
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from config import QUERY_REPEAT_THRESHOLD
+from metrics import route_template
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+
+class QueryStats:
+    __slots__ = ("count", "duration", "statements", "parent")
+
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        # Enclosing blocks (e.g. a test's max_queries around a request) count too
+        self.parent = parent
+        self.count = 0
+        self.duration = 0.0
+        self.statements: dict[str, int] = {}
+
+    def repeated(self, threshold: int = QUERY_REPEAT_THRESHOLD) -> list[tuple[str, int]]:
+        """Statements run at least ``threshold`` times, most repeated first."""
+        return sorted(
+            ((sql, n) for sql, n in self.statements.items() if n >= threshold),
+            key=lambda item: -item[1],
+        )
+
+    def server_timing(self, elapsed: float) -> str:
+        return (
+            f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries", '
+            f"app;dur={elapsed * 1000:.2f}"
+        )
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    started = conn.info.get("query_started")
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    while stats is not None:
+        stats.duration += elapsed
+        stats.count += 1
+        stats.statements[statement] = stats.statements.get(statement, 0) + 1
+        stats = stats.parent
+
+
+def instrument(engine) -> None:
+    """Count the (sync or async) engine's statements against the tracked request."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_execute)
+
+
+@contextmanager
+def count_queries():
+    """Track the statements run inside the block (including awaited ones)."""
+    stats = QueryStats(_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def max_queries(limit: int):
+    """Fail the block if it runs more than ``limit`` statements."""
+    with count_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        statements = "\n".join(f"  {n}x {_compact(sql)}" for sql, n in stats.repeated(1))
+        raise QueryBudgetExceeded(f"{stats.count} queries, budget {limit}:\n{statements}")
+
+
+def _compact(sql: str, limit: int = 200) -> str:
+    sql = re.sub(r"\s+", " ", sql).strip()
+    return sql if len(sql) <= limit else sql[: limit - 3] + "..."
+
+
+class QueryStatsMiddleware:
+    """Pure ASGI middleware: tracks each request and reports its queries."""
+
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and self.server_timing:
+                timing = stats.server_timing(time.perf_counter() - started)
+                message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode())]
+            await send(message)
+
+        with count_queries() as stats:
+            await self.app(scope, receive, send_wrapper)
+        for sql, n in stats.repeated():
+            logging.warning(
+                f"Possible N+1 in {scope['method']} {route_template(scope)}: {n}x {_compact(sql)}"
+            )
@@ -0,0 +1,164 @@
+"""Periodic background jobs, each run by one worker per interval.
+
+Every uvicorn worker starts the same scheduler from the lifespan hook.
+Before a run, a worker takes the job's lease: ``SET NX PX`` in Redis, or
+the same check-and-set under the shared fallback store's lock without
+it. The lease lasts ``interval * (1 - jitter)``, so only one worker runs
+a job per interval and whichever worker next finds the lease expired
+runs it after that. Leases are not released early; a run that outlasts
+its lease may overlap the next one, so keep jobs shorter than that.
+
+Coroutine jobs run on the event loop; plain functions run on a small
+thread pool so blocking work never stalls request handling. Taking a
+lease and recording an outcome block too (a Redis round trip, or waiting
+on the fallback store's flock), so they run on the default executor. Each job
+keeps per-worker counters, and the worker that ran it last records the
+outcome in the shared store for ``stats()``.
+"""
+import asyncio
+import inspect
+import json
+import logging
+import os
+import random
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from auth.utils import fallback_store, kv_store, redis_client, use_redis
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable
+    interval: float
+    jitter: float = 0.1
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    last_started: Optional[datetime] = None
+    last_duration: Optional[float] = None
+    last_error: Optional[str] = None
+
+    @property
+    def lease(self) -> float:
+        return self.interval * (1 - self.jitter)
+
+    def next_delay(self) -> float:
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class Scheduler:
+    def __init__(self, threads: int = 2):
+        self._jobs: dict[str, Job] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._threads = threads
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def register(self, name: str, func: Callable, interval: float, jitter: float = 0.1) -> Job:
+        """Run ``func`` every ``interval`` seconds (± ``jitter`` as a fraction)."""
+        if name in self._jobs:
+            raise ValueError(f"Job {name!r} is already registered")
+        if interval <= 0 or not 0 <= jitter < 1:
+            raise ValueError("interval must be positive and jitter in [0, 1)")
+        job = self._jobs[name] = Job(name=name, func=func, interval=interval, jitter=jitter)
+        return job
+
+    async def start(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=self._threads, thread_name_prefix="scheduler")
+        self._tasks = [asyncio.create_task(self._loop(job)) for job in self._jobs.values()]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _loop(self, job: Job) -> None:
+        # Spread the workers' first attempts; one of them takes the lease
+        await asyncio.sleep(random.uniform(0, job.interval * job.jitter))
+        while True:
+            # Redis calls and the fallback store's flock both block; keep
+            # them off the event loop
+            if await asyncio.to_thread(self._acquire, job):
+                await self.run(job)
+            else:
+                job.skipped += 1
+            await asyncio.sleep(job.next_delay())
+
+    def _acquire(self, job: Job) -> bool:
+        key = f"job:{job.name}:lease"
+        if use_redis:
+            try:
+                return bool(redis_client.set(key, self._owner, nx=True, px=int(job.lease * 1000)))
+            except Exception as e:
+                logging.warning(f"Redis job lease unavailable, using the shared store: {e}")
+        with fallback_store.locked():
+            if fallback_store.get(key) is not None:
+                return False
+            fallback_store.setex(key, job.lease, self._owner)
+            return True
+
+    async def run(self, job: Job) -> None:
+        """Run ``job`` once on this worker, lease or not."""
+        job.last_started = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(job.func):
+                await job.func()
+            else:
+                await asyncio.get_running_loop().run_in_executor(self._executor, job.func)
+            job.last_error = None
+            job.runs += 1
+        except Exception as e:
+            job.failures += 1
+            job.last_error = f"{type(e).__name__}: {e}"
+            logging.warning(f"Scheduled job {job.name} failed: {job.last_error}")
+        finally:
+            job.last_duration = time.perf_counter() - started
+            await asyncio.to_thread(self._record, job)
+
+    def _record(self, job: Job) -> None:
+        outcome = {
+            "worker": self._owner,
+            "started_at": job.last_started.isoformat(),
+            "duration_ms": round(job.last_duration * 1000, 3),
+            "error": job.last_error,
+        }
+        try:
+            kv_store.setex(f"job:{job.name}:last", int(job.interval * 3) + 60, json.dumps(outcome))
+        except Exception as e:
+            logging.warning(f"Failed to record outcome of job {job.name}: {e}")
+
+    def stats(self) -> dict:
+        jobs = {}
+        for job in self._jobs.values():
+            try:
+                last = kv_store.get(f"job:{job.name}:last")
+            except Exception:
+                last = None
+            jobs[job.name] = {
+                "interval_seconds": job.interval,
+                "jitter": job.jitter,
+                # Counters are this worker's; last_run is whichever worker ran it
+                "runs": job.runs,
+                "failures": job.failures,
+                "skipped": job.skipped,
+                "last_duration_ms": (
+                    round(job.last_duration * 1000, 3) if job.last_duration is not None else None
+                ),
+                "last_error": job.last_error,
+                "last_run": json.loads(last) if last else None,
+            }
+        return {"worker": self._owner, "jobs": jobs}
+
+
+scheduler = Scheduler()
@@ -3,6 +3,8 @@
 Usage (inside the container):
     docker compose exec web python seed.py
 
+Applies pending schema migrations (db/migrations.py) first.
+
 Idempotent: skips roles that already have a user. Emails/names come from
 environment variables (set them in .env):
     SEED_ADMIN_EMAIL / SEED_ADMIN_USERNAME
@@ -15,7 +17,8 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from config import engine
-from db.models import Base, User
+from db.migrations import run_migrations
+from db.models import User
 
 SEED_ROLES = [
     ("system_admin", "SEED_ADMIN_EMAIL", "SEED_ADMIN_USERNAME"),
@@ -26,7 +29,8 @@ DEFAULT_DEPARTMENT = "System"
 
 
 def seed() -> None:
-    Base.metadata.create_all(engine)
+    for migration_id in run_migrations(engine):
+        print(f"[seed] Applied migration {migration_id}")
     with Session(engine) as session:
         for role, email_var, username_var in SEED_ROLES:
             existing = session.scalars(
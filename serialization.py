@@ -0,0 +1,141 @@
+"""JSON responses and precompiled model serializers shared by every router.
+
+``JSONResponse`` is a drop-in for fastapi.responses.JSONResponse that encodes
+with orjson when it is installed (UUID, datetime, date and Enum values are
+handled natively) and falls back to the stdlib encoder with the same output.
+Handlers can therefore put UUIDs and datetimes straight into the payload
+instead of converting every value in a Python loop.
+
+``ModelSerializer`` resolves a model's column attributes once, at import
+time, and turns instances into plain dicts with a single itemgetter call.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from operator import attrgetter, itemgetter
+from typing import Any, Iterable, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import inspect as sa_inspect
+from starlette.responses import JSONResponse as _StarletteJSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=_default,
+    ).encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class JSONResponse(_StarletteJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _converter(python_type):
+    """Stdlib-fallback conversion for a column's Python type (None: as is)."""
+    if python_type is None:
+        return None
+    if issubclass(python_type, UUID):
+        return str
+    if issubclass(python_type, (datetime, date, time)):
+        return python_type.isoformat
+    if issubclass(python_type, Enum):
+        return attrgetter("value")
+    return None
+
+
+def _python_type(column_attr):
+    try:
+        return column_attr.columns[0].type.python_type
+    except NotImplementedError:
+        return None
+
+
+class ModelSerializer:
+    """Plain-dict view of a model's columns, e.g. ``ModelSerializer(User)(user)``.
+
+    Loaded column values are read straight from the instance ``__dict__``
+    (no descriptor per attribute); unloaded ones fall back to normal
+    attribute access. Without orjson, values are converted by column type
+    with converters picked here rather than type-checked per value.
+    """
+
+    def __init__(
+        self,
+        model,
+        include: Optional[Sequence[str]] = None,
+        exclude: Iterable[str] = (),
+        rename: Optional[dict] = None,
+    ):
+        excluded = set(exclude)
+        attrs = [
+            attr
+            for attr in sa_inspect(model).column_attrs
+            if attr.key not in excluded and (include is None or attr.key in include)
+        ]
+        if include is not None:
+            attrs.sort(key=lambda attr: list(include).index(attr.key))
+        keys = [attr.key for attr in attrs]
+        rename = rename or {}
+        self.fields = tuple(rename.get(key, key) for key in keys)
+        self._from_dict = itemgetter(*keys)
+        self._from_attrs = attrgetter(*keys)
+        self._single = len(keys) == 1
+        self._converters = tuple(_converter(_python_type(attr)) for attr in attrs)
+
+    def _values(self, obj) -> tuple:
+        try:
+            values = self._from_dict(obj.__dict__)
+        except KeyError:
+            values = self._from_attrs(obj)  # expired or deferred column
+        # itemgetter/attrgetter with one name return the bare value
+        return (values,) if self._single else values
+
+    def _convert(self, values: tuple) -> list:
+        return [
+            value if convert is None or value is None else convert(value)
+            for convert, value in zip(self._converters, values)
+        ]
+
+    def __call__(self, obj) -> dict:
+        values = self._values(obj)
+        if orjson is None:
+            values = self._convert(values)
+        return dict(zip(self.fields, values))
+
+    def many(self, objs: Iterable) -> list[dict]:
+        fields, get = self.fields, self._values
+        if orjson is None:
+            convert = self._convert
+            return [dict(zip(fields, convert(get(obj)))) for obj in objs]
+        return [dict(zip(fields, get(obj))) for obj in objs]
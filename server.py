@@ -1,37 +1,90 @@
-from fastapi import FastAPI, Cookie, HTTPException, Request, BackgroundTasks
+from fastapi import FastAPI, Cookie, Header, HTTPException, Request, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
 from auth.routes import authRouter
-from fastapi.responses import FileResponse
-from config import engine
-from db.models import Base, User, SupportingDocuments, Applications, UserRole, role_matches, normalize_role
+from fastapi.responses import FileResponse, PlainTextResponse, Response
+from config import engine, async_engine, async_session
+from db.models import Base, User, SupportingDocuments, UserRole, role_matches, normalize_role
 from sys_admin.routes import sys_admin_router
 from applications.routes import application_router, protectRoute
-from fastapi.responses import JSONResponse
+from applications.detail import document_access_query
+from serialization import JSONResponse
 from datetime import datetime, timezone
 from uuid import UUID
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 import os
 import asyncio
+from typing import Optional
 from auth.utils import cleanup_expired_data
+from auth.principal_cache import principal_cache
+from auth.utils import decode_document_token, redis_client, use_redis
+import jwt
 
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from config import CORS_ORIGINS, engine
+from config import (
+    CORS_ORIGINS,
+    engine,
+    MAIL_DRAIN_TIMEOUT_SECONDS,
+    JWT_SECRET,
+    JWT_ALGORITHM,
+    DOCUMENT_ACCEL_REDIRECT_PREFIX,
+    CLEANUP_INTERVAL_SECONDS,
+    MEDIA_SWEEP_INTERVAL_SECONDS,
+    METRICS_TOKEN,
+    PRODUCTION,
+    QUERY_STATS,
+)
+import metrics
+import profiling
+import query_stats
+from mail import mail_dispatcher
+from documents.storage import MEDIA_DIR, content_etag, physical_path, sweep_orphans
+from scheduler import scheduler
+from documents.responses import DocumentResponse
+
+async def sweep_media() -> None:
+    async with async_session() as session:
+        removed = await sweep_orphans(session)
+    if removed:
+        print(f"[documents] removed {len(removed)} unreferenced files")
+
+
+scheduler.register("cleanup_expired_data", cleanup_expired_data, interval=CLEANUP_INTERVAL_SECONDS)
+if MEDIA_SWEEP_INTERVAL_SECONDS > 0:
+    scheduler.register("sweep_media", sweep_media, interval=MEDIA_SWEEP_INTERVAL_SECONDS)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: start cleanup task
-    cleanup_task = asyncio.create_task(cleanup_background_task())
+    # Startup: start background jobs, mail workers and cross-worker cache invalidation
+    await scheduler.start()
+    metrics_task = asyncio.create_task(metrics.flush_periodically())
+    await mail_dispatcher.start()
+    principal_cache.start_listener()
     yield
-    # Shutdown: cancel cleanup task
-    cleanup_task.cancel()
+    # Shutdown: flush queued mail, then stop background jobs
+    principal_cache.stop_listener()
+    await mail_dispatcher.drain(timeout=MAIL_DRAIN_TIMEOUT_SECONDS)
+    await scheduler.stop()
+    metrics_task.cancel()
     try:
-        await cleanup_task
+        await metrics_task
     except asyncio.CancelledError:
         pass
+    metrics.flush()
+
+app = FastAPI(lifespan=lifespan, default_response_class=JSONResponse)
+
+
+@app.exception_handler(StaleDataError)
+async def concurrent_update(request: Request, exc: StaleDataError):
+    """Another request updated the application (and its version) first."""
+    return JSONResponse(
+        content={"message": "Application was changed by someone else, please reload"},
+        status_code=409,
+    )
 
-app = FastAPI(lifespan=lifespan)
 
 if CORS_ORIGINS:
     app.add_middleware(
@@ -46,57 +99,63 @@ if CORS_ORIGINS:
 async def no_store_api_cache(request: Request, call_next):
     """Prevent Cloudflare/browser caching of authenticated API responses."""
     response = await call_next(request)
-    if request.url.path.startswith("/api"):
+    # Responses that carry a validator set their own (revalidating) policy
+    if request.url.path.startswith("/api") and "etag" not in response.headers:
         response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
         response.headers["Pragma"] = "no-cache"
     return response
 
+if QUERY_STATS:
+    app.add_middleware(query_stats.QueryStatsMiddleware, server_timing=not PRODUCTION)
+    query_stats.instrument(engine)
+    query_stats.instrument(async_engine)
+if profiling.enabled():
+    app.add_middleware(profiling.ProfilingMiddleware)
+# Added last so it is outermost: latency covers the other middleware too
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(engine, "sync")
+metrics.instrument_engine(async_engine, "async")
+if use_redis:
+    metrics.instrument_redis(redis_client)
+
 Base.metadata.create_all(engine)
 
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok", "timestamp": datetime.now(timezone.utc).isoformat()}
 
-async def cleanup_background_task():
-    """Run cleanup task in the background every 5 minutes"""
-    while True:
-        try:
-            cleanup_expired_data()
-        except Exception as e:
-            print(f"Error in cleanup task: {str(e)}")
-        await asyncio.sleep(300)  # 5 minutes
 
+@app.get("/api/metrics")
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    if not metrics.authorized(authorization, METRICS_TOKEN):
+        return JSONResponse(content={"error": "invalid metrics token"}, status_code=401)
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 @app.get("/api/authenticate")
 async def authenticate(access_token: str = Cookie(None)):
-    user = protectRoute(access_token=access_token)
+    user = await protectRoute(access_token=access_token)
     if not isinstance(user, User):
         return JSONResponse(
             content={"error": "user is not authenticated"}, status_code=401
         )
-    user_response = dict(user.__dict__)
-    user_response.pop("_sa_instance_state", None)
-    for key, value in user_response.items():
-        if isinstance(value, UUID):
-            user_response[key] = str(value)
-        if isinstance(value, datetime):
-            user_response[key] = value.isoformat()
     return JSONResponse(
         content={
-            "email": user_response.get("tcet_email"),
-            "id": user_response.get("id"),
-            "username": user_response.get("username"),
-            "role": normalize_role(user_response.get("role") or ""),
-            "department": user_response.get("department"),
+            "email": user.tcet_email,
+            "id": user.id,
+            "username": user.username,
+            "role": normalize_role(user.role or ""),
+            "department": user.department,
         },
         status_code=200,
     )
 
 
 @app.post("/api/logout")
-def logout(access_token: str = Cookie(None)):
-    user = protectRoute(access_token=access_token)
+async def logout(access_token: str = Cookie(None)):
+    user = await protectRoute(access_token=access_token)
     if not isinstance(user, User):
         return JSONResponse(
             content={"error": "user is not authenticated"}, status_code=401
@@ -106,12 +165,9 @@ def logout(access_token: str = Cookie(None)):
     return response
 
 
-MEDIA_DIR = "media"
-
-
 @app.get("/api/documents/{filename}")
 async def get_document(filename: str, access_token: str = Cookie(None)):
-    user = protectRoute(access_token=access_token)
+    user = await protectRoute(access_token=access_token)
     if not isinstance(user, User):
         return JSONResponse(
             content={"error": "user is not authenticated"}, status_code=401
@@ -119,40 +175,73 @@ async def get_document(filename: str, access_token: str = Cookie(None)):
 
     safe_filename = os.path.basename(filename)
     media_root = os.path.abspath(MEDIA_DIR)
-    file_path = os.path.abspath(os.path.join(media_root, safe_filename))
+    file_path = os.path.abspath(physical_path(f"media/{safe_filename}"))
     if not safe_filename or os.path.commonpath([media_root, file_path]) != media_root:
         return JSONResponse(content={"error": "Forbidden"}, status_code=403)
 
-    # Authorization: only users linked to the application that owns the document
-    with Session(engine) as session:
-        statement = select(SupportingDocuments).where(
-            SupportingDocuments.document_url == f"media/{safe_filename}"
-        )
-        document = session.scalars(statement).first()
-        if not document:
-            raise HTTPException(status_code=404, detail="File not found")
-        statement = select(Applications).where(Applications.id == document.application_id)
-        application = session.scalars(statement).first()
-        if not application:
+    # Authorization: only users linked to an application that references the
+    # document. Deduplicated content is shared by every such application.
+    document_url = f"media/{safe_filename}"
+    async with async_session() as session:
+        statement = select(SupportingDocuments.id).where(
+            SupportingDocuments.document_url == document_url
+        ).limit(1)
+        if (await session.execute(statement)).first() is None:
             raise HTTPException(status_code=404, detail="File not found")
 
-        is_handler_or_creator = (
-            application.created_by_id == user.id
-            or application.current_handler_id == user.id
-        )
         role_override = role_matches(
             user.role, UserRole.SYSTEM_ADMIN, UserRole.PRINCIPAL, UserRole.CLERK
         )
-        if not (is_handler_or_creator or role_override):
-            return JSONResponse(
-                content={"error": "Forbidden"}, status_code=403
-            )
+        if not role_override:
+            statement = document_access_query(document_url, user)
+            if (await session.execute(statement)).first() is None:
+                return JSONResponse(
+                    content={"error": "Forbidden"}, status_code=403
+                )
 
-    if not os.path.exists(file_path):
+    try:
+        return DocumentResponse(
+            file_path, etag=content_etag(document_url), filename=safe_filename
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+
+
+@app.get("/api/documents/signed/{token}")
+async def get_signed_document(token: str, access_token: str = Cookie(None)):
+    """Serve a document from a link issued by /api/application/document_links.
+
+    The signature (and the caller's JWT) authorize the download, so no
+    database query runs here.
+    """
+    claims = decode_document_token(token)
+    if not claims:
+        return JSONResponse(content={"error": "Link is invalid or has expired"}, status_code=403)
+    try:
+        sub = jwt.decode(access_token or "", JWT_SECRET, algorithms=[JWT_ALGORITHM]).get("sub")
+    except jwt.PyJWTError:
+        sub = None
+    if str(sub) != claims.get("sub"):
+        # Links are bound to the user they were issued to
+        return JSONResponse(content={"error": "user is not authenticated"}, status_code=401)
+
+    document_url = claims["url"]
+    filename = os.path.basename(document_url)
+    file_path = physical_path(document_url)
+    if DOCUMENT_ACCEL_REDIRECT_PREFIX:
+        # nginx streams the file (sendfile, ranges, conditionals) itself
+        relative = os.path.relpath(file_path, MEDIA_DIR).replace(os.sep, "/")
+        return Response(
+            headers={
+                "X-Accel-Redirect": DOCUMENT_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + relative,
+                "Content-Type": "application/octet-stream",
+                "Content-Disposition": f'attachment; filename="{filename}"',
+            }
+        )
+    try:
+        return DocumentResponse(file_path, etag=content_etag(document_url), filename=filename)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(
-        file_path, media_type="application/octet-stream", filename=safe_filename
-    )
 
 
 app.include_router(authRouter, prefix="/api/auth")
@@ -1,58 +1,125 @@
-from fastapi.responses import JSONResponse
+from serialization import JSONResponse, ModelSerializer
 from sqlalchemy import Select as select
-from sqlalchemy.orm import Session
 from db.models import User, UserRole, normalize_role, role_matches
 from fastapi import APIRouter, Cookie
+from fastapi.responses import FileResponse
 import jwt
-from config import JWT_SECRET, JWT_ALGORITHM, engine
+from config import JWT_SECRET, JWT_ALGORITHM, async_session
 from uuid import UUID
 from applications.routes import protectRoute
-from datetime import datetime
+from auth.principal_cache import principal_cache
+from applications.cache import bump_versions_showing, detail_cache
+from scheduler import scheduler
+from profiling import profile_store
 from .schema import UpdateUser
 
 sys_admin_router = APIRouter()
 
+serialize_user = ModelSerializer(User)
+
 
 @sys_admin_router.get("/get_all_user")
 async def getAllUserInfo(access_token: str = Cookie(None)):
-    user = protectRoute(access_token)
+    user = await protectRoute(access_token)
     if not isinstance(user, User):
         return user
     if not role_matches(user.role, UserRole.SYSTEM_ADMIN):
         return JSONResponse(
             content={"message": "You don't have access"}, status_code=403
         )
-    with Session(engine) as session:
+    async with async_session() as session:
         statement = select(User).where(User.id != user.id)
-        result = session.scalars(statement).all()
-        users = [dict(u.__dict__) for u in result]
-        for u in users:
-            u.pop("_sa_instance_state", None)
-            for key, value in u.items():
-                if isinstance(value, UUID):
-                    u[key] = str(value)
-                if isinstance(value, datetime):
-                    u[key] = value.isoformat()
+        users = serialize_user.many((await session.scalars(statement)).all())
     return JSONResponse(content={"users": users}, status_code=200)
 
 
 @sys_admin_router.post("/update_user")
 async def updateUserInfo(body: UpdateUser, access_token: str = Cookie(None)):
-    user = protectRoute(access_token)
+    user = await protectRoute(access_token)
     if not isinstance(user, User):
         return user
     if not role_matches(user.role, UserRole.SYSTEM_ADMIN):
         return JSONResponse(
             content={"message": "You don't have access"}, status_code=403
         )
-    with Session(engine) as session:
+    async with async_session() as session:
         statement = select(User).where(User.id == UUID(body.user_id))
-        target_user = session.scalars(statement).first()
+        target_user = (await session.scalars(statement)).first()
         if not target_user:
             return JSONResponse(content={"message": "User not found"}, status_code=404)
+        new_role = normalize_role(body.role)  # store canonical value
+        changed = (
+            target_user.department != body.department or target_user.role != new_role
+        )
+        target_id = str(target_user.id)
         target_user.department = body.department
-        target_user.role = normalize_role(body.role)  # store canonical value
-        session.commit()
+        target_user.role = new_role
+        if changed:
+            # Cached detail payloads embed the user's role and department
+            await bump_versions_showing(session, target_user.id)
+        await session.commit()
+    if changed:
+        # Every worker may hold the old role/department for this user
+        principal_cache.invalidate(target_id)
     return JSONResponse(
         content={"message": "User info updated successfully"}, status_code=201
     )
+
+
+@sys_admin_router.get("/cache_stats")
+async def getCacheStats(access_token: str = Cookie(None)):
+    user = await protectRoute(access_token)
+    if not isinstance(user, User):
+        return user
+    if not role_matches(user.role, UserRole.SYSTEM_ADMIN):
+        return JSONResponse(
+            content={"message": "You don't have access"}, status_code=403
+        )
+    return JSONResponse(
+        content={
+            "principal_cache": principal_cache.stats(),
+            "detail_cache": detail_cache.stats(),
+        },
+        status_code=200,
+    )
+
+
+@sys_admin_router.get("/jobs")
+async def getJobs(access_token: str = Cookie(None)):
+    """Background jobs: this worker's counters and the latest run on any worker."""
+    user = await protectRoute(access_token)
+    if not isinstance(user, User):
+        return user
+    if not role_matches(user.role, UserRole.SYSTEM_ADMIN):
+        return JSONResponse(
+            content={"message": "You don't have access"}, status_code=403
+        )
+    return JSONResponse(content=scheduler.stats(), status_code=200)
+
+
+@sys_admin_router.get("/profiles")
+async def getProfiles(access_token: str = Cookie(None)):
+    """Captured request profiles, newest first (see profiling.py)."""
+    user = await protectRoute(access_token)
+    if not isinstance(user, User):
+        return user
+    if not role_matches(user.role, UserRole.SYSTEM_ADMIN):
+        return JSONResponse(
+            content={"message": "You don't have access"}, status_code=403
+        )
+    return JSONResponse(content={"profiles": profile_store.entries()}, status_code=200)
+
+
+@sys_admin_router.get("/profiles/{name}")
+async def getProfile(name: str, access_token: str = Cookie(None)):
+    user = await protectRoute(access_token)
+    if not isinstance(user, User):
+        return user
+    if not role_matches(user.role, UserRole.SYSTEM_ADMIN):
+        return JSONResponse(
+            content={"message": "You don't have access"}, status_code=403
+        )
+    path = profile_store.path(name)
+    if path is None:
+        return JSONResponse(content={"message": "Profile not found"}, status_code=404)
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=name)